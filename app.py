@@ -0,0 +1,758 @@
+# app.py
+
+"""
+The Bot client: update handling, batching, posting and the web tier it starts.
+Launched by bot.py, which stays light because parse pool workers re-import it.
+"""
+import logging
+import asyncio
+import time
+import re
+import os
+import sys
+from datetime import datetime, time as dt_time, timedelta
+from pyrogram.enums import ParseMode
+from pyrogram.errors import (
+    FloodWait, PeerIdInvalid, MessageNotModified, ChatAdminRequired,
+    ChannelInvalid, UserIsBlocked, ChatForwardsRestricted
+)
+from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from pyromod import Client
+from aiohttp import web
+from config import Config
+from server import web_server, start_metrics_server
+from server.worker import WebWorkerPool
+from features.ingest_queue import IngestQueue
+from features.fair_scheduler import FairScheduler, priority_weight
+from database.db import (
+    get_user, save_file_data, get_post_channel, get_index_db_channel,
+    save_post, get_users_with_daily_notify_enabled, get_stats_for_owner,
+    get_monthly_record, update_monthly_record, set_ingest_job_copied,
+    save_batch_state, delete_batch_state, get_all_batch_states,
+    save_parsed_info, get_parsed_infos, get_files_to_reparse, ensure_title_cache_indexes,
+    ensure_files_indexes
+)
+from util.clients import ClientRotation, start_worker_clients
+from util.metrics import (
+    TELEGRAM_CALL_SECONDS, FLOOD_WAITS, FLOOD_WAIT_SECONDS, FLOOD_WAIT_ACTIVE,
+    INGEST_QUEUE_DEPTH, INGEST_OWNER_DEPTH, OPEN_BATCHES, register_collector
+)
+from utils.helpers import (
+    create_post, clean_and_parse_filename, clean_and_parse_filenames, notify_and_remove_invalid_channel, current_parse_version
+)
+from utils.parse_pool import cluster_by_title, shutdown_parse_pool
+from features.imdb_client import shutdown_imdb_client
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE_LIMIT = 50
+# Seconds of quiet after the last file before a batch is finalized.
+BATCH_COLLECT_SECONDS = 20
+# Pause between files while redoing parses left by an older parser version.
+REPARSE_DELAY = 1
+
+
+class Bot(Client):
+    def __init__(self):
+        super().__init__("FinalStorageBot", api_id=Config.API_ID, api_hash=Config.API_HASH, bot_token=Config.BOT_TOKEN, plugins=dict(root="handlers"))
+        self.me = None
+        self.web_app = None
+        self.web_runner = None
+        self.metrics_runner = None
+        self.web_workers = None
+
+        self.owner_db_channel = Config.OWNER_DB_CHANNEL
+        self.stream_channel_id = None
+        self.client_rotation = ClientRotation()
+        self.client_rotation.add(self)
+        self.worker_clients = []
+        
+        self.open_batches = {} 
+        self.processing_users = set() 
+        self.waiting_files = {} 
+        self.user_batch_locks = defaultdict(asyncio.Lock)
+
+        # Caches
+        self.search_cache = {}
+        self.backup_cache = {}
+        self.last_dashboard_edit_time = {}
+        self.parse_tasks = {}  # (owner_id, file_unique_id) -> task parsing the file name
+        self.reparse_task = None
+        self.is_in_flood_wait = asyncio.Event()
+        self.is_in_flood_wait.set()
+        self.flood_wait_duration = 0
+        self.shortener_fail_cache = {}
+
+        self.vps_ip = Config.VPS_IP
+        self.vps_port = Config.VPS_PORT
+
+        self.is_healthy = asyncio.Event()
+        self.is_healthy.set()
+        self.restart_lock = asyncio.Lock()
+        self.last_health_check_status = True
+        self.last_health_check_error = "" 
+        self.ingest_queue = IngestQueue(
+            self, Config.INGEST_WORKERS, Config.INGEST_MAX_PENDING,
+            Config.INGEST_MAX_ATTEMPTS, Config.INGEST_RETRY_BASE_DELAY,
+            per_owner_limit=Config.INGEST_PER_OWNER_LIMIT
+        )
+        self.post_scheduler = FairScheduler("post", Config.POST_WORKERS, per_owner_limit=1)
+
+    def collect_metrics(self):
+        """Refreshes bot-state gauges for /metrics at scrape time."""
+        FLOOD_WAIT_ACTIVE.set(0 if self.is_in_flood_wait.is_set() else 1)
+        OPEN_BATCHES.set(len(self.open_batches))
+        INGEST_QUEUE_DEPTH.set(self.ingest_queue.depth + sum(len(f) for f in self.waiting_files.values()))
+        INGEST_OWNER_DEPTH.clear()
+        for owner_id, depth, _ in self.ingest_queue.owner_stats():
+            INGEST_OWNER_DEPTH.set(depth, owner=owner_id)
+
+    async def execute_with_retry(self, coro, *args, **kwargs):
+        retries = 7
+        base_delay = 5
+        for i in range(retries):
+            try:
+                await self.is_in_flood_wait.wait()
+                await self.is_healthy.wait()
+                with TELEGRAM_CALL_SECONDS.time(method=getattr(coro, "__name__", "unknown")):
+                    return await coro(*args, **kwargs)
+            except FloodWait as e:
+                logger.warning(f"FloodWait of {e.value}s detected. Engaging global pause.")
+                self.is_in_flood_wait.clear()
+                self.flood_wait_duration = e.value + 10
+                FLOOD_WAITS.inc()
+                FLOOD_WAIT_SECONDS.set(self.flood_wait_duration)
+                
+                if self.is_in_flood_wait.is_set():
+                    try:
+                        await self.send_message(Config.ADMIN_ID, f"🚨 **FloodWait Triggered!**\n\nI will pause all outgoing actions for `{self.flood_wait_duration}` seconds.")
+                    except Exception as admin_notify_err:
+                        logger.error(f"Failed to notify admin about FloodWait: {admin_notify_err}")
+
+                await asyncio.sleep(self.flood_wait_duration)
+                self.is_in_flood_wait.set()
+                logger.info("Global pause finished. Resuming operations.")
+                continue
+            except (asyncio.TimeoutError, PeerIdInvalid, ChannelInvalid, ChatForwardsRestricted) as e:
+                delay = base_delay * (2 ** i)
+                logger.warning(f"Transient Telegram error: {type(e).__name__}. Retrying in {delay}s... (Attempt {i + 1}/{retries})")
+                await asyncio.sleep(delay)
+            except MessageNotModified:
+                logger.warning("Attempted to edit message with the same content. Skipping.")
+                return None
+            except UserIsBlocked:
+                logger.warning(f"Action failed because user has blocked the bot. Aborting this action.")
+                raise
+            except Exception as e:
+                logger.error(f"A non-retriable error occurred in execute_with_retry: {e}", exc_info=True)
+                self.is_healthy.clear()
+                self.last_health_check_error = str(e)
+                raise
+        logger.error(f"Failed to execute action after {retries} retries. Marking bot as unhealthy.")
+        self.is_healthy.clear()
+        raise Exception(f"Action failed after {retries} retries.")
+
+    async def _generate_dashboard_text(self, collection_data, status_text):
+        header = collection_data.get('header', '')
+        processed_count = len(collection_data.get('messages', []))
+        skipped_files = collection_data.get('skipped_files', [])
+
+        post_ch_line, db_ch_line = "", ""
+        header_lines = header.split('\n')
+        if len(header_lines) > 0: post_ch_line = header_lines[0].replace("**", "")
+        if len(header_lines) > 1: db_ch_line = header_lines[1].replace("**", "")
+
+        text = "╭─🗂️ **File Batch Dashboard** ─╮\n\n"
+        text += f"  {post_ch_line}\n"
+        text += f"  {db_ch_line}\n\n"
+        text += f"  📊 **Files Collected:** `{processed_count}` / `{BATCH_SIZE_LIMIT}`\n"
+        text += f"  {status_text}\n"
+
+        if skipped_files:
+            text += f"\n  🚫 **Skipped Files:** `{len(skipped_files)}`\n"
+            for i, filename in enumerate(skipped_files):
+                if i < 5: text += f"    - `{filename}`\n"
+                else:
+                    text += f"    - `...and {len(skipped_files) - 5} more.`\n"
+                    break
+        text += "\n╰───────────────────╯"
+        return text
+
+    def _arm_batch_timer(self, user_id, collection_data, delay):
+        """(Re)starts the countdown after which the batch is finalized."""
+        if collection_data.get('timer'): collection_data['timer'].cancel()
+        loop = asyncio.get_event_loop()
+        collection_data['deadline'] = time.time() + delay
+        collection_data['timer'] = loop.call_later(delay, lambda u=user_id: asyncio.create_task(self._finalize_collection(u)))
+
+    async def _save_batch_state(self, user_id):
+        """
+        Mirrors a user's batch to Mongo so a restart can pick it up again.
+        While a batch is being finalized only the waiting files change.
+        """
+        state = {'waiting_message_ids': [m.id for m in self.waiting_files.get(user_id, [])]}
+        collection_data = self.open_batches.get(user_id)
+        if collection_data is not None:
+            dashboard_msg = collection_data.get('dashboard_message')
+            state.update({
+                'message_ids': [m.id for m in collection_data.get('messages', [])],
+                'skipped_files': collection_data.get('skipped_files', []),
+                'dashboard_message_id': dashboard_msg.id if dashboard_msg else None,
+                'header': collection_data.get('header', ''),
+                'deadline': collection_data.get('deadline'),
+                'finalizing': False
+            })
+        elif user_id in self.processing_users:
+            state['finalizing'] = True
+        try:
+            await save_batch_state(user_id, state)
+        except Exception as e:
+            logger.error(f"Could not save batch state for user {user_id}: {e}")
+
+    async def _fetch_owner_db_messages(self, message_ids):
+        messages = []
+        for i in range(0, len(message_ids), 200):
+            chunk = await self.execute_with_retry(self.get_messages, self.owner_db_channel, message_ids[i:i + 200])
+            messages.extend(m for m in chunk if m and not m.empty and m.media)
+        return messages
+
+    async def restore_batches(self):
+        """
+        Rebuilds batches left open by the last run. Batches whose deadline has
+        passed (or that were being finalized) are finalized right away; the rest
+        get their timers back.
+        """
+        try:
+            states = await get_all_batch_states()
+        except Exception as e:
+            logger.error(f"Could not load saved batches: {e}")
+            return
+
+        for state in states:
+            user_id = state['user_id']
+            try:
+                messages = await self._fetch_owner_db_messages(state.get('message_ids', []))
+                waiting = await self._fetch_owner_db_messages(state.get('waiting_message_ids', []))
+                dashboard_msg = None
+                if state.get('dashboard_message_id'):
+                    try:
+                        dashboard_msg = await self.get_messages(user_id, state['dashboard_message_id'])
+                        if dashboard_msg.empty: dashboard_msg = None
+                    except Exception:
+                        dashboard_msg = None
+            except Exception as e:
+                logger.error(f"Could not restore batch for user {user_id}: {e}")
+                continue
+
+            if not messages:
+                # Nothing is left of the batch itself; the files queued behind it take its place.
+                messages, waiting = waiting, []
+            if not messages:
+                await delete_batch_state(user_id)
+                continue
+            if waiting:
+                self.waiting_files[user_id] = waiting
+
+            collection_data = {
+                'messages': messages,
+                'skipped_files': state.get('skipped_files', []),
+                'timer': None, 'dashboard_message': dashboard_msg,
+                'header': state.get('header', '')
+            }
+            self.open_batches[user_id] = collection_data
+            remaining = (state.get('deadline') or 0) - time.time()
+            if state.get('finalizing') or remaining <= 0:
+                logger.info(f"Finalizing batch of {len(collection_data['messages'])} file(s) for user {user_id} left over from the last run.")
+                collection_data['deadline'] = time.time()
+                asyncio.create_task(self._finalize_collection(user_id))
+            else:
+                self._arm_batch_timer(user_id, collection_data, remaining)
+                await self._save_batch_state(user_id)
+                logger.info(f"Restored open batch of {len(collection_data['messages'])} file(s) for user {user_id}; finalizing in {remaining:.0f}s.")
+
+    async def _start_new_collection(self, user_id, initial_messages):
+        post_ch_id = await get_post_channel(user_id)
+        db_ch_id = await get_index_db_channel(user_id) or self.owner_db_channel
+
+        try: post_ch_title = (await self.get_chat(post_ch_id)).title if post_ch_id else "Not Set"
+        except: post_ch_title = "Invalid Channel"
+
+        try: db_ch_title = (await self.get_chat(db_ch_id)).title if db_ch_id else "Not Set"
+        except: db_ch_title = "Invalid Channel"
+
+        header_text = f"**📤 Post Channel:** `{post_ch_title}`\n**🗃️ DB Channel:** `{db_ch_title}`"
+        collection_data = {
+            'messages': initial_messages, 'skipped_files': [],
+            'timer': None, 'dashboard_message': None, 'header': header_text
+        }
+        self._arm_batch_timer(user_id, collection_data, BATCH_COLLECT_SECONDS)
+        initial_status = "⏳ **Status:** Collecting files... (20s window)"
+        initial_text = await self._generate_dashboard_text(collection_data, initial_status)
+        
+        try:
+            dashboard_msg = await self.execute_with_retry(self.send_message, chat_id=user_id, text=initial_text, parse_mode=ParseMode.MARKDOWN)
+            collection_data['dashboard_message'] = dashboard_msg
+        except UserIsBlocked:
+            logger.warning(f"Cannot send dashboard to user {user_id} because they blocked the bot.")
+        except Exception as e:
+            logger.error(f"Failed to send dashboard message to {user_id}: {e}")
+
+        self.open_batches[user_id] = collection_data
+        self.last_dashboard_edit_time[user_id] = time.time()
+        await self._save_batch_state(user_id)
+
+    async def _finalize_collection(self, user_id):
+        if user_id in self.processing_users:
+            logger.info(f"Finalize called for user {user_id}, but they are already processing. Aborting this call.")
+            return
+
+        self.processing_users.add(user_id)
+        dashboard_msg = None
+        try:
+            if user_id not in self.open_batches: return
+            collection_data = self.open_batches.pop(user_id)
+            if collection_data.get('timer'): collection_data['timer'].cancel()
+            await self._save_batch_state(user_id)
+
+            messages = collection_data.get('messages', [])
+            dashboard_msg = collection_data.get('dashboard_message')
+            if not messages:
+                if dashboard_msg: await self.execute_with_retry(dashboard_msg.delete)
+                return
+
+            if dashboard_msg and not self.post_scheduler.can_start_now(user_id):
+                status = "⏳ **Status:** Waiting for a free posting slot..."
+                await self.execute_with_retry(dashboard_msg.edit_text, await self._generate_dashboard_text(collection_data, status))
+            if not self.post_scheduler.has_weight(user_id):
+                user = await get_user(user_id)
+                self.post_scheduler.set_weight(user_id, priority_weight(user.get('priority') if user else None))
+            # Owners take turns (weighted by priority tier) for the parse and post work.
+            async with self.post_scheduler.slot(user_id):
+                await self._post_collection(user_id, collection_data, messages, dashboard_msg)
+
+        except UserIsBlocked:
+            logger.warning(f"User {user_id} blocked the bot during finalize_collection.")
+        except Exception as e:
+            logger.exception(f"CRITICAL Error finalizing collection for user {user_id}: {e}")
+            if dashboard_msg:
+                try: await self.execute_with_retry(dashboard_msg.edit_text, f"❌ **Error!** An unexpected error occurred: {e}")
+                except UserIsBlocked: pass
+        finally:
+            self.processing_users.discard(user_id)
+            self.last_dashboard_edit_time.pop(user_id, None)
+            if user_id in self.waiting_files and self.waiting_files[user_id]:
+                await self._start_new_collection(user_id, self.waiting_files.pop(user_id))
+            elif user_id not in self.open_batches:
+                try: await delete_batch_state(user_id)
+                except Exception as e: logger.error(f"Could not clear batch state for user {user_id}: {e}")
+    
+    async def _post_collection(self, user_id, collection_data, messages, dashboard_msg):
+        """Groups a finalized batch into logical series and posts them to the user's Post Channel."""
+        if dashboard_msg:
+            status = f"🔬 **Status:** Analyzing & grouping `{len(messages)}` files..."
+            await self.execute_with_retry(dashboard_msg.edit_text, await self._generate_dashboard_text(collection_data, status))
+
+        parsed_infos = await self._load_parsed_infos(user_id, messages)
+        titles = [(parsed_infos.get(getattr(msg, msg.media.value).file_unique_id) or {}).get("batch_title") for msg in messages]
+        logical_batches = await cluster_by_title(messages, titles)
+
+        total_batches = len(logical_batches)
+        if dashboard_msg:
+            status = f"✅ **Status:** Found `{total_batches}` logical series/batches. Processing..."
+            await self.execute_with_retry(dashboard_msg.edit_text, await self._generate_dashboard_text(collection_data, status))
+
+        user = await get_user(user_id)
+        post_channel_id = await get_post_channel(user_id) if user else None
+        if not post_channel_id or not await notify_and_remove_invalid_channel(self, user_id, post_channel_id, "Post"):
+            if dashboard_msg: await self.execute_with_retry(dashboard_msg.edit_text, "❌ **Error!** Could not access a valid Post Channel. Please set one in settings.")
+            return
+
+        for i, (batch_title, batch_messages) in enumerate(logical_batches.items()):
+            if dashboard_msg:
+                status = f"🚀 **Status:** Posting batch {i + 1}/{total_batches} ('{batch_title}')..."
+                await self.execute_with_retry(dashboard_msg.edit_text, await self._generate_dashboard_text(collection_data, status))
+
+            posts_to_send = await create_post(self, user_id, batch_messages, parsed_infos)
+            if not posts_to_send:
+                logger.warning(f"No posts generated for batch '{batch_title}' for user {user_id}.")
+                await self.send_message(user_id, f"⚠️ **Skipped Batch:** No valid posts could be generated for '{batch_title}'.")
+                continue
+
+            for poster, caption, footer in posts_to_send:
+                sent_message = None
+                try:
+                    if poster:
+                        sent_message = await self.execute_with_retry(self.send_photo, chat_id=post_channel_id, photo=poster, caption=caption, reply_markup=footer)
+                    else:
+                        sent_message = await self.execute_with_retry(self.send_message, chat_id=post_channel_id, text=caption, reply_markup=footer, disable_web_page_preview=True)
+                    if sent_message:
+                        await save_post(owner_id=user_id, post_channel_id=post_channel_id, message_id=sent_message.id, poster=poster, caption=caption, reply_markup=footer)
+                    else:
+                        raise Exception("execute_with_retry returned None")
+                except Exception as e:
+                    logger.error(f"Failed to send post for user {user_id}: {e}")
+                    await self.send_message(user_id, "❌ **Posting Error!**\nFailed to send a file to your Auto Post Channel. Please check bot permissions and try again.")
+                    continue
+                await asyncio.sleep(2.5)
+
+        if dashboard_msg: await self.execute_with_retry(dashboard_msg.delete)
+        await self.send_message(user_id, "✅ **Batch processing complete!** All files have been successfully posted.")
+
+    def _start_parse(self, user_id, media):
+        """Parses a file's name in the background (once per file) and stores the result on its record."""
+        key = (user_id, media.file_unique_id)
+        task = self.parse_tasks.get(key)
+        if task is None:
+            task = asyncio.create_task(self._parse_and_store(user_id, media.file_unique_id, media.file_name))
+            self.parse_tasks[key] = task
+            task.add_done_callback(lambda _, k=key: self.parse_tasks.pop(k, None))
+        return task
+
+    async def _parse_and_store(self, user_id, file_unique_id, file_name):
+        version = current_parse_version()
+        try:
+            info = await clean_and_parse_filename(file_name)
+        except Exception as e:
+            logger.error(f"Could not parse file name '{file_name}': {e}")
+            return None
+        try:
+            await save_parsed_info(user_id, file_unique_id, info, version)
+        except Exception as e:
+            logger.error(f"Could not store parsed info for '{file_name}': {e}")
+        return info
+
+    async def _load_parsed_infos(self, user_id, messages):
+        """
+        file_unique_id -> parsed name info for `messages`. Uses the parse stored
+        at ingest, waits for ones still running and parses the rest (e.g. stored
+        by an older parser version) as one batch.
+        """
+        medias = [getattr(msg, msg.media.value) for msg in messages]
+        version = current_parse_version()
+        try:
+            parsed_infos = await get_parsed_infos(user_id, [m.file_unique_id for m in medias], version)
+        except Exception as e:
+            logger.error(f"Could not load stored parses for user {user_id}: {e}")
+            parsed_infos = {}
+
+        running, missing = {}, {}
+        for media in medias:
+            uid = media.file_unique_id
+            if uid in parsed_infos: continue
+            task = self.parse_tasks.get((user_id, uid))
+            if task: running[uid] = task
+            else: missing[uid] = media
+        if running:
+            results = await asyncio.gather(*running.values())
+            parsed_infos.update((uid, info) for uid, info in zip(running, results) if info)
+        if missing:
+            results = await clean_and_parse_filenames([m.file_name for m in missing.values()])
+            for (uid, media), info in zip(missing.items(), results):
+                if not info: continue
+                parsed_infos[uid] = info
+                try: await save_parsed_info(user_id, uid, info, version)
+                except Exception as e: logger.error(f"Could not store parsed info for '{media.file_name}': {e}")
+        return parsed_infos
+
+    def start_reparse(self):
+        """(Re)starts reparse_outdated_files, e.g. after the offline IMDb index was rebuilt."""
+        if self.reparse_task and not self.reparse_task.done():
+            self.reparse_task.cancel()
+        self.reparse_task = asyncio.create_task(self.reparse_outdated_files())
+
+    async def reparse_outdated_files(self):
+        """Redoes, a file at a time, the stored parses made by an older parser version or IMDb index."""
+        version = current_parse_version()
+        last_id, count = None, 0
+        try:
+            while True:
+                docs = await get_files_to_reparse(version, last_id)
+                if not docs: break
+                for doc in docs:
+                    last_id = doc['_id']
+                    if not doc.get('file_name'): continue
+                    await self._parse_and_store(doc['owner_id'], doc['file_unique_id'], doc['file_name'])
+                    count += 1
+                    await asyncio.sleep(REPARSE_DELAY)
+        except Exception as e:
+            logger.error(f"Background re-parse stopped after {count} file(s): {e}")
+            return
+        if count: logger.info(f"Re-parsed {count} file(s) with parser version {version}.")
+
+    async def process_new_file(self, message, user_id, job=None):
+        """
+        Copies one file to the Owner DB channel and adds it to the user's batch.
+        Called by the ingest queue; raises on failure so the job is retried.
+        """
+        async with self.user_batch_locks[user_id]:
+            try:
+                await self.is_in_flood_wait.wait()
+                await self.is_healthy.wait()
+
+                media = getattr(message, message.media.value, None)
+                if media and hasattr(media, 'duration') and media.duration and media.duration < 1200:
+                    logger.info(f"Skipping short duration file '{media.file_name}' for user {user_id}.")
+                    if user_id in self.open_batches:
+                        self.open_batches[user_id].setdefault('skipped_files', []).append(media.file_name)
+                        await self._save_batch_state(user_id)
+                    return
+
+                self.stream_channel_id = await get_index_db_channel(user_id) or self.owner_db_channel
+                if not self.stream_channel_id:
+                    logger.error(f"User {user_id} has no Index/Owner DB channel. Skipping file '{media.file_name}'.")
+                    return
+
+                copied_message = None
+                if job and job.get('copied_message_id'):
+                    # A previous attempt already copied this file; reuse that copy.
+                    copied_message = await self.execute_with_retry(self.get_messages, self.owner_db_channel, job['copied_message_id'])
+                    if not copied_message or copied_message.empty:
+                        copied_message = None
+
+                if not copied_message:
+                    copied_message = await self.execute_with_retry(message.copy, self.owner_db_channel)
+                    if not copied_message:
+                        raise Exception(f"message.copy returned None for file '{media.file_name}'.")
+                    if job:
+                        await set_ingest_job_copied(job['_id'], copied_message.id)
+                    logger.info(f"File '{media.file_name}' copied to Owner DB. New message ID: {copied_message.id}")
+                await save_file_data(user_id, message, copied_message, copied_message)
+                # Parsed once here; finalizing the batch reads the stored result.
+                self._start_parse(user_id, media)
+
+                if user_id in self.processing_users:
+                    self.waiting_files.setdefault(user_id, []).append(copied_message)
+                    await self._save_batch_state(user_id)
+                elif user_id not in self.open_batches:
+                    await self._start_new_collection(user_id, [copied_message])
+                else:
+                    collection_data = self.open_batches[user_id]
+                    if collection_data.get('timer'): collection_data['timer'].cancel()
+                    collection_data['messages'].append(copied_message)
+
+                    if len(collection_data['messages']) >= BATCH_SIZE_LIMIT:
+                        logger.info(f"Batch limit of {BATCH_SIZE_LIMIT} reached for user {user_id}. Finalizing immediately.")
+                        collection_data['deadline'] = time.time()
+                        await self._save_batch_state(user_id)
+                        asyncio.create_task(self._finalize_collection(user_id))
+                    else:
+                        self._arm_batch_timer(user_id, collection_data, BATCH_COLLECT_SECONDS)
+                        await self._save_batch_state(user_id)
+                        
+                        if (time.time() - self.last_dashboard_edit_time.get(user_id, 0)) > 2:
+                             if collection_data.get('dashboard_message'):
+                                try:
+                                    status_text = "⏳ **Status:** Collecting files... (timer reset)"
+                                    await self.execute_with_retry(collection_data['dashboard_message'].edit_text, await self._generate_dashboard_text(collection_data, status_text))
+                                    self.last_dashboard_edit_time[user_id] = time.time()
+                                except UserIsBlocked: 
+                                    collection_data['dashboard_message'] = None
+                                except MessageNotModified:
+                                    pass
+                                except Exception as e: 
+                                    logger.error(f"Error updating dashboard for {user_id}: {e}")
+
+            except Exception as e:
+                logger.exception(f"CRITICAL ERROR processing file '{getattr(message.media, 'file_name', 'N/A')}' for user {user_id}: {e}")
+                raise
+
+    async def start_web_server(self):
+        register_collector(self.collect_metrics)
+        if Config.METRICS_PORT:
+            try: self.metrics_runner = await start_metrics_server(Config.METRICS_PORT)
+            except OSError as e: logger.error(f"Could not start the metrics server: {e}")
+        if Config.WEB_WORKERS > 0:
+            # Streaming runs in separate processes; this one only handles Telegram updates.
+            self.web_workers = WebWorkerPool(Config.WEB_WORKERS, await self.export_session_string())
+            await self.web_workers.start()
+            logger.info(f"Web server started at http://{self.vps_ip}:{self.vps_port} with {Config.WEB_WORKERS} worker processes")
+            return
+        self.web_app = await web_server(self)
+        self.web_runner = web.AppRunner(self.web_app)
+        await self.web_runner.setup()
+        # FIX: Changed binding to "0.0.0.0" to fix OSError
+        site = web.TCPSite(self.web_runner, "0.0.0.0", self.vps_port)
+        await site.start()
+        logger.info(f"Web server started at http://{self.vps_ip}:{self.vps_port}")
+
+    async def daily_restart_handler(self):
+        while True:
+            now = datetime.now()
+            restart_time = now.replace(hour=2, minute=0, second=0, microsecond=0)
+            if now > restart_time: restart_time += timedelta(days=1)
+            sleep_duration = (restart_time - now).total_seconds()
+            logger.info(f"Scheduled daily restart in {sleep_duration / 3600:.2f} hours.")
+            await asyncio.sleep(sleep_duration)
+            logger.info("RESTARTING BOT: Scheduled daily restart.")
+            await self.stop()
+            os.execv(sys.executable, ['python'] + sys.argv)
+
+    async def daily_stats_notifier(self):
+        """ The new daily notifier for sending stats dashboards. """
+        while True:
+            now = datetime.utcnow()
+            notify_time = now.replace(hour=23, minute=59, second=0, microsecond=0)
+            if now > notify_time: notify_time += timedelta(days=1)
+            
+            sleep_duration = (notify_time - now).total_seconds()
+            logger.info(f"Scheduled daily stats notification in {sleep_duration / 3600:.2f} hours (UTC).")
+            await asyncio.sleep(sleep_duration)
+            
+            logger.info("STATS: Starting daily notification process...")
+            user_ids_to_notify = await get_users_with_daily_notify_enabled()
+            
+            for user_id in user_ids_to_notify:
+                try:
+                    stats_data = await get_stats_for_owner(user_id, days=6)
+                    stats_dict = {s['date'].strftime('%Y-%m-%d'): s['view_count'] for s in stats_data}
+                    
+                    today_utc = datetime.utcnow().date()
+                    today_str = today_utc.strftime('%Y-%m-%d')
+                    
+                    today_clicks = stats_dict.get(today_str, 0)
+                    
+                    yesterday_utc = today_utc - timedelta(days=1)
+                    yesterday_str = yesterday_utc.strftime('%Y-%m-%d')
+                    yesterday_clicks = stats_dict.get(yesterday_str, 0)
+                    
+                    # --- Percentage Change Calculation ---
+                    if yesterday_clicks > 0:
+                        change = ((today_clicks - yesterday_clicks) / yesterday_clicks) * 100
+                        change_str = f"📈 {change:.1f}%" if change >= 0 else f"📉 {abs(change):.1f}%"
+                    elif today_clicks > 0:
+                        change_str = "📈 New Activity"
+                    else:
+                        change_str = "📊 No Change"
+
+                    # --- Build Dashboard Text ---
+                    text = f"**📊 Daily Clicks Dashboard - {today_utc.strftime('%d %B %Y')}**\n\n"
+                    text += f"**Today's Clicks:** `{today_clicks}`\n"
+                    text += f"**vs. Yesterday:** `{change_str}`\n\n"
+                    text += "**Last 5 Days Performance:**\n"
+                    
+                    for i in range(1, 6):
+                        day = today_utc - timedelta(days=i)
+                        day_str = day.strftime('%Y-%m-%d')
+                        clicks = stats_dict.get(day_str, 0)
+                        text += f" ` - ` {day.strftime('%a, %b %d')}: `{clicks}` clicks\n"
+                        
+                    # --- Record Breaking Logic ---
+                    monthly_record = await get_monthly_record(user_id)
+                    current_high = monthly_record.get('highest_view_count', 0) if monthly_record else 0
+                    
+                    if today_clicks > current_high:
+                        await update_monthly_record(user_id, today_clicks, datetime.utcnow())
+                        congrats_msg = (
+                            f"🎉 **Congratulations! New Record!** 🎉\n\n"
+                            f"You've set a new 30-day clicks record with **{today_clicks}** clicks today, "
+                            f"beating your previous record of {current_high}!\n\n"
+                            "Keep up the great work!"
+                        )
+                        await self.send_message(user_id, congrats_msg)
+                        
+                    await self.send_message(user_id, text)
+                    await asyncio.sleep(1) # Avoid flood waits
+                except UserIsBlocked:
+                    logger.warning(f"STATS: Could not send dashboard to {user_id}, user has blocked the bot.")
+                except Exception as e:
+                    logger.error(f"STATS: Failed to send dashboard to user {user_id}: {e}")
+
+            logger.info("STATS: Daily notification process finished.")
+
+
+    async def connection_health_check(self):
+        logger.info("✅ Bot health monitor started.")
+        while True:
+            await asyncio.sleep(120)
+            if not self.owner_db_channel: continue
+
+            is_currently_ok = False
+            error_details = ""
+            try:
+                await self.get_chat(self.owner_db_channel)
+                is_currently_ok = True
+                self.last_health_check_error = ""
+            except Exception as e:
+                error_details = f"Health Check FAILED. Error: {e}"
+                logger.error(error_details)
+                is_currently_ok = False
+                self.last_health_check_error = str(e)
+
+            if is_currently_ok:
+                if not self.is_healthy.is_set():
+                    logger.info("✅ HEALTH CHECK PASSED: Connection and permissions in Owner DB Channel are restored.")
+                    self.is_healthy.set()
+                self.last_health_check_status = True
+            else:
+                if self.is_healthy.is_set():
+                    logger.critical("🚨 BOT UNHEALTHY: Pausing file processing due to DB channel failure.")
+                    self.is_healthy.clear()
+                    try:
+                        await self.send_message(Config.ADMIN_ID,
+                            f"**🚨 BOT CRITICAL ERROR**\n\n"
+                            f"I can no longer operate in the Owner DB Channel (`{self.owner_db_channel}`). File processing is **paused**.\n\n"
+                            f"**Reason:** `{error_details}`\n\n"
+                            "I will try to recover automatically. Please check my admin rights in the channel and the server's network."
+                        )
+                    except Exception as e:
+                        logger.error(f"Could not send critical alert to admin: {e}")
+                self.last_health_check_status = False
+
+    async def start(self):
+        await super().start()
+        self.me = await self.get_me()
+        
+        # FIX: Removed the "Hydrating session" block that uses get_dialogs()
+        # This prevents the [400 BOT_METHOD_INVALID] error.
+        
+        if self.owner_db_channel:
+            try:
+                logger.info(f"Initial health check for Owner DB [{self.owner_db_channel}]...")
+                await self.send_message(self.owner_db_channel, f"✅ **Bot Online & Connected**\n\n@{self.me.username} has started successfully.")
+                self.is_healthy.set()
+            except Exception as e:
+                logger.error(f"FATAL: Could not verify Owner DB Channel on startup. Error: {e}")
+                self.is_healthy.clear()
+        else:
+            logger.warning("Owner DB ID not set. Critical functionalities will fail.")
+
+        try:
+            with open(Config.BOT_USERNAME_FILE, 'w') as f:
+                f.write(f"@{self.me.username}")
+        except Exception as e: logger.error(f"Could not write to {Config.BOT_USERNAME_FILE}: {e}")
+
+        if self.owner_db_channel and Config.MULTI_CLIENT_TOKENS:
+            self.worker_clients = await start_worker_clients(self)
+
+        try: await ensure_files_indexes()
+        except Exception as e: logger.error(f"Could not create file indexes: {e}")
+        try: await ensure_title_cache_indexes()
+        except Exception as e: logger.error(f"Could not create IMDb title cache indexes: {e}")
+
+        await self.start_web_server()
+        await self.restore_batches()
+        await self.ingest_queue.start()
+        asyncio.create_task(self.daily_restart_handler())
+        asyncio.create_task(self.connection_health_check())
+        asyncio.create_task(self.daily_stats_notifier()) # Start the new stats notifier
+        self.start_reparse()
+        logger.info(f"Bot @{self.me.username} started successfully with direct processing architecture.")
+
+    async def stop(self, *args):
+        logger.info("Stopping bot...")
+        # Let files already being processed finish before the connection goes away.
+        await self.ingest_queue.stop(Config.INGEST_DRAIN_TIMEOUT)
+        if self.web_runner: await self.web_runner.cleanup()
+        if self.metrics_runner: await self.metrics_runner.cleanup()
+        if self.web_workers: await self.web_workers.stop()
+        if getattr(self, "media_session_pool", None): await self.media_session_pool.stop()
+        for worker in self.worker_clients:
+            try:
+                if getattr(worker, "media_session_pool", None): await worker.media_session_pool.stop()
+                await worker.stop()
+            except Exception as e: logger.error(f"Error stopping helper bot '{worker.name}': {e}")
+        shutdown_parse_pool()
+        shutdown_imdb_client()
+        await super().stop()
+        logger.info("Bot stopped.")
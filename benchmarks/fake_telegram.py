@@ -0,0 +1,192 @@
+# benchmarks/fake_telegram.py
+
+"""
+A local stand-in for Telegram's media DCs, for exercising the streaming path
+without a live account.
+
+FakeTelegram serves deterministic upload.GetFile parts from local files through
+an object that looks like util.media_session_pool.MediaSessionPool, so
+ByteStreamer, the chunk cache, the scheduler and the aiohttp routes run
+unchanged on top of it. Latency, jitter, transient errors and FloodWaits can be
+injected per GetFile call.
+"""
+
+import asyncio
+import datetime
+import hashlib
+import os
+import random
+from contextlib import asynccontextmanager
+from typing import Optional
+
+from pyrogram import raw
+from pyrogram.errors import FloodWait, InternalServerError
+from pyrogram.file_id import FileId, FileType
+
+from util.clients import ClientRotation
+from util.custom_dl import get_streamer
+from util.file_properties import build_file_id
+
+# Telegram never returns more than this per GetFile call.
+MAX_PART_SIZE = 1024 * 1024
+
+
+def make_test_file(path: str, size: int, seed: int = 0) -> str:
+    """Writes `size` deterministic pseudo-random bytes to `path` unless it already exists with that size."""
+    if os.path.exists(path) and os.path.getsize(path) == size:
+        return path
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    rng = random.Random(seed)
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining > 0:
+            block = min(remaining, MAX_PART_SIZE)
+            f.write(rng.randbytes(block))
+            remaining -= block
+    return path
+
+
+def _read_part(path: str, offset: int, limit: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(limit)
+
+
+class FakeMediaSession:
+    """Answers upload.GetFile like a media DC session would."""
+
+    def __init__(self, telegram: "FakeTelegram", dc_id: int):
+        self.telegram = telegram
+        self.dc_id = dc_id
+
+    async def invoke(self, query, retries: int = 0, timeout: float = None):
+        telegram = self.telegram
+        if not isinstance(query, raw.functions.upload.GetFile):
+            raise NotImplementedError(f"FakeTelegram only serves upload.GetFile, not {type(query).__name__}.")
+        telegram.calls += 1
+
+        delay = telegram.latency + random.uniform(0, telegram.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        roll = random.random()
+        if roll < telegram.flood_rate:
+            telegram.injected_flood_waits += 1
+            raise FloodWait(value=telegram.flood_wait_seconds)
+        if roll < telegram.flood_rate + telegram.error_rate:
+            telegram.injected_errors += 1
+            raise random.choice((InternalServerError(), ConnectionResetError("injected by FakeTelegram")))
+
+        if query.limit > MAX_PART_SIZE or query.offset % 4096 or query.limit % 4096:
+            raise ValueError(f"Invalid GetFile window offset={query.offset} limit={query.limit}.")
+
+        path = telegram.paths.get(query.location.id)
+        if path is None:
+            raise ValueError(f"Unknown media id {query.location.id}.")
+        loop = asyncio.get_running_loop()
+        data = await loop.run_in_executor(None, _read_part, path, query.offset, query.limit)
+        telegram.bytes_served += len(data)
+        return raw.types.upload.File(type=raw.types.storage.FilePartial(), mtime=0, bytes=data)
+
+
+class FakeSessionPool:
+    """Drop-in for MediaSessionPool: every DC gets one FakeMediaSession that never fails to connect."""
+
+    def __init__(self, telegram: "FakeTelegram"):
+        self.telegram = telegram
+        self.sessions = {}
+        self.in_flight = 0
+
+    @asynccontextmanager
+    async def session(self, dc_id: int):
+        session = self.sessions.get(dc_id)
+        if session is None:
+            session = self.sessions[dc_id] = FakeMediaSession(self.telegram, dc_id)
+        self.in_flight += 1
+        try:
+            yield session
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {dc_id: [self.in_flight] for dc_id in self.sessions}
+
+    async def stop(self):
+        self.sessions.clear()
+
+
+class FakeBot:
+    """The attributes of the bot that the web routes and ByteStreamer rely on."""
+
+    def __init__(self, name: str = "FakeBot", vps_ip: str = "127.0.0.1", vps_port: int = 0):
+        self.name = name
+        self.vps_ip = vps_ip
+        self.vps_port = vps_port
+        self.owner_db_channel = None
+        self.me = type("Me", (), {"username": name})()
+        self.client_rotation = ClientRotation()
+        self.client_rotation.add(self)
+
+
+class FakeTelegram:
+    """
+    Registry of local files exposed as Telegram documents.
+
+    - `latency` / `jitter`: seconds added to every GetFile call (jitter is uniform).
+    - `error_rate`: share of calls failing with InternalServerError or a reset connection.
+    - `flood_rate`: share of calls failing with FloodWait(`flood_wait_seconds`).
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 flood_rate: float = 0.0, flood_wait_seconds: int = 1, dc_id: int = 4, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.flood_rate = flood_rate
+        self.flood_wait_seconds = flood_wait_seconds
+        self.dc_id = dc_id
+        if seed is not None:
+            random.seed(seed)
+
+        self.paths = {}  # media_id -> local path
+        self.file_ids = {}  # message_id -> FileId
+        self.calls = 0
+        self.bytes_served = 0
+        self.injected_errors = 0
+        self.injected_flood_waits = 0
+
+    def add_file(self, message_id: int, path: str, mime_type: str = "video/mp4") -> FileId:
+        """Registers a local file as the document behind stream message `message_id`."""
+        digest = hashlib.sha1(os.path.abspath(path).encode()).digest()
+        media_id = int.from_bytes(digest[:8], "big") >> 1
+        encoded = FileId(
+            file_type=FileType.DOCUMENT, dc_id=self.dc_id, media_id=media_id,
+            access_hash=int.from_bytes(digest[8:16], "big") >> 1, file_reference=b"fake"
+        ).encode()
+        file_id = build_file_id(
+            encoded, message_id,
+            file_unique_id=f"fake{digest.hex()[:16]}",
+            file_size=os.path.getsize(path),
+            mime_type=mime_type,
+            file_name=os.path.basename(path),
+            date=datetime.datetime.fromtimestamp(os.path.getmtime(path))
+        )
+        self.paths[media_id] = path
+        self.file_ids[message_id] = file_id
+        return file_id
+
+    def attach(self, bot) -> None:
+        """Points the bot's streamer at this backend and preloads the registered descriptors."""
+        bot.media_session_pool = FakeSessionPool(self)
+        streamer = get_streamer(bot)
+        streamer.session_pool = bot.media_session_pool
+        for message_id, file_id in self.file_ids.items():
+            streamer.cached_file_ids.set(message_id, file_id)
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "bytes_served": self.bytes_served,
+            "injected_errors": self.injected_errors,
+            "injected_flood_waits": self.injected_flood_waits,
+        }
@@ -0,0 +1,207 @@
+# benchmarks/stream_bench.py
+
+"""
+Streaming throughput benchmark against the real aiohttp app and ByteStreamer,
+backed by FakeTelegram instead of a live account.
+
+Run from the repository root, e.g.:
+
+    python -m benchmarks.stream_bench --files 4 --size-mb 64 --concurrency 50 --requests 400
+    python -m benchmarks.stream_bench --latency 0.08 --jitter 0.04 --error-rate 0.01 --flood-rate 0.001
+
+Reports throughput, time-to-first-byte percentiles and peak memory per
+concurrent stream. The chunk cache is off unless --cache-mb is given, so runs
+measure the Telegram path.
+"""
+
+import argparse
+import asyncio
+import gc
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+import aiohttp
+from aiohttp import web
+
+from config import Config
+
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark /stream and /download against a fake Telegram backend.")
+    parser.add_argument("--files", type=int, default=4, help="number of distinct files")
+    parser.add_argument("--size-mb", type=float, default=32, help="size of each file")
+    parser.add_argument("--data-dir", default=None, help="where test files are kept (default: a temp dir)")
+    parser.add_argument("--concurrency", type=int, default=20, help="simultaneous client connections")
+    parser.add_argument("--requests", type=int, default=100, help="total requests to send")
+    parser.add_argument("--ranged", type=float, default=0.5, help="share of requests sent with a Range header")
+    parser.add_argument("--range-mb", type=float, default=4, help="maximum size of a ranged request")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every GetFile call")
+    parser.add_argument("--jitter", type=float, default=0.02, help="extra random seconds per GetFile call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of GetFile calls failing transiently")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="share of GetFile calls failing with FloodWait")
+    parser.add_argument("--flood-wait", type=int, default=1, help="seconds in each injected FloodWait")
+    parser.add_argument("--prefetch", type=int, default=Config.STREAM_PREFETCH_CHUNKS, help="STREAM_PREFETCH_CHUNKS")
+    parser.add_argument("--cache-mb", type=int, default=0, help="chunk cache size; 0 disables it")
+    parser.add_argument("--verify", action="store_true", help="compare every body with the source file")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args(argv)
+
+
+def configure(args, cache_dir: str):
+    """Overrides Config before the lazily created cache and scheduler read it."""
+    Config.STREAM_PREFETCH_CHUNKS = args.prefetch
+    Config.STREAM_MAX_ACTIVE = max(Config.STREAM_MAX_ACTIVE, args.concurrency)
+    Config.STREAM_MAX_PER_IP = max(Config.STREAM_MAX_PER_IP, args.concurrency)
+    Config.STREAM_BANDWIDTH_LIMIT_MB = 0
+    Config.STREAM_CACHE_MAX_MB = args.cache_mb
+    Config.STREAM_CACHE_DIR = cache_dir
+    Config.STREAM_CACHE_ADMIT_AFTER = 1
+    Config.FILE_PROPERTIES_CACHE_SIZE = max(Config.FILE_PROPERTIES_CACHE_SIZE, args.files)
+
+
+class Result:
+    def __init__(self):
+        self.ttfb = []
+        self.durations = []
+        self.bytes = 0
+        self.statuses = {}
+        self.failures = 0
+        self.mismatches = 0
+
+
+async def run_one(session, base_url, files, args, result: Result, rng: random.Random):
+    message_id, path, size = rng.choice(files)
+    route = rng.choice(("stream", "download"))
+    headers = {}
+    start, end = 0, size - 1
+    if rng.random() < args.ranged:
+        length = max(1, int(rng.uniform(0.1, 1.0) * args.range_mb * 1024 * 1024))
+        start = rng.randrange(0, size)
+        end = min(size - 1, start + length - 1)
+        headers["Range"] = f"bytes={start}-{end}"
+
+    began = time.perf_counter()
+    received = 0
+    body = bytearray() if args.verify else None
+    try:
+        async with session.get(f"{base_url}/{route}/{message_id}", headers=headers) as resp:
+            result.statuses[resp.status] = result.statuses.get(resp.status, 0) + 1
+            first = True
+            async for data in resp.content.iter_any():
+                if first:
+                    result.ttfb.append(time.perf_counter() - began)
+                    first = False
+                received += len(data)
+                if body is not None:
+                    body.extend(data)
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        result.failures += 1
+        return
+    finally:
+        result.bytes += received
+
+    result.durations.append(time.perf_counter() - began)
+    expected_length = end - start + 1
+    if received != expected_length:
+        result.mismatches += 1
+    elif body is not None:
+        with open(path, "rb") as f:
+            f.seek(start)
+            if f.read(expected_length) != bytes(body):
+                result.mismatches += 1
+
+
+async def main(args):
+    from benchmarks.fake_telegram import FakeBot, FakeTelegram, make_test_file
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir or os.path.join(tmp, "files")
+        configure(args, os.path.join(tmp, "cache"))
+
+        from server import web_server
+
+        telegram = FakeTelegram(
+            latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+            flood_rate=args.flood_rate, flood_wait_seconds=args.flood_wait, seed=args.seed
+        )
+        size = int(args.size_mb * 1024 * 1024)
+        files = []
+        for i in range(args.files):
+            path = make_test_file(os.path.join(data_dir, f"bench_{i}_{size}.bin"), size, seed=i)
+            telegram.add_file(1000 + i, path)
+            files.append((1000 + i, path, size))
+
+        bot = FakeBot()
+        telegram.attach(bot)
+        app = await web_server(bot)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        base_url = f"http://127.0.0.1:{port}"
+
+        gc.collect()
+        baseline_rss = _peak_rss_mb()
+        result = Result()
+        queue = asyncio.Queue()
+        for _ in range(args.requests):
+            queue.put_nowait(None)
+
+        async def worker(n):
+            rng = random.Random(args.seed * 1000 + n)
+            while True:
+                try:
+                    queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await run_one(session, base_url, files, args, result, rng)
+
+        connector = aiohttp.TCPConnector(limit=args.concurrency)
+        timeout = aiohttp.ClientTimeout(total=None, sock_read=120)
+        began = time.perf_counter()
+        try:
+            async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+                await asyncio.gather(*(worker(n) for n in range(args.concurrency)))
+        finally:
+            elapsed = time.perf_counter() - began
+            await runner.cleanup()
+
+        peak_rss = _peak_rss_mb()
+        report(args, result, elapsed, baseline_rss, peak_rss, telegram.stats())
+        return 1 if result.failures or result.mismatches else 0
+
+
+def report(args, result: Result, elapsed: float, baseline_rss: float, peak_rss: float, backend: dict):
+    mb = result.bytes / (1024 * 1024)
+    completed = len(result.durations)
+    print(f"requests        {completed}/{args.requests} completed, {result.failures} failed, {result.mismatches} short or corrupt")
+    print(f"statuses        {dict(sorted(result.statuses.items()))}")
+    print(f"elapsed         {elapsed:.2f}s")
+    print(f"throughput      {mb / elapsed:.1f} MB/s ({mb:.1f} MB), {completed / elapsed:.1f} req/s")
+    print(f"ttfb            p50 {_percentile(result.ttfb, 50) * 1000:.1f} ms, p99 {_percentile(result.ttfb, 99) * 1000:.1f} ms")
+    print(f"duration        p50 {_percentile(result.durations, 50):.2f}s, p99 {_percentile(result.durations, 99):.2f}s")
+    print(f"memory          peak RSS {peak_rss:.1f} MB, {max(0.0, peak_rss - baseline_rss) / max(1, args.concurrency):.2f} MB per concurrent stream")
+    print(f"fake telegram   {backend}")
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
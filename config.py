@@ -27,7 +27,103 @@ class Config:
     
     # Port for the web server (both redirect and streaming)
     VPS_PORT = int(os.environ.get("VPS_PORT", 8080)) #7071 is a custom port you can add any
+
+    # Prometheus metrics are served on their own listener, never on the public port above.
+    # Keep METRICS_HOST on localhost or a private interface; METRICS_PORT = 0 turns it off.
+    # Web worker N, if any, serves its own metrics on METRICS_PORT + N.
+    METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+    METRICS_PORT = int(os.environ.get("METRICS_PORT", 9101))
+
+    # Web worker processes sharing VPS_PORT via SO_REUSEPORT (Linux). 0 serves the web
+    # routes from the bot process itself.
+    WEB_WORKERS = int(os.environ.get("WEB_WORKERS", 0))
     
+    # Number of Telegram chunk requests kept in flight per stream.
+    # Each one can hold up to 1 MB in memory, so keep this modest.
+    STREAM_PREFETCH_CHUNKS = int(os.environ.get("STREAM_PREFETCH_CHUNKS", 4))
+
+    # Recoverable errors (timeouts, expired file references, DC migrations...) a single
+    # stream may retry before it is aborted, and the longest backoff between retries.
+    STREAM_RETRY_BUDGET = int(os.environ.get("STREAM_RETRY_BUDGET", 10))
+    STREAM_RETRY_MAX_DELAY = float(os.environ.get("STREAM_RETRY_MAX_DELAY", 8))
+    # Longer FloodWaits abort the stream instead of stalling the viewer.
+    STREAM_MAX_FLOOD_WAIT = int(os.environ.get("STREAM_MAX_FLOOD_WAIT", 30))
+
+    # Streaming admission control: total concurrent streams, streams per client IP,
+    # and how long (seconds) a request may queue for a free slot before getting a 503.
+    # With WEB_WORKERS the total is split between the workers, but the per-IP limit holds
+    # in each worker: connections are spread by the kernel, so one IP may get up to
+    # STREAM_MAX_PER_IP streams per worker.
+    STREAM_MAX_ACTIVE = int(os.environ.get("STREAM_MAX_ACTIVE", 100))
+    STREAM_MAX_PER_IP = int(os.environ.get("STREAM_MAX_PER_IP", 4))
+    STREAM_QUEUE_TIMEOUT = float(os.environ.get("STREAM_QUEUE_TIMEOUT", 5))
+    # Total egress for Telegram-backed streams in MB/s, shared equally between client IPs (0 = unlimited).
+    STREAM_BANDWIDTH_LIMIT_MB = float(os.environ.get("STREAM_BANDWIDTH_LIMIT_MB", 0))
+    # Only enable behind a reverse proxy that sets X-Forwarded-For.
+    STREAM_TRUST_FORWARDED_FOR = os.environ.get("STREAM_TRUST_FORWARDED_FOR", "False").lower() in ("1", "true", "yes")
+
+    # On-disk cache for streamed file chunks. Set STREAM_CACHE_MAX_MB to 0 to disable it.
+    # With WEB_WORKERS all workers share the directory and the budget.
+    STREAM_CACHE_DIR = os.environ.get("STREAM_CACHE_DIR", "stream_cache")
+    STREAM_CACHE_MAX_MB = int(os.environ.get("STREAM_CACHE_MAX_MB", 2048))
+    # A chunk is only cached once it has been requested this many times.
+    STREAM_CACHE_ADMIT_AFTER = int(os.environ.get("STREAM_CACHE_ADMIT_AFTER", 2))
+    # If nginx proxies the web server, set this to an `internal` location aliased to
+    # STREAM_CACHE_DIR (e.g. "/cached/") and nginx will serve fully cached files itself.
+    STREAM_ACCEL_REDIRECT_PREFIX = os.environ.get("STREAM_ACCEL_REDIRECT_PREFIX", "")
+
+    # Optional helper bot tokens (space or comma separated) used to spread streaming load.
+    # Each helper bot must be an admin in OWNER_DB_CHANNEL.
+    MULTI_CLIENT_TOKENS = [t for t in os.environ.get("MULTI_CLIENT_TOKENS", "").replace(",", " ").split() if t]
+
+    # Media sessions (MTProto connections) opened per Telegram DC for streaming.
+    MEDIA_SESSIONS_PER_DC = int(os.environ.get("MEDIA_SESSIONS_PER_DC", 4))
+    # Consecutive connection errors after which a media session is replaced.
+    MEDIA_SESSION_MAX_FAILURES = int(os.environ.get("MEDIA_SESSION_MAX_FAILURES", 3))
+
+    # How many stream descriptors (file_id, size, mime) each streamer keeps in memory.
+    FILE_PROPERTIES_CACHE_SIZE = int(os.environ.get("FILE_PROPERTIES_CACHE_SIZE", 1000))
+
+    # Rendered /watch pages kept in memory, and for how long (seconds).
+    WATCH_PAGE_CACHE_SIZE = int(os.environ.get("WATCH_PAGE_CACHE_SIZE", 2000))
+    WATCH_PAGE_CACHE_TTL = int(os.environ.get("WATCH_PAGE_CACHE_TTL", 600))
+
+    # Ingestion queue: files processed at once, pending files whose messages are kept
+    # in memory (later ones are fetched again when their turn comes), and attempts
+    # (with exponential backoff from the base delay) before a file is dead-lettered.
+    INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", 4))
+    INGEST_MAX_PENDING = int(os.environ.get("INGEST_MAX_PENDING", 500))
+    INGEST_MAX_ATTEMPTS = int(os.environ.get("INGEST_MAX_ATTEMPTS", 5))
+    INGEST_RETRY_BASE_DELAY = float(os.environ.get("INGEST_RETRY_BASE_DELAY", 10))
+    # Fairness across owners: files of one owner processed at once, and batches
+    # (parse + post) finalized at once across all owners.
+    INGEST_PER_OWNER_LIMIT = int(os.environ.get("INGEST_PER_OWNER_LIMIT", 1))
+    POST_WORKERS = int(os.environ.get("POST_WORKERS", 3))
+    # Seconds a shutdown waits for files already being processed.
+    INGEST_DRAIN_TIMEOUT = float(os.environ.get("INGEST_DRAIN_TIMEOUT", 60))
+    # Worker processes for filename parsing and title clustering (0 = run on the
+    # event loop), and the batch size below which work stays inline anyway.
+    PARSE_PROCESSES = int(os.environ.get("PARSE_PROCESSES", 2))
+    PARSE_INLINE_LIMIT = int(os.environ.get("PARSE_INLINE_LIMIT", 16))
+
+    # Offline IMDb title index (built by /refresh_imdb_index from the public
+    # datasets), and whether titles it does not know are looked up over the network.
+    IMDB_INDEX_DIR = os.environ.get("IMDB_INDEX_DIR", "imdb_index")
+    IMDB_DATASET_URL = os.environ.get("IMDB_DATASET_URL", "https://datasets.imdbws.com")
+    IMDB_NETWORK_FALLBACK = os.environ.get("IMDB_NETWORK_FALLBACK", "true").lower() in ("1", "true", "yes")
+    # Network IMDb lookups are cached in Mongo, fronted by an in-memory LRU of this
+    # many titles. Found titles are kept for IMDB_CACHE_TTL seconds, misses and
+    # rejected matches for IMDB_NEGATIVE_CACHE_TTL.
+    IMDB_CACHE_SIZE = int(os.environ.get("IMDB_CACHE_SIZE", 5000))
+    IMDB_CACHE_TTL = int(os.environ.get("IMDB_CACHE_TTL", 30 * 24 * 3600))
+    IMDB_NEGATIVE_CACHE_TTL = int(os.environ.get("IMDB_NEGATIVE_CACHE_TTL", 24 * 3600))
+    # Threads for Cinemagoer calls, seconds each call may take, and consecutive
+    # failures after which lookups are skipped for IMDB_BREAKER_COOLDOWN seconds.
+    IMDB_WORKERS = int(os.environ.get("IMDB_WORKERS", 4))
+    IMDB_CALL_TIMEOUT = float(os.environ.get("IMDB_CALL_TIMEOUT", 15))
+    IMDB_BREAKER_FAILURES = int(os.environ.get("IMDB_BREAKER_FAILURES", 5))
+    IMDB_BREAKER_COOLDOWN = float(os.environ.get("IMDB_BREAKER_COOLDOWN", 120))
+
     # The name of the file that stores your bot's username (for the redirector)
     BOT_USERNAME_FILE = "@is_file_store_advanced_bot.txt"
     
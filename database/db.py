@@ -3,10 +3,27 @@
 import datetime
 import logging
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, monitoring
 from config import Config
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+from util.metrics import MONGO_COMMAND_SECONDS, MONGO_COMMAND_FAILURES
 
-client = AsyncIOMotorClient(Config.MONGO_URI)
+
+class _CommandMetrics(monitoring.CommandListener):
+    """Feeds MongoDB command latencies into /metrics via pymongo's command monitoring."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1_000_000, command=event.command_name)
+
+    def failed(self, event):
+        MONGO_COMMAND_SECONDS.observe(event.duration_micros / 1_000_000, command=event.command_name)
+        MONGO_COMMAND_FAILURES.inc(command=event.command_name)
+
+
+client = AsyncIOMotorClient(Config.MONGO_URI, event_listeners=[_CommandMetrics()])
 db = client[Config.DATABASE_NAME]
 logger = logging.getLogger(__name__)
 
@@ -18,6 +35,12 @@ verified_users = db['verified_users']
 # --- NEW: Collections for Daily Stats ---
 daily_stats = db['daily_stats']
 monthly_records = db['monthly_records']
+# Durable ingestion work queue (one job per file posted in an Index DB channel)
+ingest_queue = db['ingest_queue']
+# Batches being collected, so they survive restarts
+batch_states = db['batch_states']
+# IMDb title lookups (including misses), so the same title is not searched again
+title_cache = db['title_cache']
 
 
 async def add_user(user_id):
@@ -156,6 +179,7 @@ async def save_file_data(owner_id, original_message, copied_message, stream_mess
     """Saves file metadata, including the new stream_id."""
     from utils.helpers import get_file_raw_link
     original_media = getattr(original_message, original_message.media.value)
+    stream_media = getattr(stream_message, stream_message.media.value)
     raw_link = await get_file_raw_link(copied_message)
     file_data = {
         'owner_id': owner_id,
@@ -164,13 +188,182 @@ async def save_file_data(owner_id, original_message, copied_message, stream_mess
         'stream_id': stream_message.id,
         'file_name': original_media.file_name,
         'file_size': original_media.file_size,
-        'raw_link': raw_link
+        'raw_link': raw_link,
+        # Stream descriptor: lets the web server stream without calling get_messages.
+        'stream_file_id': stream_media.file_id,
+        'mime_type': getattr(stream_media, 'mime_type', None),
+        'uploaded_at': stream_message.date
     }
     await files.update_one(
         {'owner_id': owner_id, 'file_unique_id': original_media.file_unique_id},
         {'$set': file_data}, upsert=True
     )
 
+async def ensure_files_indexes():
+    # Every stream request resolves its file by stream_id.
+    await files.create_index('stream_id')
+
+async def get_file_by_stream_id(stream_id: int):
+    """Fetches the file record (and its stream descriptor) for a message in the Owner DB channel."""
+    return await files.find_one({'stream_id': stream_id})
+
+async def update_stream_descriptor(stream_id: int, stream_file_id: str, mime_type: str = None, uploaded_at=None):
+    """Stores a fresh file_id (e.g. after its file_reference expired) for a stream message."""
+    await files.update_many(
+        {'stream_id': stream_id},
+        {'$set': {'stream_file_id': stream_file_id, 'mime_type': mime_type, 'uploaded_at': uploaded_at}}
+    )
+
+async def save_parsed_info(owner_id: int, file_unique_id: str, info: dict, version):
+    """Stores the parsed filename metadata on a file record, tagged with the parser version."""
+    await files.update_one(
+        {'owner_id': owner_id, 'file_unique_id': file_unique_id},
+        {'$set': {'parsed': info, 'parse_version': version}}
+    )
+
+async def get_parsed_infos(owner_id: int, file_unique_ids, version):
+    """file_unique_id -> stored parse, for the given files parsed by parser `version`."""
+    cursor = files.find(
+        {'owner_id': owner_id, 'file_unique_id': {'$in': list(file_unique_ids)}, 'parse_version': version},
+        {'file_unique_id': 1, 'parsed': 1}
+    )
+    return {doc['file_unique_id']: doc['parsed'] async for doc in cursor}
+
+async def get_files_to_reparse(version, after_id=None, limit: int = 100):
+    """A page of file records whose stored parse came from another parser version, in _id order."""
+    query = {'parse_version': {'$exists': True, '$ne': version}}
+    if after_id is not None:
+        query['_id'] = {'$gt': after_id}
+    cursor = files.find(query, {'owner_id': 1, 'file_unique_id': 1, 'file_name': 1}).sort('_id', 1).limit(limit)
+    return await cursor.to_list(length=limit)
+
+# --- Ingestion queue ---
+
+async def ensure_ingest_queue_indexes():
+    await ingest_queue.create_index([('chat_id', 1), ('message_id', 1)], unique=True)
+    await ingest_queue.create_index([('status', 1), ('next_attempt_at', 1)])
+    # Finished jobs are only kept long enough to ignore redelivered updates.
+    await ingest_queue.create_index('finished_at', expireAfterSeconds=7 * 24 * 3600)
+
+async def enqueue_ingest_job(owner_id: int, chat_id: int, message_id: int, file_name: str = None):
+    """Adds a job for a file unless one already exists. Returns True if a new job was created."""
+    now = datetime.datetime.utcnow()
+    result = await ingest_queue.update_one(
+        {'chat_id': chat_id, 'message_id': message_id},
+        {'$setOnInsert': {
+            'owner_id': owner_id, 'chat_id': chat_id, 'message_id': message_id,
+            'file_name': file_name, 'status': 'pending', 'attempts': 0,
+            'created_at': now, 'next_attempt_at': now
+        }},
+        upsert=True
+    )
+    return result.upserted_id is not None
+
+async def claim_ingest_job(owner_id: int = None, exclude_owners=()):
+    """
+    Atomically takes the oldest due pending job (of `owner_id`, if given, and
+    of none of `exclude_owners`) and marks it as processing.
+    """
+    now = datetime.datetime.utcnow()
+    query = {'status': 'pending', 'next_attempt_at': {'$lte': now}}
+    if owner_id is not None:
+        query['owner_id'] = owner_id
+    elif exclude_owners:
+        query['owner_id'] = {'$nin': list(exclude_owners)}
+    return await ingest_queue.find_one_and_update(
+        query,
+        {'$set': {'status': 'processing', 'claimed_at': now}, '$inc': {'attempts': 1}},
+        sort=[('next_attempt_at', 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+async def unclaim_ingest_job(job_id):
+    """Hands a claimed job back untouched, as if it had never been claimed."""
+    await ingest_queue.update_one(
+        {'_id': job_id, 'status': 'processing'},
+        {'$set': {'status': 'pending'}, '$inc': {'attempts': -1}, '$unset': {'claimed_at': ''}}
+    )
+
+async def set_ingest_job_copied(job_id, copied_message_id: int):
+    """Records the Owner DB copy so a retried job does not copy the file twice."""
+    await ingest_queue.update_one({'_id': job_id}, {'$set': {'copied_message_id': copied_message_id}})
+
+async def complete_ingest_job(job_id):
+    await ingest_queue.update_one(
+        {'_id': job_id},
+        {'$set': {'status': 'done', 'finished_at': datetime.datetime.utcnow()}, '$unset': {'claimed_at': ''}}
+    )
+
+async def retry_ingest_job(job_id, delay_seconds: float, error: str):
+    await ingest_queue.update_one(
+        {'_id': job_id},
+        {'$set': {
+            'status': 'pending', 'last_error': error,
+            'next_attempt_at': datetime.datetime.utcnow() + datetime.timedelta(seconds=delay_seconds)
+        }, '$unset': {'claimed_at': ''}}
+    )
+
+async def dead_letter_ingest_job(job_id, error: str):
+    await ingest_queue.update_one(
+        {'_id': job_id},
+        {'$set': {'status': 'dead', 'last_error': error, 'dead_at': datetime.datetime.utcnow()}, '$unset': {'claimed_at': ''}}
+    )
+
+async def reset_stale_ingest_jobs():
+    """Returns jobs left in 'processing' by a previous run to the queue. Returns how many were reset."""
+    result = await ingest_queue.update_many(
+        {'status': 'processing'},
+        {'$set': {'status': 'pending', 'next_attempt_at': datetime.datetime.utcnow()}, '$unset': {'claimed_at': ''}}
+    )
+    return result.modified_count
+
+async def count_ingest_jobs(status: str = 'pending'):
+    return await ingest_queue.count_documents({'status': status})
+
+async def count_ingest_jobs_by_owner():
+    """owner_id -> number of pending or processing jobs."""
+    cursor = ingest_queue.aggregate([
+        {'$match': {'status': {'$in': ['pending', 'processing']}}},
+        {'$group': {'_id': '$owner_id', 'count': {'$sum': 1}}}
+    ])
+    return {doc['_id']: doc['count'] async for doc in cursor}
+
+async def requeue_dead_ingest_jobs():
+    """Gives every dead-lettered job a fresh set of attempts. Returns how many were requeued."""
+    result = await ingest_queue.update_many(
+        {'status': 'dead'},
+        {'$set': {'status': 'pending', 'attempts': 0, 'next_attempt_at': datetime.datetime.utcnow()}, '$unset': {'dead_at': ''}}
+    )
+    return result.modified_count
+
+# --- Batch collection state ---
+
+async def save_batch_state(user_id: int, state: dict):
+    """Stores (part of) a user's batch collection state."""
+    await batch_states.update_one({'user_id': user_id}, {'$set': state}, upsert=True)
+
+async def delete_batch_state(user_id: int):
+    await batch_states.delete_one({'user_id': user_id})
+
+async def get_all_batch_states():
+    return await batch_states.find({}).to_list(length=None)
+
+# --- IMDb title cache ---
+
+async def ensure_title_cache_indexes():
+    await title_cache.create_index('expires_at', expireAfterSeconds=0)
+
+async def get_cached_title(key: str):
+    """Returns the cached lookup for a normalized title, unless it has expired."""
+    return await title_cache.find_one({'_id': key, 'expires_at': {'$gt': datetime.datetime.utcnow()}})
+
+async def save_cached_title(key: str, title, year, expires_at: datetime.datetime):
+    await title_cache.update_one(
+        {'_id': key},
+        {'$set': {'title': title, 'year': year, 'expires_at': expires_at}},
+        upsert=True
+    )
+
 async def get_user(user_id):
     return await users.find_one({'user_id': user_id})
 
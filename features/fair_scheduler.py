@@ -0,0 +1,128 @@
+# features/fair_scheduler.py
+
+import asyncio
+import logging
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+# Priority tiers an owner can be put in (users.priority); the weight is the
+# owner's share of turns relative to others with work waiting.
+PRIORITY_WEIGHTS = {"low": 1, "normal": 2, "high": 4}
+DEFAULT_PRIORITY = "normal"
+
+
+def priority_weight(tier) -> int:
+    return PRIORITY_WEIGHTS.get(tier or DEFAULT_PRIORITY, PRIORITY_WEIGHTS[DEFAULT_PRIORITY])
+
+
+class FairScheduler:
+    """
+    Weighted round-robin across owners, so one owner's 500-file forward
+    cannot starve everyone else.
+
+    - `choose()` picks the next owner from a set of candidates using smooth
+      weighted round-robin (the nginx algorithm): over time each owner gets
+      turns in proportion to its weight, without long bursts. `reserve()`
+      also counts the pick as running before the caller awaits anything.
+    - At most `per_owner_limit` units of work run for one owner at a time.
+    - `slot()` additionally caps total concurrency at `capacity` and hands
+      freed slots to waiting owners in weighted round-robin order.
+    """
+
+    def __init__(self, name: str, capacity: int, per_owner_limit: int):
+        self.name = name
+        self.capacity = max(1, capacity)
+        self.per_owner_limit = max(1, per_owner_limit)
+        self.weights = {}  # owner -> weight
+        self.current = defaultdict(int)  # owner -> smooth WRR credit
+        self.active = defaultdict(int)  # owner -> running units
+        self.waiters = defaultdict(deque)  # owner -> futures waiting for a slot
+        self.running = 0
+
+    def set_weight(self, owner: int, weight: int):
+        self.weights[owner] = max(1, weight)
+
+    def has_weight(self, owner: int) -> bool:
+        return owner in self.weights
+
+    def at_limit(self, owner: int) -> bool:
+        return self.active.get(owner, 0) >= self.per_owner_limit
+
+    def choose(self, owners):
+        """Returns the owner whose turn it is, or None if every candidate is at its limit."""
+        eligible = [o for o in owners if not self.at_limit(o)]
+        if not eligible:
+            return None
+        total, best = 0, None
+        for owner in eligible:
+            weight = self.weights.get(owner, 1)
+            self.current[owner] += weight
+            total += weight
+            if best is None or self.current[owner] > self.current[best]:
+                best = owner
+        self.current[best] -= total
+        return best
+
+    def reserve(self, owners):
+        """choose() and start() in one step, so callers that await before running cannot pick the same owner twice."""
+        owner = self.choose(owners)
+        if owner is not None:
+            self.start(owner)
+        return owner
+
+    def start(self, owner: int):
+        """Counts a unit of work for `owner` that was admitted elsewhere (e.g. by claiming a job)."""
+        self.active[owner] += 1
+        self.running += 1
+
+    def release(self, owner: int):
+        self.running -= 1
+        self.active[owner] -= 1
+        if self.active[owner] <= 0:
+            del self.active[owner]
+            if not self.waiters.get(owner):
+                self.current.pop(owner, None)
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.running < self.capacity:
+            owner = self.choose([o for o, queue in self.waiters.items() if queue])
+            if owner is None:
+                return
+            queue = self.waiters[owner]
+            future = queue.popleft()
+            if not queue:
+                del self.waiters[owner]
+            if future.done():
+                continue
+            self.start(owner)
+            future.set_result(None)
+
+    def can_start_now(self, owner: int) -> bool:
+        return self.running < self.capacity and not self.at_limit(owner) and not any(self.waiters.values())
+
+    @asynccontextmanager
+    async def slot(self, owner: int):
+        """Holds one of the `capacity` slots for `owner`, waiting for its turn if needed."""
+        if self.can_start_now(owner):
+            self.start(owner)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self.waiters[owner].append(future)
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self.release(owner)
+                raise
+        try:
+            yield
+        finally:
+            self.release(owner)
+
+    def depth(self) -> dict:
+        """owner -> (running, waiting)"""
+        owners = set(self.active) | {o for o, q in self.waiters.items() if q}
+        return {o: (self.active.get(o, 0), len(self.waiters.get(o, ()))) for o in owners}
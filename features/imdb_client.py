@@ -0,0 +1,134 @@
+# features/imdb_client.py
+
+import asyncio
+import functools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from imdb import Cinemagoer
+from config import Config
+from util.metrics import IMDB_CALL_SECONDS, IMDB_CALL_FAILURES, IMDB_CIRCUIT_OPEN
+
+logger = logging.getLogger(__name__)
+
+
+class ImdbUnavailable(Exception):
+    """IMDb lookups are being skipped because recent calls kept failing."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls for
+    `cooldown` seconds. After that a single trial call is let through: success
+    closes the breaker, failure opens it for another cooldown.
+    """
+
+    def __init__(self, failure_threshold: int, cooldown: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if self.trial_running or time.monotonic() - self.opened_at < self.cooldown:
+            return False
+        self.trial_running = True
+        return True
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info("IMDb is answering again; resuming lookups.")
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        IMDB_CIRCUIT_OPEN.set(0)
+
+    def record_failure(self, trial: bool = False):
+        self.failures += 1
+        if self.opened_at is None and self.failures >= self.failure_threshold:
+            logger.warning(f"IMDb failed {self.failures} times in a row; skipping lookups for {self.cooldown:g}s.")
+            self.opened_at = time.monotonic()
+            IMDB_CIRCUIT_OPEN.set(1)
+        elif trial:
+            self.opened_at = time.monotonic()
+        if trial:
+            self.trial_running = False
+
+
+class ImdbClient:
+    """
+    Runs Cinemagoer's blocking calls on a dedicated, bounded thread pool (so a
+    large batch cannot tie up the default executor that aiofiles and DNS
+    resolution use), gives each call a deadline, and stops calling IMDb while
+    it keeps failing.
+
+    A call that misses its deadline is abandoned, not interrupted: its thread
+    stays busy until the socket gives up, which the pool size bounds.
+    """
+
+    def __init__(self, workers: int, timeout: float, breaker: CircuitBreaker):
+        self.timeout = timeout
+        self.breaker = breaker
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="imdb")
+        self.ia = Cinemagoer()
+
+    async def _call(self, method: str, func, *args, **kwargs):
+        if not self.breaker.allow():
+            raise ImdbUnavailable("IMDb lookups are paused after repeated failures.")
+        trial = self.breaker.is_open
+        loop = asyncio.get_running_loop()
+        try:
+            with IMDB_CALL_SECONDS.time(method=method):
+                result = await asyncio.wait_for(
+                    loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs)), self.timeout
+                )
+        except asyncio.CancelledError:
+            # The caller went away, which says nothing about IMDb; just free the trial slot.
+            if trial: self.breaker.trial_running = False
+            raise
+        except asyncio.TimeoutError:
+            IMDB_CALL_FAILURES.inc(method=method)
+            self.breaker.record_failure(trial)
+            raise asyncio.TimeoutError(f"IMDb {method} took longer than {self.timeout:g}s")
+        except Exception:
+            IMDB_CALL_FAILURES.inc(method=method)
+            self.breaker.record_failure(trial)
+            raise
+        self.breaker.record_success()
+        return result
+
+    async def search_movie(self, title: str, results: int = 1):
+        return await self._call("search_movie", self.ia.search_movie, title, results=results)
+
+    async def update(self, movie, info):
+        return await self._call("update", self.ia.update, movie, info=info)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_imdb_client = None
+
+
+def get_imdb_client() -> ImdbClient:
+    global _imdb_client
+    if _imdb_client is None:
+        _imdb_client = ImdbClient(
+            Config.IMDB_WORKERS, Config.IMDB_CALL_TIMEOUT,
+            CircuitBreaker(Config.IMDB_BREAKER_FAILURES, Config.IMDB_BREAKER_COOLDOWN)
+        )
+    return _imdb_client
+
+
+def shutdown_imdb_client():
+    global _imdb_client
+    if _imdb_client is not None:
+        _imdb_client.shutdown()
+        _imdb_client = None
@@ -0,0 +1,279 @@
+# features/imdb_index.py
+
+"""
+Offline IMDb title resolution, built from the public IMDb datasets
+(title.basics.tsv.gz, with title.ratings.tsv.gz for popularity).
+
+The index is two files in Config.IMDB_INDEX_DIR:
+
+- titles.dat: one "key<TAB>title<TAB>year<TAB>votes" line per movie or series,
+  sorted by key (the normalized title);
+- titles.idx: the byte offset of every line as little-endian uint64.
+
+Both are memory-mapped, so a lookup is a binary search over the offsets
+followed by a short scan of the titles sharing the query's prefix; nothing is
+loaded into memory up front.
+
+Rebuilding (download + sort) takes a few minutes of CPU and runs in a separate
+process: `python -m features.imdb_index`, which /refresh_imdb_index starts.
+"""
+
+import array
+import asyncio
+import gzip
+import json
+import logging
+import mmap
+import os
+import re
+import shutil
+import sys
+import time
+import urllib.request
+from thefuzz import fuzz
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+DATA_FILE = "titles.dat"
+OFFSETS_FILE = "titles.idx"
+META_FILE = "meta.json"
+
+# What Cinemagoer's search_movie would realistically return for a file; episodes,
+# shorts and video games would only add noise.
+TITLE_TYPES = {"movie", "tvMovie", "tvSeries", "tvMiniSeries", "tvSpecial"}
+# Titles sharing the query's prefix that are checked per lookup.
+MAX_CANDIDATES = 500
+# The same guards get_definitive_title_from_imdb applies to network results.
+MIN_SIMILARITY = 60
+
+_NON_WORD_RE = re.compile(r'[^\w\s]+')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_title(title: str) -> str:
+    return _WHITESPACE_RE.sub(' ', _NON_WORD_RE.sub(' ', title.lower())).strip()
+
+
+class ImdbTitleIndex:
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.data = None
+        self.offsets = None
+        self._view = None
+        self._files = []
+        self._maps = []
+        self.count = 0
+        self.built_at = None
+
+    @property
+    def available(self) -> bool:
+        return self.count > 0
+
+    def load(self) -> bool:
+        """(Re)opens the index files; returns False if there is no index yet."""
+        self.close()
+        data_path = os.path.join(self.directory, DATA_FILE)
+        offsets_path = os.path.join(self.directory, OFFSETS_FILE)
+        if not (os.path.exists(data_path) and os.path.exists(offsets_path)):
+            return False
+        try:
+            for path in (data_path, offsets_path):
+                f = open(path, "rb")
+                self._files.append(f)
+                self._maps.append(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            self.data = self._maps[0]
+            self._view = memoryview(self._maps[1])
+            self.offsets = self._view.cast("Q")
+            self.count = len(self.offsets)
+            with open(os.path.join(self.directory, META_FILE)) as f:
+                self.built_at = json.load(f).get("built_at")
+        except (OSError, ValueError) as e:
+            logger.error(f"Could not open the IMDb title index in '{self.directory}': {e}")
+            self.close()
+            return False
+        logger.info(f"IMDb title index loaded: {self.count} titles.")
+        return True
+
+    def close(self):
+        for view in (self.offsets, self._view):
+            if view is not None: view.release()
+        for m in self._maps: m.close()
+        for f in self._files: f.close()
+        self.data = self.offsets = self._view = None
+        self._files, self._maps = [], []
+        self.count = 0
+        self.built_at = None
+
+    def _key_at(self, i: int) -> bytes:
+        start = self.offsets[i]
+        return self.data[start:self.data.find(b"\t", start)]
+
+    def _record_at(self, i: int):
+        start = self.offsets[i]
+        key, title, year, votes = self.data[start:self.data.find(b"\n", start)].decode("utf-8").split("\t")
+        return key, title, int(year) if year else None, int(votes)
+
+    def _lower_bound(self, key: bytes) -> int:
+        low, high = 0, self.count
+        while low < high:
+            mid = (low + high) // 2
+            if self._key_at(mid) < key: low = mid + 1
+            else: high = mid
+        return low
+
+    def lookup(self, title_from_filename: str):
+        """
+        Returns (title, year) for the best title passing the network lookup's
+        guards, (None, None) if titles were found but all were rejected, or
+        None if the index has nothing under that name.
+        """
+        if not self.available or not title_from_filename:
+            return None
+        query = normalize_title(title_from_filename)
+        if not query:
+            return None
+        query_key = query.encode("utf-8")
+
+        normalized_original = title_from_filename.lower().strip()
+        best, best_rank, seen = None, None, 0
+        i = self._lower_bound(query_key)
+        while i < self.count and seen < MAX_CANDIDATES and self._key_at(i).startswith(query_key):
+            key, title, year, votes = self._record_at(i)
+            i += 1
+            seen += 1
+            if fuzz.ratio(normalized_original, title.lower().strip()) < MIN_SIMILARITY:
+                continue
+            if normalized_original not in title.lower():
+                continue
+            # Exact name first, then the most voted (IMDb's search ranks by popularity).
+            rank = (key == query, votes)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = (title, year), rank
+
+        if seen == 0:
+            return None
+        return best or (None, None)
+
+
+_index = None
+_refreshing = False
+
+
+def get_title_index() -> ImdbTitleIndex:
+    global _index
+    if _index is None:
+        _index = ImdbTitleIndex(Config.IMDB_INDEX_DIR)
+        if not _index.load():
+            logger.info("No offline IMDb title index yet; titles are resolved over the network. Use /refresh_imdb_index to build it.")
+    return _index
+
+
+async def refresh_title_index() -> ImdbTitleIndex:
+    """Rebuilds the index in a separate process and reopens it. Raises if the build fails."""
+    global _refreshing
+    if _refreshing:
+        raise RuntimeError("A rebuild is already running.")
+    _refreshing = True
+    try:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "features.imdb_index",
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        )
+        code = await process.wait()
+        if code != 0:
+            raise RuntimeError(f"Index build exited with code {code}; see the log for details.")
+    finally:
+        _refreshing = False
+    index = get_title_index()
+    index.load()
+    return index
+
+
+# --- Building (runs in the `python -m features.imdb_index` process) ---
+
+def _download(name: str, directory: str) -> str:
+    path = os.path.join(directory, name)
+    url = f"{Config.IMDB_DATASET_URL.rstrip('/')}/{name}"
+    logger.info(f"Downloading {url}...")
+    with urllib.request.urlopen(url, timeout=60) as response, open(path + ".part", "wb") as f:
+        shutil.copyfileobj(response, f, 1024 * 1024)
+    os.replace(path + ".part", path)
+    return path
+
+
+def _read_votes(path: str) -> dict:
+    votes = {}
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        next(f, None)
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) == 3 and parts[2].isdigit():
+                votes[parts[0]] = int(parts[2])
+    return votes
+
+
+def build_index(directory: str, basics_path: str, ratings_path: str = None) -> int:
+    """Writes titles.dat/titles.idx from the dataset files; returns the number of titles."""
+    votes = _read_votes(ratings_path) if ratings_path else {}
+    records = []
+    with gzip.open(basics_path, "rt", encoding="utf-8") as f:
+        next(f, None)
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) < 6 or parts[1] not in TITLE_TYPES:
+                continue
+            title = parts[2]
+            key = normalize_title(title)
+            if not key:
+                continue
+            year = parts[5] if parts[5].isdigit() else ""
+            records.append(f"{key}\t{title}\t{year}\t{votes.get(parts[0], 0)}\n".encode("utf-8"))
+    del votes
+    # Sorting whole lines sorts by key, since the tab after it sorts before any title character.
+    records.sort()
+
+    data_tmp = os.path.join(directory, DATA_FILE + ".tmp")
+    offsets_tmp = os.path.join(directory, OFFSETS_FILE + ".tmp")
+    offsets = array.array("Q")
+    position = 0
+    with open(data_tmp, "wb") as f:
+        for record in records:
+            offsets.append(position)
+            f.write(record)
+            position += len(record)
+    if sys.byteorder != "little":
+        offsets.byteswap()
+    with open(offsets_tmp, "wb") as f:
+        offsets.tofile(f)
+
+    # Maps that are already open keep the old files, so the bot uses the old
+    # index until it reloads.
+    os.replace(data_tmp, os.path.join(directory, DATA_FILE))
+    os.replace(offsets_tmp, os.path.join(directory, OFFSETS_FILE))
+    with open(os.path.join(directory, META_FILE), "w") as f:
+        json.dump({"built_at": time.time(), "count": len(records)}, f)
+    return len(records)
+
+
+def main():
+    directory = Config.IMDB_INDEX_DIR
+    os.makedirs(directory, exist_ok=True)
+    started = time.time()
+    basics = _download("title.basics.tsv.gz", directory)
+    try:
+        ratings = _download("title.ratings.tsv.gz", directory)
+    except Exception as e:
+        logger.warning(f"Could not download title ratings ({e}); titles will not be ranked by popularity.")
+        ratings = None
+    try:
+        count = build_index(directory, basics, ratings)
+    finally:
+        for path in (basics, ratings):
+            if path and os.path.exists(path): os.remove(path)
+    logger.info(f"IMDb title index built: {count} titles in {time.time() - started:.0f}s.")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - imdb_index - %(name)s - %(levelname)s - %(message)s")
+    main()
@@ -0,0 +1,250 @@
+# features/ingest_queue.py
+
+import asyncio
+import logging
+import time
+from config import Config
+from database.db import (
+    ensure_ingest_queue_indexes, enqueue_ingest_job, claim_ingest_job, unclaim_ingest_job, complete_ingest_job,
+    retry_ingest_job, dead_letter_ingest_job, reset_stale_ingest_jobs, count_ingest_jobs_by_owner,
+    get_user
+)
+from features.fair_scheduler import FairScheduler, priority_weight
+
+logger = logging.getLogger(__name__)
+
+# How often idle workers look for jobs whose retry delay has passed.
+POLL_INTERVAL = 5
+MAX_RETRY_DELAY = 3600
+
+
+class JobUnrecoverable(Exception):
+    """The job can never succeed (e.g. the source message is gone); dead-letter it right away."""
+
+
+class IngestQueue:
+    """
+    Durable, bounded ingestion queue backed by the `ingest_queue` collection.
+
+    Every incoming file becomes a job keyed by (chat_id, message_id), so a
+    redelivered update never creates a second job. A fixed pool of workers
+    claims jobs atomically and runs Bot.process_new_file on them (at least
+    once: the Owner DB copy is recorded on the job and file records are upserts).
+    Failed jobs are retried with exponential backoff and dead-lettered after
+    `max_attempts`. submit() never waits: past `max_pending` outstanding jobs
+    the job is still stored, but its Message is not kept in memory and the
+    worker fetches it again when the job comes up.
+
+    Workers take turns across owners (weighted round-robin by priority tier),
+    with at most `per_owner_limit` of one owner's files in progress at once.
+    """
+
+    def __init__(self, bot, workers: int, max_pending: int, max_attempts: int, base_delay: float, per_owner_limit: int = 1):
+        self.bot = bot
+        self.worker_count = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.scheduler = FairScheduler("ingest", self.worker_count, per_owner_limit)
+
+        self.live_messages = {}  # (chat_id, message_id) -> Message received in this run
+        self.depth = 0  # jobs pending or processing
+        self.owner_depth = {}  # owner_id -> jobs pending or processing
+        self.idle_owners = {}  # owner_id -> time until which all their jobs are waiting to be retried
+        self.in_progress = 0
+        self.workers = []
+        self.stopping = False
+        self._wake = asyncio.Event()
+
+    async def start(self):
+        await ensure_ingest_queue_indexes()
+        reset = await reset_stale_ingest_jobs()
+        if reset:
+            logger.warning(f"Requeued {reset} ingest job(s) interrupted by the last shutdown.")
+        await self.resync()
+        self.stopping = False
+        self.workers = [asyncio.create_task(self._worker(i)) for i in range(self.worker_count)]
+        logger.info(f"Ingest queue started with {self.worker_count} workers and {self.depth} pending job(s).")
+
+    async def resync(self):
+        """Reloads per-owner depths from Mongo, e.g. after jobs were requeued by hand."""
+        self.owner_depth = await count_ingest_jobs_by_owner()
+        self.depth = sum(self.owner_depth.values())
+        self.idle_owners.clear()
+        for owner_id in self.owner_depth:
+            await self._load_weight(owner_id)
+        self._wake.set()
+
+    async def _load_weight(self, owner_id: int):
+        if self.scheduler.has_weight(owner_id):
+            return
+        try:
+            user = await get_user(owner_id)
+        except Exception:
+            user = None
+        self.scheduler.set_weight(owner_id, priority_weight(user.get('priority') if user else None))
+
+    def set_priority(self, owner_id: int, tier: str):
+        self.scheduler.set_weight(owner_id, priority_weight(tier))
+
+    async def submit(self, message, user_id: int) -> bool:
+        """Persists a job for `message` and returns without waiting for queue space. Returns False for duplicates."""
+        media = getattr(message, message.media.value, None)
+        key = (message.chat.id, message.id)
+        await self._load_weight(user_id)
+        if not await enqueue_ingest_job(user_id, key[0], key[1], getattr(media, 'file_name', None)):
+            return False
+        self.depth += 1
+        self.owner_depth[user_id] = self.owner_depth.get(user_id, 0) + 1
+        if self.depth <= self.max_pending:
+            self.live_messages[key] = message
+        self.idle_owners.pop(user_id, None)
+        self._wake.set()
+        return True
+
+    def _release(self, owner_id: int):
+        self.depth = max(0, self.depth - 1)
+        remaining = self.owner_depth.get(owner_id, 0) - 1
+        if remaining > 0: self.owner_depth[owner_id] = remaining
+        else: self.owner_depth.pop(owner_id, None)
+
+    def _ready_owners(self):
+        now = time.monotonic()
+        return [
+            owner for owner, count in self.owner_depth.items()
+            if count > self.scheduler.active.get(owner, 0) and self.idle_owners.get(owner, 0) <= now
+        ]
+
+    async def _claim(self):
+        """
+        Claims a job from the owner whose turn it is, falling back to the oldest
+        job of anyone not at their limit. The owner is counted as running before
+        the claim is awaited, so concurrent workers respect the per-owner limit;
+        the caller releases it when the job is done.
+        """
+        owner = self.scheduler.reserve(self._ready_owners())
+        if owner is not None:
+            try:
+                job = await claim_ingest_job(owner_id=owner)
+            except Exception:
+                self.scheduler.release(owner)
+                raise
+            if job is not None:
+                return job
+            self.scheduler.release(owner)
+            # Everything this owner has left is waiting out a retry delay.
+            self.idle_owners[owner] = time.monotonic() + POLL_INTERVAL
+
+        busy = [o for o in self.scheduler.active if self.scheduler.at_limit(o)]
+        job = await claim_ingest_job(exclude_owners=busy)
+        if job is None:
+            return None
+        if self.scheduler.at_limit(job['owner_id']):
+            # Another worker started this owner while we were claiming; hand the job back.
+            await unclaim_ingest_job(job['_id'])
+            return None
+        self.scheduler.start(job['owner_id'])
+        return job
+
+    async def _worker(self, index: int):
+        while not self.stopping:
+            self._wake.clear()
+            try:
+                job = await self._claim()
+            except Exception as e:
+                logger.error(f"Ingest worker #{index} could not claim a job: {e}")
+                await asyncio.sleep(POLL_INTERVAL)
+                continue
+
+            if job is None:
+                try: await asyncio.wait_for(self._wake.wait(), POLL_INTERVAL)
+                except asyncio.TimeoutError: pass
+                continue
+
+            owner_id = job['owner_id']
+            if owner_id not in self.owner_depth:
+                # Queued outside this process's view (e.g. requeued by hand).
+                self.owner_depth[owner_id] = 1
+                self.depth += 1
+            self.in_progress += 1
+            try:
+                await self._run(job)
+            finally:
+                self.in_progress -= 1
+                self.scheduler.release(owner_id)
+
+    async def _run(self, job: dict):
+        key = (job['chat_id'], job['message_id'])
+        try:
+            message = self.live_messages.get(key)
+            if message is None:
+                # Queued before a restart or while the queue was full: fetch the message again.
+                message = await self.bot.execute_with_retry(self.bot.get_messages, job['chat_id'], job['message_id'])
+                if not message or message.empty or not message.media:
+                    raise JobUnrecoverable("Source message was deleted or has no media.")
+            await self.bot.process_new_file(message, job['owner_id'], job)
+        except asyncio.CancelledError:
+            # Left as 'processing'; the next start() puts it back in the queue.
+            raise
+        except Exception as e:
+            await self._fail(job, e)
+            return
+
+        try:
+            await complete_ingest_job(job['_id'])
+        except Exception as e:
+            logger.error(f"Could not mark ingest job {job['_id']} as done: {e}")
+        self.live_messages.pop(key, None)
+        self._release(job['owner_id'])
+
+    async def _fail(self, job: dict, error: Exception):
+        key = (job['chat_id'], job['message_id'])
+        error_text = f"{type(error).__name__}: {error}"
+        file_name = job.get('file_name') or 'N/A'
+
+        if isinstance(error, JobUnrecoverable) or job['attempts'] >= self.max_attempts:
+            logger.error(f"Dead-lettering file '{file_name}' for user {job['owner_id']} after {job['attempts']} attempt(s): {error_text}")
+            try: await dead_letter_ingest_job(job['_id'], error_text)
+            except Exception as e: logger.error(f"Could not dead-letter ingest job {job['_id']}: {e}")
+            self.live_messages.pop(key, None)
+            self._release(job['owner_id'])
+            try:
+                await self.bot.send_message(Config.ADMIN_ID, f"**File Processing Error**\n\nA file for user `{job['owner_id']}` failed after `{job['attempts']}` attempt(s) and was moved to the dead-letter queue.\n\n**File:** `{file_name}`\n**Error:** `{error_text}`\n\nUse /retry_failed to queue it again.")
+            except Exception as admin_notify_err:
+                logger.error(f"Could not send dead-letter alert to admin: {admin_notify_err}")
+            return
+
+        delay = min(MAX_RETRY_DELAY, self.base_delay * (2 ** (job['attempts'] - 1)))
+        logger.warning(f"Ingest of '{file_name}' for user {job['owner_id']} failed (attempt {job['attempts']}/{self.max_attempts}): {error_text}. Retrying in {delay:.0f}s.")
+        try: await retry_ingest_job(job['_id'], delay, error_text)
+        except Exception as e: logger.error(f"Could not reschedule ingest job {job['_id']}: {e}")
+
+    async def stop(self, timeout: float):
+        """Stops claiming jobs and waits up to `timeout` seconds for the ones in progress."""
+        if not self.workers:
+            return
+        self.stopping = True
+        self._wake.set()
+
+        done, pending = await asyncio.wait(self.workers, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.warning(f"Ingest queue drain timed out; {len(pending)} job(s) will resume after restart.")
+        self.workers = []
+        logger.info("Ingest queue stopped.")
+
+    def stats(self) -> dict:
+        return {
+            "pending": max(0, self.depth - self.in_progress),
+            "processing": self.in_progress,
+            "workers": self.worker_count,
+        }
+
+    def owner_stats(self) -> list:
+        """[(owner_id, jobs pending or processing, processing)] with the deepest queues first."""
+        return sorted(
+            ((owner, count, self.scheduler.active.get(owner, 0)) for owner, count in self.owner_depth.items()),
+            key=lambda item: item[1], reverse=True
+        )
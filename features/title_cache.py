@@ -0,0 +1,80 @@
+# features/title_cache.py
+
+import asyncio
+import datetime
+import logging
+from config import Config
+from database.db import get_cached_title, save_cached_title
+from util.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+def title_cache_key(title: str) -> str:
+    return " ".join(title.lower().split())
+
+
+class TitleCache:
+    """
+    Caches IMDb title lookups: (title, year) for a match, (None, None) for a
+    miss or a rejected match. Entries live in Mongo (so they survive restarts)
+    behind an in-memory LRU, and concurrent lookups of the same title share
+    one request. Failed lookups (exceptions) are not cached.
+    """
+
+    def __init__(self, max_size: int, ttl: float, negative_ttl: float):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.memory = LRUCache(max_size)
+        self.inflight = {}  # key -> task looking the title up
+
+    async def resolve(self, title: str, lookup):
+        """Returns the cached result for `title`, or `await lookup(title)` (then cached)."""
+        key = title_cache_key(title)
+        cached = self.memory.get(key)
+        if cached is not None:
+            return cached
+
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load(key, title, lookup))
+            self.inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._finished(k, t))
+        # A cancelled caller must not cancel the lookup others are waiting on.
+        return await asyncio.shield(task)
+
+    def _finished(self, key: str, task):
+        self.inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # retrieved here in case every caller was cancelled
+
+    async def _load(self, key: str, title: str, lookup):
+        try:
+            doc = await get_cached_title(key)
+        except Exception as e:
+            logger.error(f"Could not read the IMDb title cache for '{title}': {e}")
+            doc = None
+        if doc:
+            result = (doc.get('title'), doc.get('year'))
+            remaining = (doc['expires_at'] - datetime.datetime.utcnow()).total_seconds()
+            self.memory.set(key, result, ttl=max(1, remaining))
+            return result
+
+        result = tuple(await lookup(title))
+        ttl = self.ttl if result[0] else self.negative_ttl
+        self.memory.set(key, result, ttl=ttl)
+        try:
+            await save_cached_title(key, result[0], result[1], datetime.datetime.utcnow() + datetime.timedelta(seconds=ttl))
+        except Exception as e:
+            logger.error(f"Could not save '{title}' to the IMDb title cache: {e}")
+        return result
+
+
+_title_cache = None
+
+
+def get_title_cache() -> TitleCache:
+    global _title_cache
+    if _title_cache is None:
+        _title_cache = TitleCache(Config.IMDB_CACHE_SIZE, Config.IMDB_CACHE_TTL, Config.IMDB_NEGATIVE_CACHE_TTL)
+    return _title_cache
@@ -6,9 +6,15 @@ from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from config import Config
 from database.db import (
     total_users_count, get_all_user_ids, get_storage_owners_count,
-    get_storage_owner_ids, get_normal_user_ids, delete_all_files
+    get_storage_owner_ids, get_normal_user_ids, delete_all_files,
+    count_ingest_jobs, requeue_dead_ingest_jobs, update_user
 )
 from features.broadcaster import broadcast_message
+from features.fair_scheduler import PRIORITY_WEIGHTS, priority_weight
+from features.imdb_index import refresh_title_index
+from server.scheduler import get_stream_scheduler
+from util.chunk_cache import get_chunk_cache
+from util.media_session_pool import get_session_pool
 from utils.helpers import go_back_button
 
 logger = logging.getLogger(__name__)
@@ -32,6 +38,35 @@ async def health_check_handler(client, message):
         f"**Architecture:** `Direct Processing Model`\n\n"
         f"**Active Batches:** `{open_batches_count}` (users currently collecting files)\n"
     )
+
+    ingest_stats = client.ingest_queue.stats()
+    dead_jobs = await count_ingest_jobs('dead')
+    text += f"**Ingest Queue:** `{ingest_stats['pending']}` pending, `{ingest_stats['processing']}` processing, `{dead_jobs}` failed\n"
+    for owner_id, depth, running in client.ingest_queue.owner_stats()[:5]:
+        text += f"  - Owner `{owner_id}`: `{depth}` queued (`{running}` in progress)\n"
+    for owner_id, (running, waiting) in client.post_scheduler.depth().items():
+        text += f"  - Owner `{owner_id}`: posting `{running}` batch(es), `{waiting}` waiting\n"
+
+    stream_stats = get_stream_scheduler().stats()
+    text += f"**Active Streams:** `{stream_stats['active']}` from `{stream_stats['clients']}` clients (`{stream_stats['queued']}` queued)\n"
+
+    chunk_cache = get_chunk_cache()
+    if chunk_cache:
+        cache_stats = chunk_cache.stats()
+        text += (
+            f"**Stream Cache:** `{cache_stats['hits']}` hits / `{cache_stats['misses']}` misses "
+            f"(`{cache_stats['hit_rate']:.0%}`), `{cache_stats['bytes'] / (1024 * 1024):.0f}` / "
+            f"`{cache_stats['max_bytes'] / (1024 * 1024):.0f}` MB used\n"
+        )
+
+    for stream_client in client.client_rotation.clients:
+        for dc_id, sessions in get_session_pool(stream_client).stats().items():
+            in_flight = ", ".join(f"#{index}: {count}" for index, count in sessions)
+            text += f"**{stream_client.name} DC {dc_id} Sessions:** `{in_flight}` (in-flight requests)\n"
+
+    if len(client.client_rotation.clients) > 1:
+        for name, load, benched_for in client.client_rotation.stats():
+            text += f"**Stream Client {name}:** `{load}` active streams" + (f", benched `{benched_for}s`" if benched_for else "") + "\n"
     
     if not client.is_healthy.is_set():
         text += f"\n**Last Known Error:**\n`{client.last_health_check_error or 'No specific error logged, check console.'}`"
@@ -41,6 +76,45 @@ async def health_check_handler(client, message):
     await message.reply_text(text)
 
 
+@Client.on_message(filters.command("retry_failed") & filters.user(Config.ADMIN_ID))
+async def retry_failed_handler(client, message):
+    """Puts every dead-lettered ingest job back in the queue."""
+    count = await requeue_dead_ingest_jobs()
+    await client.ingest_queue.resync()
+    await message.reply_text(f"♻️ Requeued `{count}` failed file(s)." if count else "✅ No failed files to retry.")
+
+
+@Client.on_message(filters.command("set_priority") & filters.user(Config.ADMIN_ID))
+async def set_priority_handler(client, message):
+    """Puts an owner in a priority tier for ingestion and posting."""
+    tiers = ", ".join(f"`{t}`" for t in PRIORITY_WEIGHTS)
+    try:
+        _, owner_id, tier = message.text.split()
+        owner_id = int(owner_id)
+    except ValueError:
+        return await message.reply_text(f"Usage: `/set_priority <user_id> <tier>`\nTiers: {tiers}")
+    if tier not in PRIORITY_WEIGHTS:
+        return await message.reply_text(f"Unknown tier `{tier}`. Tiers: {tiers}")
+    await update_user(owner_id, 'priority', tier)
+    client.ingest_queue.set_priority(owner_id, tier)
+    client.post_scheduler.set_weight(owner_id, priority_weight(tier))
+    await message.reply_text(f"✅ Owner `{owner_id}` is now in the `{tier}` priority tier.")
+
+
+@Client.on_message(filters.command("refresh_imdb_index") & filters.user(Config.ADMIN_ID))
+async def refresh_imdb_index_handler(client, message):
+    """Downloads the IMDb datasets and rebuilds the offline title index."""
+    status = await message.reply_text("⏳ Rebuilding the IMDb title index. This downloads the IMDb datasets and can take several minutes...")
+    try:
+        index = await refresh_title_index()
+    except Exception as e:
+        logger.error(f"IMDb title index rebuild failed: {e}")
+        return await status.edit_text(f"❌ **IMDb index rebuild failed:** `{e}`")
+    # Stored parses are tagged with the index build (see current_parse_version); redo them.
+    client.start_reparse()
+    await status.edit_text(f"✅ IMDb title index rebuilt with `{index.count}` titles. Stored file names are being re-parsed in the background.")
+
+
 @Client.on_message(filters.command("stats") & filters.user(Config.ADMIN_ID))
 async def stats_handler(_, message):
     try:
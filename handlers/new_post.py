@@ -3,7 +3,6 @@ import logging
 from pyrogram import Client, filters
 from database.db import find_owner_by_index_channel
 from utils.helpers import notify_and_remove_invalid_channel
-import asyncio
 from config import Config
 
 logger = logging.getLogger(__name__)
@@ -11,9 +10,9 @@ logger = logging.getLogger(__name__)
 @Client.on_message(filters.channel & (filters.document | filters.video | filters.audio), group=2)
 async def new_file_handler(client, message):
     """
-    This handler listens for new files, finds the owner, and now directly
-    creates an asyncio task to process the file immediately, replacing the old
-    queueing system.
+    This handler listens for new files, finds the owner, and adds the file to
+    the durable ingest queue. It never waits for queue space, so a huge forward
+    cannot stall update dispatch; the workers drain the backlog at their pace.
     """
     try:
         user_id = await find_owner_by_index_channel(message.chat.id)
@@ -37,12 +36,11 @@ async def new_file_handler(client, message):
                 logger.error(f"Failed to send configuration alert to admin: {e}")
             return
         
-        # --- THE NEW PARADIGM: DIRECT TASK CREATION ---
-        # Instead of putting the message in a queue, create a dedicated task
-        # for this specific file. This ensures processing is immediate and isolated.
-        asyncio.create_task(client.process_new_file(message, user_id))
-        
-        logger.info(f"Created a direct processing task for file '{media.file_name}' for user {user_id}.")
+        # The job is stored in Mongo before we return, so a restart cannot lose it.
+        if await client.ingest_queue.submit(message, user_id):
+            logger.info(f"Queued file '{media.file_name}' for user {user_id}.")
+        else:
+            logger.info(f"File '{media.file_name}' for user {user_id} is already queued.")
 
     except Exception as e:
-        logger.exception(f"Error in new_file_handler before task creation: {e}")
+        logger.exception(f"Error in new_file_handler before queueing: {e}")
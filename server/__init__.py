@@ -1,9 +1,33 @@
+import logging
 from aiohttp import web
+from config import Config
+from util.metrics import render_metrics
 from .stream_routes import routes
 
+logger = logging.getLogger(__name__)
+
 async def web_server(bot_instance):
     """Initializes the web server and attaches the bot instance."""
+    from util.render_template import load_watch_template
+    try: load_watch_template()
+    except Exception as e: logger.error(f"Could not compile the watch page template: {e}")
     web_app = web.Application(client_max_size=30000000)
     web_app['bot'] = bot_instance  # Store bot instance for handlers
     web_app.add_routes(routes)
     return web_app
+
+
+async def metrics_handler(request):
+    """Prometheus scrape endpoint."""
+    return web.Response(text=render_metrics(), content_type="text/plain", charset="utf-8")
+
+
+async def start_metrics_server(port: int):
+    """Serves /metrics on Config.METRICS_HOST, apart from the public streaming port."""
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, Config.METRICS_HOST, port).start()
+    logger.info(f"Metrics served at http://{Config.METRICS_HOST}:{port}/metrics")
+    return runner
@@ -0,0 +1,146 @@
+# server/scheduler.py
+
+import asyncio
+import logging
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from config import Config
+from util.metrics import STREAMS_ACTIVE, STREAMS_QUEUED, register_collector
+
+logger = logging.getLogger(__name__)
+
+
+class StreamRejected(Exception):
+    """Raised when a stream cannot be admitted; `retry_after` is a hint in seconds."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.retry_after = retry_after
+
+
+class StreamScheduler:
+    """
+    Admission control and egress fair share for Telegram-backed streams.
+
+    - At most `max_streams` streams run at once; extra requests wait up to
+      `queue_timeout` seconds in a short queue before being turned away.
+    - Each client IP may hold at most `max_per_ip` streams.
+    - With a `bandwidth` limit (bytes/s), every active IP gets an equal share
+      through its own token bucket, however many connections it opens.
+    """
+
+    def __init__(self, max_streams: int, max_per_ip: int, queue_timeout: float, bandwidth: int = 0):
+        self.max_streams = max(1, max_streams)
+        self.max_per_ip = max(1, max_per_ip)
+        self.queue_timeout = queue_timeout
+        self.max_queue = self.max_streams
+        self.bandwidth = bandwidth
+
+        self.active = 0
+        self.queued = 0
+        self.per_ip = defaultdict(int)
+        self.buckets = {}  # ip -> [tokens, last_refill]
+        self._released = asyncio.Condition()
+
+    async def _admit(self, ip: str):
+        if self.per_ip.get(ip, 0) >= self.max_per_ip:
+            raise StreamRejected(f"Too many concurrent streams from {ip}.", retry_after=10)
+
+        # Checking and taking a slot both happen under the condition's lock, so a
+        # newcomer cannot slip in between a queued request being woken and resuming.
+        async with self._released:
+            # Newcomers only skip the queue when nobody is waiting in it.
+            if self.active >= self.max_streams or self.queued:
+                if self.queued >= self.max_queue:
+                    raise StreamRejected("Streaming capacity is full.", retry_after=30)
+                self.queued += 1
+                try:
+                    await asyncio.wait_for(
+                        self._released.wait_for(lambda: self.active < self.max_streams),
+                        timeout=self.queue_timeout
+                    )
+                except asyncio.TimeoutError:
+                    raise StreamRejected("Streaming capacity is full.", retry_after=30)
+                finally:
+                    self.queued -= 1
+                if self.per_ip.get(ip, 0) >= self.max_per_ip:
+                    raise StreamRejected(f"Too many concurrent streams from {ip}.", retry_after=10)
+
+            self.active += 1
+            self.per_ip[ip] += 1
+            if self.queued and self.active < self.max_streams:
+                # More than one slot came free; let the queued requests have them too.
+                self._released.notify_all()
+
+    async def _release(self, ip: str):
+        self.active -= 1
+        self.per_ip[ip] -= 1
+        if self.per_ip[ip] <= 0:
+            del self.per_ip[ip]
+            self.buckets.pop(ip, None)
+        async with self._released:
+            # Every waiter re-checks, so a woken request that timed out meanwhile cannot strand the slot.
+            self._released.notify_all()
+
+    @asynccontextmanager
+    async def slot(self, ip: str):
+        """Holds a stream slot for `ip`; raises StreamRejected if none is available."""
+        await self._admit(ip)
+        try:
+            yield
+        finally:
+            await self._release(ip)
+
+    async def throttle(self, ip: str, nbytes: int):
+        """Waits until `ip` may send `nbytes` more under its share of the bandwidth limit."""
+        if not self.bandwidth:
+            return
+        rate = self.bandwidth / max(1, len(self.per_ip))
+        now = time.monotonic()
+        bucket = self.buckets.setdefault(ip, [rate, now])
+        # Refill, allowing at most one second of burst.
+        bucket[0] = min(rate, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        bucket[0] -= nbytes
+        if bucket[0] < 0:
+            await asyncio.sleep(-bucket[0] / rate)
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "clients": len(self.per_ip),
+        }
+
+
+_stream_scheduler = None
+
+
+def get_stream_scheduler() -> StreamScheduler:
+    """Returns the process-wide stream scheduler."""
+    global _stream_scheduler
+    if _stream_scheduler is None:
+        _stream_scheduler = StreamScheduler(
+            Config.STREAM_MAX_ACTIVE, Config.STREAM_MAX_PER_IP, Config.STREAM_QUEUE_TIMEOUT,
+            bandwidth=int(Config.STREAM_BANDWIDTH_LIMIT_MB * 1024 * 1024)
+        )
+    return _stream_scheduler
+
+
+def _collect_metrics():
+    if _stream_scheduler:
+        STREAMS_ACTIVE.set(_stream_scheduler.active)
+        STREAMS_QUEUED.set(_stream_scheduler.queued)
+
+
+register_collector(_collect_metrics)
+
+
+def get_client_ip(request) -> str:
+    """The requesting IP, taken from X-Forwarded-For only when a trusted proxy sits in front."""
+    if Config.STREAM_TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("X-Forwarded-For")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.remote or "unknown"
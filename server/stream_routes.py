@@ -2,12 +2,27 @@
 
 import logging
 import asyncio
+import math
+import os
+import re
+import time
+from email.utils import formatdate, parsedate_to_datetime
 from aiohttp import web
 from pyrogram.errors import FileIdInvalid
+from config import Config
+from server.scheduler import StreamRejected, get_client_ip, get_stream_scheduler
+from util.chunk_cache import get_chunk_cache
+from util.custom_dl import StreamInterrupted, get_streamer
+from util.file_properties import FileIdError
+from util.metrics import STREAM_BYTES, STREAM_REQUESTS, STREAM_TTFB
 
 logger = logging.getLogger(__name__)
 routes = web.RouteTableDef()
 
+# Telegram serves file parts of at most 1 MiB per upload.GetFile call.
+CHUNK_SIZE = 1024 * 1024
+RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)")
+
 
 @routes.get("/", allow_head=True)
 async def root_route_handler(request):
@@ -18,6 +33,22 @@ async def root_route_handler(request):
     })
 
 
+@routes.get("/get/{composite_id}")
+async def handle_redirect(request):
+    composite_id = request.match_info.get('composite_id', None)
+    if not composite_id:
+        return web.Response(text="File ID missing.", status=400)
+
+    try:
+        with open(Config.BOT_USERNAME_FILE, 'r') as f:
+            bot_username = f.read().strip().replace("@", "")
+    except FileNotFoundError:
+        logger.error(f"FATAL: Bot username file not found at {Config.BOT_USERNAME_FILE}")
+        return web.Response(text="Bot configuration error.", status=500)
+
+    return web.HTTPFound(f"https://t.me/{bot_username}?start=get_{composite_id}")
+
+
 @routes.get("/favicon.ico", allow_head=True)
 async def favicon_handler(request):
     return web.Response(status=204)
@@ -28,62 +59,307 @@ async def watch_handler(request: web.Request):
     try:
         message_id = int(request.match_info["message_id"])
         bot = request.app['bot']
-        from util.render_template import render_page
-        return web.Response(
-            text=await render_page(bot, message_id),
-            content_type='text/html'
-        )
+        from util.render_template import get_watch_page
+        html, etag = await get_watch_page(bot, message_id)
+        headers = {"Cache-Control": "no-cache"}
+        if etag:
+            headers["ETag"] = etag
+            if_none_match = request.headers.get("If-None-Match")
+            if if_none_match is not None and etag_in_if_none_match(if_none_match, etag):
+                return web.Response(status=304, headers=headers)
+        return web.Response(text=html, content_type='text/html', headers=headers)
     except Exception as e:
         logger.critical(f"Unexpected error in watch handler: {e}", exc_info=True)
         return web.Response(text="Internal Server Error", status=500)
 
 
+def is_supported_range(range_header: str) -> bool:
+    """True for a single 'bytes=' range; other forms (e.g. multiple ranges) are ignored, as RFC 9110 allows."""
+    match = RANGE_RE.fullmatch(range_header.strip())
+    return bool(match) and any(match.groups())
+
+
+def parse_range_header(range_header: str, file_size: int):
+    """
+    Parses a supported single-range 'bytes=' header into inclusive (from_bytes, until_bytes).
+    Returns None when the range cannot be satisfied for this file.
+    """
+    match = RANGE_RE.fullmatch(range_header.strip())
+    if not match:
+        return None
+    start, end = match.groups()
+    if start:
+        from_bytes = int(start)
+        until_bytes = int(end) if end else file_size - 1
+    elif end:
+        # Suffix range: the last N bytes of the file.
+        from_bytes = max(file_size - int(end), 0)
+        until_bytes = file_size - 1
+    else:
+        return None
+    until_bytes = min(until_bytes, file_size - 1)
+    if from_bytes > until_bytes or from_bytes >= file_size:
+        return None
+    return from_bytes, until_bytes
+
+
+# Conditional headers stream_or_download has already evaluated against the
+# Telegram file; FileResponse would re-check them against the cache file.
+CONDITIONAL_HEADERS = ("If-Match", "If-None-Match", "If-Modified-Since", "If-Unmodified-Since", "If-Range")
+
+
+class CachedFileResponse(web.FileResponse):
+    """
+    FileResponse that keeps the file's own validators: the cache file's mtime
+    says nothing about the Telegram file, so its mtime-based ETag is discarded
+    and the conditional request headers are not evaluated against it again.
+    """
+
+    def __init__(self, path, validators: dict, **kwargs):
+        super().__init__(path, **kwargs)
+        self.validators = validators
+
+    async def prepare(self, request: web.BaseRequest):
+        if any(name in request.headers for name in CONDITIONAL_HEADERS):
+            headers = request.headers.copy()
+            for name in CONDITIONAL_HEADERS:
+                headers.popall(name, None)
+            request = request.clone(headers=headers)
+        return await super().prepare(request)
+
+    @property
+    def etag(self):
+        return super().etag
+
+    @etag.setter
+    def etag(self, value):
+        self.headers["ETag"] = self.validators["ETag"]
+
+    @property
+    def last_modified(self):
+        return super().last_modified
+
+    @last_modified.setter
+    def last_modified(self, value):
+        if "Last-Modified" in self.validators:
+            self.headers["Last-Modified"] = self.validators["Last-Modified"]
+        else:
+            self.headers.pop("Last-Modified", None)
+
+
+def file_validators(file_id) -> dict:
+    """Strong ETag from file_unique_id (its bytes never change) plus Last-Modified when known."""
+    validators = {}
+    unique_id = getattr(file_id, "file_unique_id", None)
+    if unique_id:
+        validators["ETag"] = f'"{unique_id}"'
+    date = getattr(file_id, "date", None)
+    if date:
+        validators["Last-Modified"] = formatdate(date.timestamp(), usegmt=True)
+    return validators
+
+
+def _parse_http_date(value: str):
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def etag_in_if_none_match(if_none_match: str, etag) -> bool:
+    """Whether an If-None-Match header lists `etag` (or "*"), using the weak comparison RFC 9110 requires."""
+    candidates = [c.strip().removeprefix("W/") for c in if_none_match.split(",")]
+    return bool(etag) and ("*" in candidates or etag in candidates)
+
+
+def evaluate_conditionals(request: web.Request, validators: dict):
+    """
+    Applies If-None-Match / If-Modified-Since and If-Range.
+    Returns (not_modified, honor_range).
+    """
+    etag = validators.get("ETag")
+    last_modified = validators.get("Last-Modified")
+    last_modified_ts = _parse_http_date(last_modified) if last_modified else None
+
+    not_modified = False
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        not_modified = etag_in_if_none_match(if_none_match, etag)
+    elif last_modified_ts is not None and "If-Modified-Since" in request.headers:
+        since = _parse_http_date(request.headers["If-Modified-Since"])
+        not_modified = since is not None and int(last_modified_ts) <= int(since)
+
+    honor_range = True
+    if_range = request.headers.get("If-Range")
+    if if_range is not None and "Range" in request.headers:
+        if_range = if_range.strip()
+        if if_range.startswith('"') or if_range.startswith('W/'):
+            # Strong comparison: weak tags never match.
+            honor_range = bool(etag) and if_range == etag
+        else:
+            since = _parse_http_date(if_range)
+            honor_range = since is not None and last_modified_ts is not None and int(since) == int(last_modified_ts)
+
+    return not_modified, honor_range
+
+
+async def serve_from_cache(request: web.Request, file_id, disposition: str, mime_type: str, file_name: str, validators: dict):
+    """
+    Serves a fully cached file without copying it through Python: either via
+    nginx (X-Accel-Redirect) or with sendfile through FileResponse. Both handle
+    Range requests themselves. Returns None when the file is not fully cached.
+    """
+    chunk_cache = get_chunk_cache()
+    unique_id = getattr(file_id, "file_unique_id", None)
+    if not chunk_cache or not unique_id:
+        return None
+    path = await chunk_cache.complete_path(unique_id)
+    if not path:
+        return None
+
+    chunk_cache.hits += 1
+    STREAM_REQUESTS.inc(source="accel_redirect" if Config.STREAM_ACCEL_REDIRECT_PREFIX else "sendfile")
+    headers = {
+        "Content-Type": mime_type,
+        "Content-Disposition": f'{disposition}; filename="{file_name}"',
+    }
+    if Config.STREAM_ACCEL_REDIRECT_PREFIX:
+        # Relative to STREAM_CACHE_DIR, which nginx aliases.
+        rel_path = os.path.relpath(path, Config.STREAM_CACHE_DIR).replace(os.sep, "/")
+        headers["X-Accel-Redirect"] = Config.STREAM_ACCEL_REDIRECT_PREFIX.rstrip("/") + "/" + rel_path
+        headers.update(validators)
+        return web.Response(headers=headers)
+    return CachedFileResponse(path, validators, headers=headers)
+
+
 async def stream_or_download(request: web.Request, disposition: str):
     """
     Handles streaming by piping data directly from Telegram to the client.
-    This method is optimized for stability and speed, avoiding disk I/O.
+    Range requests are answered with 206 Partial Content, so players can seek
+    without restarting the download from byte 0.
+
+    HEAD, 304 and 416 answers are built from the stored descriptor alone and
+    never touch the MTProto download path.
     """
+    started_at = time.perf_counter()
+    response = None
     try:
         message_id = int(request.match_info.get("message_id"))
         bot = request.app['bot']
 
-        # All streams will now come from the single, reliable owner log channel
-        chat_id = bot.owner_db_channel
-        if not chat_id:
-            raise ValueError("Owner DB Channel is not configured on the bot.")
+        # Metadata always comes from the main bot's stored descriptor.
+        file_id = await get_streamer(bot).get_file_properties(message_id)
+        file_name = file_id.file_name or "unknown.dat"
+        file_size = file_id.file_size
+        mime_type = file_id.mime_type or "application/octet-stream"
 
-        message = await bot.get_messages(chat_id=chat_id, message_ids=message_id)
+        validators = file_validators(file_id)
+        not_modified, honor_range = evaluate_conditionals(request, validators)
+        if not_modified:
+            return web.Response(status=304, headers=validators)
+        if "Range" in request.headers and not is_supported_range(request.headers["Range"]):
+            # Unsupported Range forms are ignored and the full file is sent with 200.
+            honor_range = False
 
-        if not message or not message.media:
-            return web.Response(text="File not found or has no media.", status=404)
+        if honor_range:
+            cached_response = await serve_from_cache(request, file_id, disposition, mime_type, file_name, validators)
+            if cached_response is not None:
+                return cached_response
 
-        media = getattr(message, message.media.value)
-        file_name = getattr(media, "file_name", "unknown.dat")
-        file_size = getattr(media, "file_size", 0)
+        range_header = request.headers.get("Range") if honor_range else None
+        if range_header:
+            byte_range = parse_range_header(range_header, file_size)
+            if byte_range is None:
+                return web.Response(
+                    status=416, text="416: Range Not Satisfiable",
+                    headers={"Content-Range": f"bytes */{file_size}"}
+                )
+            from_bytes, until_bytes = byte_range
+            status = 206
+        else:
+            from_bytes, until_bytes = 0, file_size - 1
+            status = 200
+
+        chunk_size = CHUNK_SIZE
+        offset = from_bytes - (from_bytes % chunk_size)
+        first_part_cut = from_bytes - offset
+        last_part_cut = until_bytes % chunk_size + 1
+        req_length = until_bytes - from_bytes + 1
+        part_count = math.ceil((until_bytes + 1) / chunk_size) - math.floor(offset / chunk_size)
 
         headers = {
-            "Content-Type": getattr(media, "mime_type", "application/octet-stream"),
+            "Content-Type": mime_type,
             "Content-Disposition": f'{disposition}; filename="{file_name}"',
-            "Content-Length": str(file_size)
+            "Content-Length": str(req_length),
+            "Accept-Ranges": "bytes",
+            **validators,
         }
-        
-        response = web.StreamResponse(status=200, headers=headers)
-        await response.prepare(request)
-        
-        async for chunk in bot.stream_media(message):
-            try:
-                await response.write(chunk)
-            except (ConnectionError, asyncio.CancelledError):
-                logger.warning(f"Client disconnected for message {message_id}. Stopping stream.")
-                break
-        
+        if status == 206:
+            headers["Content-Range"] = f"bytes {from_bytes}-{until_bytes}/{file_size}"
+
+        if request.method == "HEAD" or req_length <= 0:
+            response = web.StreamResponse(status=status, headers=headers)
+            await response.prepare(request)
+            return response
+
+        client = bot.client_rotation.pick()
+        streamer = get_streamer(client)
+        if client is not bot:
+            # Helper bots need a file_id of their own.
+            file_id = await streamer.get_file_properties(message_id)
+
+        scheduler = get_stream_scheduler()
+        client_ip = get_client_ip(request)
+        try:
+            async with scheduler.slot(client_ip):
+                response = web.StreamResponse(status=status, headers=headers)
+                await response.prepare(request)
+
+                body = streamer.yield_file(file_id, offset, first_part_cut, last_part_cut, part_count, chunk_size)
+                STREAM_REQUESTS.inc(source="telegram")
+                first_chunk = True
+                with bot.client_rotation.track(client):
+                    try:
+                        async for chunk in body:
+                            try:
+                                await scheduler.throttle(client_ip, len(chunk))
+                                await response.write(chunk)
+                                STREAM_BYTES.inc(len(chunk))
+                                if first_chunk:
+                                    STREAM_TTFB.observe(time.perf_counter() - started_at)
+                                    first_chunk = False
+                            except (ConnectionError, asyncio.CancelledError):
+                                logger.warning(f"Client disconnected for message {message_id}. Stopping stream.")
+                                break
+                    except StreamInterrupted as e:
+                        logger.error(f"Stream for message {message_id} aborted: {e}")
+                        # Drop the connection so the client sees a failed transfer, not a short file.
+                        if request.transport:
+                            request.transport.close()
+                    finally:
+                        # Closing the generator cancels any prefetches still in flight.
+                        await body.aclose()
+        except StreamRejected as e:
+            logger.warning(f"Rejected stream for message {message_id} from {client_ip}: {e}")
+            return web.Response(
+                text="Server is busy, please retry shortly.", status=503,
+                headers={"Retry-After": str(e.retry_after)}
+            )
+
         return response
 
+    except FileIdError:
+        return web.Response(text="File not found or has no media.", status=404)
     except (FileIdInvalid, ValueError) as e:
         logger.error(f"File ID or configuration error for stream request: {e}")
         return web.Response(text="File not found, link may have expired, or bot is misconfigured.", status=404)
     except Exception:
         logger.critical("FATAL: Unexpected error in stream/download handler", exc_info=True)
+        if response is not None and response.prepared:
+            # Headers are already out; all that is left is to cut the connection.
+            if request.transport:
+                request.transport.close()
+            return response
         return web.Response(text="Internal Server Error", status=500)
 
 
@@ -0,0 +1,153 @@
+# server/worker.py
+
+"""
+Multi-process web tier. With Config.WEB_WORKERS > 0 the bot process only
+handles Telegram updates, and the redirect, watch and streaming routes are
+served by that many worker processes bound to the same port with
+SO_REUSEPORT, so the kernel spreads connections across them.
+
+Each worker logs in with the bot's own session (no update handling) and opens
+its own media sessions. Stream descriptors come from Mongo and the workers
+share STREAM_CACHE_DIR through file locks, so they need no other IPC. Worker N serves
+its metrics on METRICS_PORT + N, labelled worker="N"; the bot process keeps
+METRICS_PORT for its own.
+
+Run directly as `python -m server.worker <index>`; WebWorkerPool does this and
+passes the session string through WEB_WORKER_SESSION.
+"""
+
+import asyncio
+import logging
+import math
+import os
+import signal
+import sys
+from aiohttp import web
+from pyrogram import Client
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+SESSION_ENV = "WEB_WORKER_SESSION"
+RESPAWN_DELAY = 5
+
+
+class WebWorkerPool:
+    """Spawns the web worker processes and restarts any that exit unexpectedly."""
+
+    def __init__(self, count: int, session_string: str):
+        self.count = count
+        self.session_string = session_string
+        self.processes = {}  # index -> asyncio.subprocess.Process
+        self.supervisors = []
+        self.stopping = False
+
+    async def _spawn(self, index: int):
+        env = dict(os.environ, **{SESSION_ENV: self.session_string})
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "-m", "server.worker", str(index),
+            env=env, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        )
+        self.processes[index] = process
+        logger.info(f"Web worker #{index} started (pid {process.pid}).")
+        return process
+
+    async def _supervise(self, index: int):
+        while not self.stopping:
+            process = await self._spawn(index)
+            code = await process.wait()
+            if self.stopping:
+                break
+            logger.error(f"Web worker #{index} exited with code {code}; restarting in {RESPAWN_DELAY}s.")
+            await asyncio.sleep(RESPAWN_DELAY)
+
+    async def start(self):
+        for index in range(1, self.count + 1):
+            self.supervisors.append(asyncio.create_task(self._supervise(index)))
+
+    async def stop(self, timeout: float = 10):
+        self.stopping = True
+        for process in self.processes.values():
+            if process.returncode is None:
+                try: process.terminate()
+                except ProcessLookupError: pass
+        for index, process in self.processes.items():
+            try:
+                await asyncio.wait_for(process.wait(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Web worker #{index} did not stop in {timeout}s; killing it.")
+                process.kill()
+                await process.wait()
+        for task in self.supervisors:
+            task.cancel()
+        self.supervisors.clear()
+
+
+def _scale_limits_for_workers(count: int):
+    """
+    Global streaming limits are enforced per process, so each worker gets its
+    share. STREAM_MAX_PER_IP is not divided: a client's connections may all
+    land on one worker, so it stays a per-worker limit.
+    """
+    Config.STREAM_MAX_ACTIVE = max(1, math.ceil(Config.STREAM_MAX_ACTIVE / count))
+    Config.STREAM_BANDWIDTH_LIMIT_MB = Config.STREAM_BANDWIDTH_LIMIT_MB / count
+
+
+async def run_worker(index: int):
+    from server import web_server, start_metrics_server
+    from util.chunk_cache import share_with_workers
+    from util.metrics import set_constant_labels
+    from util.clients import ClientRotation, start_worker_clients
+
+    session_string = os.environ.get(SESSION_ENV)
+    if not session_string:
+        raise SystemExit(f"{SESSION_ENV} is not set; web workers are started by the bot process.")
+    _scale_limits_for_workers(max(1, Config.WEB_WORKERS))
+    share_with_workers(max(1, Config.WEB_WORKERS))
+    set_constant_labels(worker=index)
+
+    client = Client(
+        f"WebWorker{index}", api_id=Config.API_ID, api_hash=Config.API_HASH,
+        session_string=session_string, in_memory=True, no_updates=True
+    )
+    await client.start()
+    client.owner_db_channel = Config.OWNER_DB_CHANNEL
+    client.vps_ip = Config.VPS_IP
+    client.vps_port = Config.VPS_PORT
+    client.client_rotation = ClientRotation()
+    client.client_rotation.add(client)
+    helpers = []
+    if client.owner_db_channel and Config.MULTI_CLIENT_TOKENS:
+        helpers = await start_worker_clients(client)
+
+    runner = web.AppRunner(await web_server(client))
+    await runner.setup()
+    site = web.TCPSite(runner, "0.0.0.0", Config.VPS_PORT, reuse_port=True)
+    await site.start()
+    logger.info(f"Web worker #{index} serving on port {Config.VPS_PORT}.")
+    metrics_runner = None
+    if Config.METRICS_PORT:
+        try: metrics_runner = await start_metrics_server(Config.METRICS_PORT + index)
+        except OSError as e: logger.error(f"Could not start the metrics server: {e}")
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop_event.set)
+    await stop_event.wait()
+
+    logger.info(f"Web worker #{index} stopping...")
+    await runner.cleanup()
+    if metrics_runner: await metrics_runner.cleanup()
+    for c in [client] + helpers:
+        try:
+            if getattr(c, "media_session_pool", None): await c.media_session_pool.stop()
+            await c.stop()
+        except Exception as e: logger.error(f"Error stopping client '{c.name}': {e}")
+
+
+if __name__ == "__main__":
+    worker_index = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s - web{worker_index} - %(name)s - %(levelname)s - %(message)s")
+    logging.getLogger("pyrogram").setLevel(logging.WARNING)
+    asyncio.run(run_worker(worker_index))
@@ -0,0 +1,48 @@
+# tests/test_clustering.py
+
+"""
+utils.clustering must group titles exactly like the loop it replaced in
+Bot._post_collection. The reference corpus (tests/data/title_batches.json)
+holds generated batches with typos, merged words, subsets, years, non-ASCII
+and empty titles.
+"""
+
+import json
+import os
+
+import pytest
+from thefuzz import fuzz
+
+from utils.clustering import SIMILARITY_THRESHOLD, group_by_title
+
+CORPUS = os.path.join(os.path.dirname(__file__), "data", "title_batches.json")
+
+
+def old_grouping_loop(items, titles):
+    """The original O(titles x keys) loop, kept verbatim as the reference."""
+    logical_batches = {}
+    for current_item, current_title in zip(items, titles):
+        if not current_title: continue
+        best_match_key = max(logical_batches.keys(), key=lambda k: fuzz.token_set_ratio(current_title, k), default=None)
+        if best_match_key and fuzz.token_set_ratio(current_title, best_match_key) > SIMILARITY_THRESHOLD:
+            logical_batches[best_match_key].append(current_item)
+        else: logical_batches[current_title] = [current_item]
+    return logical_batches
+
+
+def load_batches():
+    with open(CORPUS, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize("batch_index", range(len(load_batches())))
+def test_matches_old_grouping_loop(batch_index):
+    titles = load_batches()[batch_index]
+    items = list(range(len(titles)))
+    expected = old_grouping_loop(items, titles)
+    # Same groups, same keys, same order.
+    assert list(group_by_title(items, titles).items()) == list(expected.items())
+
+
+def test_skips_empty_titles():
+    assert group_by_title(["a", "b", "c"], [None, "", "Dark"]) == {"Dark": ["c"]}
@@ -0,0 +1,57 @@
+# tests/test_filename_parser.py
+
+"""
+Golden test for the filename parser. tests/data/filename_golden.jsonl holds
+real-world and generated file names with the output the original
+clean_and_parse_filename gave for them, so the compiled parser, the batch
+path through the worker pool and any later rework must keep producing it.
+
+IMDb is replaced by a deterministic stand-in that sometimes finds a title and
+sometimes does not, so both branches of build_parsed_info are covered.
+"""
+
+import asyncio
+import json
+import os
+
+import pytest
+
+import utils.helpers as helpers
+from utils.parse_pool import shutdown_parse_pool
+
+GOLDEN = os.path.join(os.path.dirname(__file__), "data", "filename_golden.jsonl")
+
+
+def load_golden():
+    with open(GOLDEN, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def fake_imdb(title):
+    if not title or len(title) % 3 == 0:
+        return None, None
+    return title.upper()[:20] + " Official", 1990 + len(title) % 30
+
+
+@pytest.fixture
+def golden(monkeypatch):
+    monkeypatch.setattr(helpers, "get_definitive_title_from_imdb", fake_imdb)
+    return load_golden()
+
+
+def test_single_names_match_golden(golden):
+    async def run():
+        return [await helpers.clean_and_parse_filename(case["name"]) for case in golden]
+
+    for case, got in zip(golden, asyncio.run(run())):
+        assert got == case["expected"], case["name"]
+
+
+def test_batch_matches_golden(golden):
+    names = [case["name"] for case in golden]
+    try:
+        results = asyncio.run(helpers.clean_and_parse_filenames(names))
+    finally:
+        shutdown_parse_pool()
+    for case, got in zip(golden, results):
+        assert got == case["expected"], case["name"]
@@ -0,0 +1,492 @@
+# util/chunk_cache.py
+
+import asyncio
+import logging
+import os
+import shutil
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import nullcontext
+from typing import Optional
+
+import aiofiles
+from config import Config
+from util.metrics import CACHE_HITS, CACHE_MISSES, register_collector
+
+try:
+    import fcntl
+except ImportError:  # Windows: fine for a single process, which needs no cross-process locks.
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SUFFIX = ".chunk"
+FULL_SUFFIX = ".full"
+TMP_SUFFIX = ".tmp"
+FULL_DIR = "full"
+LOCK_FILE = ".lock"
+# A cache shared by web workers is swept down to this share of its budget, so
+# the (locked, directory-wide) sweeps stay infrequent.
+SWEEP_LOW_WATERMARK = 0.9
+# Temp files younger than this may belong to another process that is still writing them.
+STALE_TMP_SECONDS = 600
+
+
+def _assemble_atomic(path: str, part_paths: list):
+    """Concatenates cached chunks into one file, with the same temp-file-and-rename safety as _write_atomic."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}{TMP_SUFFIX}"
+    with open(tmp_path, "wb") as out:
+        for part_path in part_paths:
+            with open(part_path, "rb") as part:
+                shutil.copyfileobj(part, out)
+        out.flush()
+        os.fsync(out.fileno())
+    os.replace(tmp_path, path)
+
+
+class _DirLock:
+    """flock() on a lock file; exclusive across processes. A no-op where fcntl is missing."""
+
+    def __init__(self, path: str, blocking: bool = True):
+        self.path = path
+        self.blocking = blocking
+        self.file = None
+
+    def __enter__(self) -> bool:
+        if fcntl is None:
+            return True
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.file = open(self.path, "a")
+        try:
+            fcntl.flock(self.file, fcntl.LOCK_EX if self.blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self.file.close()
+            self.file = None
+            return False
+        return True
+
+    def __exit__(self, *exc):
+        if self.file:
+            self.file.close()  # releases the lock
+
+
+def _walk(root: str) -> list:
+    """[(mtime, relative path, size)] of every cached file, oldest first; drops temp files left by a crash."""
+    found = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            if name.endswith(TMP_SUFFIX):
+                try:
+                    if time.time() - os.path.getmtime(path) > STALE_TMP_SECONDS:
+                        os.remove(path)
+                except OSError: pass
+                continue
+            if not name.endswith((CHUNK_SUFFIX, FULL_SUFFIX)):
+                continue
+            try: st = os.stat(path)
+            except OSError: continue
+            found.append((st.st_mtime, os.path.relpath(path, root), st.st_size))
+    found.sort()
+    return found
+
+
+def _sweep(root: str, max_bytes: int, target_bytes: int, lock: bool) -> list:
+    """
+    Walks the cache directory and, if it holds more than `max_bytes`, deletes the
+    least recently used files until at most `target_bytes` remain. Returns what
+    is left, like _walk. With `lock`, web workers sharing the directory take turns.
+    """
+    os.makedirs(root, exist_ok=True)
+    with _DirLock(os.path.join(root, LOCK_FILE)) if lock else nullcontext():
+        found = _walk(root)
+        total = sum(size for _, _, size in found)
+        if total <= max_bytes:
+            return found
+        evicted = 0
+        while evicted < len(found) and total > target_bytes:
+            _, rel_path, size = found[evicted]
+            try: os.remove(os.path.join(root, rel_path))
+            except OSError: pass
+            total -= size
+            evicted += 1
+        return found[evicted:]
+
+
+def _list_chunks(chunk_dir: str) -> dict:
+    """offset -> size of the chunks in one file's directory."""
+    chunks = {}
+    try: names = os.listdir(chunk_dir)
+    except OSError: return chunks
+    for name in names:
+        if not name.endswith(CHUNK_SUFFIX):
+            continue
+        try: chunks[int(name[:-len(CHUNK_SUFFIX)])] = os.path.getsize(os.path.join(chunk_dir, name))
+        except (OSError, ValueError): continue
+    return chunks
+
+
+def _assemble_exclusive(path: str, part_paths: list, lock_path: str) -> str:
+    """
+    _assemble_atomic for a cache shared by several processes: only one of them
+    assembles a file. Returns "assembled", "exists" (someone else finished it)
+    or "busy" (someone else is at it).
+    """
+    with _DirLock(lock_path, blocking=False) as locked:
+        if not locked:
+            return "busy"
+        if os.path.exists(path):
+            return "exists"
+        _assemble_atomic(path, part_paths)
+        return "assembled"
+
+
+def _touch(path: str):
+    try: os.utime(path)
+    except OSError: pass
+
+
+def _read_range(path: str, offset: int, length: int) -> bytes:
+    with open(path, "rb") as f:
+        f.seek(offset)
+        return f.read(length)
+
+
+def _write_atomic(path: str, data: bytes):
+    """Writes to a temp file, fsyncs it and renames it into place, so a crash never leaves a torn chunk."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}{TMP_SUFFIX}"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+class ChunkCache:
+    """
+    Disk-backed LRU cache of Telegram file chunks keyed by (file_unique_id, offset).
+    Once every chunk of a file is cached they are merged into one complete file,
+    which the web server can hand to sendfile (or nginx) directly.
+
+    A chunk is only admitted after it has been requested `admit_after` times, so
+    one-off downloads do not flush out the files people keep coming back to.
+
+    With `shared`, web worker processes use one directory and one budget. Each
+    keeps its own in-memory index; the directory is the source of truth:
+
+    - a miss re-checks the disk, so a file another worker cached is found;
+    - hits touch the file's mtime, which orders the LRU across processes;
+    - eviction is a sweep of the whole directory under a file lock, started
+      once this process estimates (its own writes times `processes`) that the
+      budget is exceeded;
+    - only one worker assembles a given file.
+    """
+
+    def __init__(self, root: str, max_bytes: int, admit_after: int = 1, doorkeeper_size: int = 100_000,
+                 shared: bool = False, processes: int = 1):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self.processes = max(1, processes)
+        self.written_since_sweep = 0
+        self.sweep_task = None
+        self.admit_after = max(1, admit_after)
+        self.doorkeeper_size = doorkeeper_size
+
+        self.index = OrderedDict()  # relative path -> size, oldest first
+        self.file_offsets = defaultdict(set)  # file_unique_id -> offsets of cached chunks
+        self.assembling = set()
+        self.assemble_tasks = set()  # background maybe_assemble() runs
+        self.request_counts = OrderedDict()  # key -> times requested while not cached
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._scan()
+
+    def _sweep_target(self) -> int:
+        return int(self.max_bytes * SWEEP_LOW_WATERMARK) if self.shared else self.max_bytes
+
+    def _load(self, found: list):
+        self.index.clear()
+        self.file_offsets.clear()
+        self.current_bytes = 0
+        for _, rel_path, size in found:
+            self._add(rel_path, size)
+
+    def _scan(self):
+        """Rebuilds the LRU index from disk, dropping temp files left by a crash."""
+        self._load(_sweep(self.root, self.max_bytes, self._sweep_target(), self.shared))
+        logger.info(f"Chunk cache ready at '{self.root}': {len(self.index)} chunks, {self.current_bytes / (1024 * 1024):.1f} MB.")
+
+    @staticmethod
+    def _rel_path(file_unique_id: str, offset: int) -> str:
+        return os.path.join(file_unique_id[:2], file_unique_id, f"{offset}{CHUNK_SUFFIX}")
+
+    @staticmethod
+    def _full_rel_path(file_unique_id: str) -> str:
+        return os.path.join(FULL_DIR, file_unique_id[:2], f"{file_unique_id}{FULL_SUFFIX}")
+
+    @staticmethod
+    def _chunk_key(rel_path: str):
+        """Maps a chunk's relative path back to (file_unique_id, offset), or None for complete files."""
+        if not rel_path.endswith(CHUNK_SUFFIX):
+            return None
+        head, name = os.path.split(rel_path)
+        return os.path.basename(head), int(name[:-len(CHUNK_SUFFIX)])
+
+    def _add(self, rel_path: str, size: int):
+        self.index[rel_path] = size
+        self.current_bytes += size
+        key = self._chunk_key(rel_path)
+        if key:
+            self.file_offsets[key[0]].add(key[1])
+
+    def _remove(self, rel_path: str, delete: bool = True):
+        size = self.index.pop(rel_path, None)
+        if size is None:
+            return
+        self.current_bytes -= size
+        key = self._chunk_key(rel_path)
+        if key:
+            offsets = self.file_offsets.get(key[0])
+            if offsets is not None:
+                offsets.discard(key[1])
+                if not offsets: del self.file_offsets[key[0]]
+        if delete:
+            try: os.remove(os.path.join(self.root, rel_path))
+            except OSError: pass
+
+    async def _adopt(self, rel_path: str) -> bool:
+        """Shared caches: indexes a file another worker wrote, if it is on disk."""
+        if not self.shared:
+            return False
+        loop = asyncio.get_event_loop()
+        try: size = await loop.run_in_executor(None, os.path.getsize, os.path.join(self.root, rel_path))
+        except OSError: return False
+        if rel_path not in self.index:
+            self._add(rel_path, size)
+        return True
+
+    async def _used(self, rel_path: str):
+        """Marks a hit: LRU order here, and the file's mtime for the other workers' sweeps."""
+        self.index.move_to_end(rel_path)
+        if self.shared:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, _touch, os.path.join(self.root, rel_path))
+
+    def _evict(self):
+        if self.shared:
+            self._maybe_sweep()
+            return
+        while self.current_bytes > self.max_bytes and self.index:
+            self._remove(next(iter(self.index)))
+
+    def _maybe_sweep(self):
+        # The other workers' writes are unknown here; assume each writes about as much as this one.
+        estimate = self.current_bytes + self.written_since_sweep * (self.processes - 1)
+        if estimate <= self.max_bytes or self.sweep_task is not None:
+            return
+        self.sweep_task = asyncio.create_task(self._sweep_shared())
+
+    async def _sweep_shared(self):
+        try:
+            loop = asyncio.get_event_loop()
+            found = await loop.run_in_executor(None, _sweep, self.root, self.max_bytes, self._sweep_target(), True)
+            self._load(found)
+            self.written_since_sweep = 0
+        except Exception as e:
+            logger.error(f"Could not sweep the shared chunk cache: {e}")
+        finally:
+            self.sweep_task = None
+
+    def _count_request(self, rel_path: str) -> int:
+        count = self.request_counts.pop(rel_path, 0) + 1
+        self.request_counts[rel_path] = count
+        if len(self.request_counts) > self.doorkeeper_size:
+            self.request_counts.popitem(last=False)
+        return count
+
+    def _should_admit(self, rel_path: str) -> bool:
+        if self._count_request(rel_path) >= self.admit_after:
+            self.request_counts.pop(rel_path, None)
+            return True
+        return False
+
+    def note_request(self, file_unique_id: str, offset: int):
+        """Counts a request for a chunk that was served without a cache lookup (e.g. by a coalesced fetch)."""
+        rel_path = self._rel_path(file_unique_id, offset)
+        if rel_path not in self.index:
+            self._count_request(rel_path)
+
+    async def complete_path(self, file_unique_id: str) -> Optional[str]:
+        """Absolute path of the fully cached file, if it has been assembled."""
+        rel_path = self._full_rel_path(file_unique_id)
+        if rel_path not in self.index and not await self._adopt(rel_path):
+            return None
+        await self._used(rel_path)
+        return os.path.join(self.root, rel_path)
+
+    async def get(self, file_unique_id: str, offset: int, length: int = None) -> Optional[bytes]:
+        full_rel_path = self._full_rel_path(file_unique_id)
+        if length and (full_rel_path in self.index or await self._adopt(full_rel_path)):
+            try:
+                loop = asyncio.get_event_loop()
+                data = await loop.run_in_executor(None, _read_range, os.path.join(self.root, full_rel_path), offset, length)
+                await self._used(full_rel_path)
+                self.hits += 1
+                return data
+            except FileNotFoundError:
+                # Swept by another web worker.
+                self._remove(full_rel_path, delete=False)
+            except OSError as e:
+                logger.warning(f"Dropping unreadable cached file '{full_rel_path}': {e}")
+                self._remove(full_rel_path)
+
+        rel_path = self._rel_path(file_unique_id, offset)
+        if rel_path in self.index or await self._adopt(rel_path):
+            try:
+                async with aiofiles.open(os.path.join(self.root, rel_path), 'rb') as f:
+                    data = await f.read()
+                await self._used(rel_path)
+                self.hits += 1
+                return data
+            except FileNotFoundError:
+                # Swept by another web worker.
+                self._remove(rel_path, delete=False)
+            except OSError as e:
+                logger.warning(f"Dropping unreadable cached chunk '{rel_path}': {e}")
+                self._remove(rel_path)
+        self.misses += 1
+        return None
+
+    async def put(self, file_unique_id: str, offset: int, data: bytes):
+        rel_path = self._rel_path(file_unique_id, offset)
+        if rel_path in self.index or self._full_rel_path(file_unique_id) in self.index:
+            return
+        if len(data) > self.max_bytes or not self._should_admit(rel_path):
+            return
+        try:
+            loop = asyncio.get_event_loop()
+            await loop.run_in_executor(None, _write_atomic, os.path.join(self.root, rel_path), data)
+        except OSError as e:
+            logger.error(f"Could not write chunk '{rel_path}' to cache: {e}")
+            return
+        if rel_path not in self.index:
+            self._add(rel_path, len(data))
+        self.written_since_sweep += len(data)
+        self._evict()
+
+    def schedule_assemble(self, file_unique_id: str, file_size: int, chunk_size: int):
+        """Runs maybe_assemble() in the background, keeping the task referenced until it finishes."""
+        task = asyncio.create_task(self.maybe_assemble(file_unique_id, file_size, chunk_size))
+        self.assemble_tasks.add(task)
+        task.add_done_callback(self._assemble_done)
+
+    def _assemble_done(self, task: asyncio.Task):
+        self.assemble_tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(f"Assembling a cached file failed: {task.exception()!r}")
+
+    async def maybe_assemble(self, file_unique_id: str, file_size: int, chunk_size: int):
+        """Merges a file's chunks into one complete file once all of them are cached."""
+        if not file_size or file_size > self.max_bytes or file_unique_id in self.assembling:
+            return
+        full_rel_path = self._full_rel_path(file_unique_id)
+        expected = range(0, file_size, chunk_size)
+        if full_rel_path in self.index:
+            return
+        if self.shared:
+            # Other workers cached some of the chunks too.
+            await self._sync_offsets(file_unique_id)
+        offsets = self.file_offsets.get(file_unique_id, set())
+        if len(offsets) != len(expected) or not offsets.issuperset(expected):
+            return
+
+        self.assembling.add(file_unique_id)
+        try:
+            part_rel_paths = [self._rel_path(file_unique_id, o) for o in expected]
+            part_paths = [os.path.join(self.root, p) for p in part_rel_paths]
+            full_path = os.path.join(self.root, full_rel_path)
+            loop = asyncio.get_event_loop()
+            if self.shared:
+                lock_path = os.path.join(self.root, os.path.dirname(part_rel_paths[0]), LOCK_FILE)
+                outcome = await loop.run_in_executor(None, _assemble_exclusive, full_path, part_paths, lock_path)
+                if outcome == "busy":
+                    return
+            else:
+                await loop.run_in_executor(None, _assemble_atomic, full_path, part_paths)
+                outcome = "assembled"
+            for part_rel_path in part_rel_paths:
+                self._remove(part_rel_path)
+            self._add(full_rel_path, file_size)
+            if outcome == "exists":
+                return
+            self._evict()
+            logger.info(f"Assembled complete cached copy of file '{file_unique_id}'.")
+        except OSError as e:
+            logger.error(f"Could not assemble cached file '{file_unique_id}': {e}")
+        finally:
+            self.assembling.discard(file_unique_id)
+
+    async def _sync_offsets(self, file_unique_id: str):
+        """Shared caches: brings one file's chunk index in line with what is on disk."""
+        chunk_dir = os.path.join(self.root, os.path.dirname(self._rel_path(file_unique_id, 0)))
+        loop = asyncio.get_event_loop()
+        on_disk = await loop.run_in_executor(None, _list_chunks, chunk_dir)
+        for offset in list(self.file_offsets.get(file_unique_id, ())):
+            if offset not in on_disk:
+                # Swept by another worker.
+                self._remove(self._rel_path(file_unique_id, offset), delete=False)
+        for offset, size in on_disk.items():
+            rel_path = self._rel_path(file_unique_id, offset)
+            if rel_path not in self.index:
+                self._add(rel_path, size)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            "chunks": len(self.index),
+            "complete_files": sum(1 for p in self.index if p.endswith(FULL_SUFFIX)),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+_chunk_cache = None
+_shared_by = 0  # number of web workers sharing the cache, inside a web worker process
+
+
+def share_with_workers(count: int):
+    """Marks this process as one of `count` web workers sharing STREAM_CACHE_DIR and its budget."""
+    global _shared_by
+    _shared_by = max(1, count)
+
+
+def get_chunk_cache() -> Optional[ChunkCache]:
+    """Returns the process-wide chunk cache, or None when it is disabled."""
+    global _chunk_cache
+    if _chunk_cache is None and Config.STREAM_CACHE_MAX_MB > 0:
+        if Config.WEB_WORKERS > 0 and not _shared_by:
+            # The web workers do the streaming and own the cache.
+            return None
+        _chunk_cache = ChunkCache(
+            Config.STREAM_CACHE_DIR,
+            Config.STREAM_CACHE_MAX_MB * 1024 * 1024,
+            admit_after=Config.STREAM_CACHE_ADMIT_AFTER,
+            shared=_shared_by > 1, processes=_shared_by
+        )
+    return _chunk_cache
+
+
+def _collect_metrics():
+    if _chunk_cache:
+        CACHE_HITS.set_total(_chunk_cache.hits, cache="stream_chunks")
+        CACHE_MISSES.set_total(_chunk_cache.misses, cache="stream_chunks")
+
+
+register_collector(_collect_metrics)
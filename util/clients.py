@@ -0,0 +1,82 @@
+# util/clients.py
+
+import logging
+import time
+from contextlib import contextmanager
+from pyrogram import Client
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class ClientRotation:
+    """
+    Spreads streaming requests over the main bot and any helper bots.
+    Each request goes to the least busy client; a client that hits FloodWait
+    is benched until the wait is over.
+    """
+
+    def __init__(self):
+        self.clients = []
+        self.work_loads = {}
+        self.benched_until = {}
+
+    def add(self, client: Client):
+        if client not in self.work_loads:
+            self.clients.append(client)
+            self.work_loads[client] = 0
+
+    def pick(self) -> Client:
+        now = time.monotonic()
+        available = [c for c in self.clients if self.benched_until.get(c, 0) <= now]
+        if not available:
+            # Everyone is benched: use whoever comes back first rather than failing.
+            return min(self.clients, key=lambda c: self.benched_until.get(c, 0))
+        return min(available, key=lambda c: self.work_loads[c])
+
+    def bench(self, client: Client, seconds: float):
+        self.benched_until[client] = time.monotonic() + seconds
+        logger.warning(f"Client '{client.name}' hit FloodWait; removed from stream rotation for {seconds}s.")
+
+    @contextmanager
+    def track(self, client: Client):
+        """Counts an active stream against `client` for least-busy selection."""
+        self.work_loads[client] = self.work_loads.get(client, 0) + 1
+        try:
+            yield client
+        finally:
+            self.work_loads[client] -= 1
+
+    def stats(self) -> list:
+        now = time.monotonic()
+        return [
+            (c.name, self.work_loads[c], max(0, round(self.benched_until.get(c, 0) - now)))
+            for c in self.clients
+        ]
+
+
+async def start_worker_clients(bot) -> list:
+    """Starts a lightweight client for every helper token and adds it to the bot's rotation."""
+    workers = []
+    for i, token in enumerate(Config.MULTI_CLIENT_TOKENS, start=1):
+        worker = Client(
+            f"StreamWorker{i}", api_id=Config.API_ID, api_hash=Config.API_HASH,
+            bot_token=token, no_updates=True, in_memory=True
+        )
+        try:
+            await worker.start()
+            # Helpers must be admins in the Owner DB channel to read its messages.
+            await worker.get_chat(bot.owner_db_channel)
+        except Exception as e:
+            logger.error(f"Helper bot #{i} could not start or access the Owner DB channel: {e}")
+            try: await worker.stop()
+            except Exception: pass
+            continue
+
+        worker.owner_db_channel = bot.owner_db_channel
+        worker.client_rotation = bot.client_rotation
+        worker.is_worker = True
+        bot.client_rotation.add(worker)
+        workers.append(worker)
+        logger.info(f"Helper bot #{i} added to the stream rotation.")
+    return workers
@@ -3,52 +3,94 @@
 import asyncio
 import logging
 import math
+import random
+from collections import deque
 from typing import Union
 from pyrogram import Client, raw, utils
 from pyrogram.file_id import FileId
-from pyrogram.session import Session, Auth
-from pyrogram.errors import AuthBytesInvalid
-from util.file_properties import get_file_properties, FileIdError
+from pyrogram.errors import FileReferenceExpired, FileMigrate, FloodWait, InternalServerError
+from config import Config
+from util.cache import LRUCache
+from util.chunk_cache import get_chunk_cache
+from util.media_session_pool import get_session_pool
+from util.metrics import TELEGRAM_CALL_SECONDS
+from util.file_properties import get_file_properties, refresh_file_properties, FileIdError
 
 logger = logging.getLogger(__name__)
 
+# Errors worth resuming from: the connection, not the request, went wrong.
+TRANSIENT_ERRORS = (asyncio.TimeoutError, OSError, ConnectionError, InternalServerError)
+
+
+class StreamInterrupted(Exception):
+    """A stream could not be completed; the response must not look finished."""
+
+
+class StreamState:
+    """Recovery state shared by every part of one stream."""
+
+    def __init__(self, file_id: FileId, retry_budget: int, dc_id: int = None):
+        self.file_id = file_id
+        self.dc_id = dc_id or file_id.dc_id
+        self.initial_file_id = file_id
+        self.initial_dc_id = self.dc_id
+        self.retries_left = retry_budget
+        self.refresh_lock = asyncio.Lock()
+
+    def spend(self, reason: str):
+        if self.retries_left <= 0:
+            raise StreamInterrupted(f"Retry budget exhausted ({reason}).")
+        self.retries_left -= 1
+
+    def adopt(self, fetch_state: "StreamState", own_file_id: FileId, retry_budget: int):
+        """
+        Takes over what a shared fetch on the same client learned (a refreshed
+        file reference, a new DC), unless this stream moved on meanwhile, and
+        charges the fetch's retries to this stream.
+        """
+        refreshed = fetch_state.file_id is not fetch_state.initial_file_id or fetch_state.dc_id != fetch_state.initial_dc_id
+        if refreshed and self.file_id is own_file_id:
+            self.file_id = fetch_state.file_id
+            self.dc_id = fetch_state.dc_id
+        self.retries_left = max(0, self.retries_left - (retry_budget - fetch_state.retries_left))
+
+
+# (client, file_unique_id, offset) -> (task, state) fetching that part for every waiting stream.
+# The client is part of the key: a FileId (access hash, file reference) only works for the
+# client that resolved it, and a stream moved off a benched client must not wait on it.
+_inflight = {}
+
+
 class ByteStreamer:
     def __init__(self, client: Client):
         self.client: Client = client
+        self.cache = get_chunk_cache()
+        self.session_pool = get_session_pool(client)
+        self.rotation = getattr(client, "client_rotation", None)
+        # message_id -> FileId, so hot files skip even the Mongo lookup
+        self.cached_file_ids = LRUCache(Config.FILE_PROPERTIES_CACHE_SIZE)
 
     async def get_file_properties(self, message_id: int):
+        file_id = self.cached_file_ids.get(message_id)
+        if file_id is not None:
+            return file_id
         try:
-            return await get_file_properties(self.client, message_id)
+            file_id = await get_file_properties(self.client, message_id)
         except (ValueError, FileIdError) as e:
             logger.error(f"Failed to get file properties for message_id {message_id}: {e}")
             raise
+        self.cached_file_ids.set(message_id, file_id)
+        return file_id
 
-    async def generate_media_session(self, client: Client, dc_id: int):
-        session = client.media_sessions.get(dc_id)
-
-        if session is None:
-            session = Session(
-                client, dc_id, await Auth(client, dc_id, await client.storage.test_mode()).create(),
-                await client.storage.test_mode(), is_media=True
-            )
-            await session.start()
-
-            for i in range(3):
-                exported_auth = await client.invoke(
-                    raw.functions.auth.ExportAuthorization(dc_id=dc_id)
-                )
-                try:
-                    await session.invoke(
-                        raw.functions.auth.ImportAuthorization(
-                            id=exported_auth.id,
-                            bytes=exported_auth.bytes
-                        )
-                    )
-                    break
-                except AuthBytesInvalid:
-                    continue
-            client.media_sessions[dc_id] = session
-        return session
+    async def refresh_file_properties(self, stale_file_id: FileId):
+        """Replaces a FileId whose file_reference expired, unless another stream already did."""
+        message_id = stale_file_id.message_id
+        current = self.cached_file_ids.get(message_id)
+        if current is not None and current.file_reference != stale_file_id.file_reference:
+            return current
+        file_id = await refresh_file_properties(self.client, message_id)
+        self.cached_file_ids.set(message_id, file_id)
+        return file_id
 
     @staticmethod
     def get_location(file_id: FileId):
@@ -59,39 +101,147 @@ class ByteStreamer:
             thumb_size=""
         )
 
-    async def yield_file(self, file_id: FileId, offset: int, first_part_cut: int, last_part_cut: int, part_count: int, chunk_size: int):
-        media_session = await self.generate_media_session(self.client, file_id.dc_id)
-        location = self.get_location(file_id)
+    async def _fetch_chunk(self, state: "StreamState", offset: int, chunk_size: int):
+        """
+        Fetches a single part at `offset`, resuming from that exact offset after
+        recoverable errors until the stream's retry budget runs out.
+        The disk cache is consulted first and filled on a miss.
+        """
+        unique_id = getattr(state.file_id, "file_unique_id", None)
+        if self.cache and unique_id:
+            cached = await self.cache.get(unique_id, offset, chunk_size)
+            if cached is not None:
+                return cached
 
-        current_part = 1
-        while current_part <= part_count:
+        attempt = 0
+        while True:
+            file_id = state.file_id
             try:
-                chunk = await media_session.invoke(
-                    raw.functions.upload.GetFile(
-                        location=location,
-                        offset=offset,
-                        limit=chunk_size
-                    ),
-                    retries=0
-                )
+                async with self.session_pool.session(state.dc_id) as media_session:
+                    with TELEGRAM_CALL_SECONDS.time(method="upload.GetFile"):
+                        chunk = await media_session.invoke(
+                            raw.functions.upload.GetFile(
+                                location=self.get_location(file_id),
+                                offset=offset,
+                                limit=chunk_size
+                            ),
+                            retries=0
+                        )
                 if isinstance(chunk, raw.types.upload.File):
-                    if current_part == 1 and part_count > 1:
-                        yield chunk.bytes[first_part_cut:]
-                    elif current_part == part_count and part_count > 1:
-                        yield chunk.bytes[:last_part_cut]
-                    else:
-                        yield chunk.bytes
-                    
-                    offset += chunk_size
-                    current_part += 1
+                    if self.cache and unique_id:
+                        await self.cache.put(unique_id, offset, chunk.bytes)
+                        self.cache.schedule_assemble(unique_id, getattr(file_id, "file_size", 0), chunk_size)
+                    return chunk.bytes
+                # Handle cases where the response is not what we expect
+                raise StreamInterrupted(f"Unexpected type from GetFile at offset {offset}: {type(chunk).__name__}")
+            except FileReferenceExpired:
+                if getattr(file_id, "message_id", None) is None:
+                    raise StreamInterrupted(f"File reference expired at offset {offset} and cannot be refreshed.")
+                state.spend(f"file reference expired at offset {offset}")
+                logger.info(f"File reference expired at offset {offset}, refreshing it...")
+                async with state.refresh_lock:
+                    # Another part of this stream may have refreshed it while we waited.
+                    if state.file_id is file_id:
+                        state.file_id = await self.refresh_file_properties(file_id)
+            except FileMigrate as e:
+                state.spend(f"file migrated to DC {e.value}")
+                logger.info(f"File lives on DC {e.value}, switching media session from DC {state.dc_id}.")
+                state.dc_id = e.value
+            except FloodWait as e:
+                # Take this bot out of rotation so new streams go to the other clients.
+                if self.rotation: self.rotation.bench(self.client, e.value)
+                if e.value > Config.STREAM_MAX_FLOOD_WAIT:
+                    raise StreamInterrupted(f"FloodWait of {e.value}s is longer than this stream can wait.")
+                state.spend(f"FloodWait of {e.value}s")
+                await asyncio.sleep(e.value)
+            except TRANSIENT_ERRORS as e:
+                state.spend(f"{type(e).__name__} at offset {offset}")
+                delay = min(Config.STREAM_RETRY_MAX_DELAY, 0.5 * (2 ** attempt)) * random.uniform(0.5, 1.0)
+                attempt += 1
+                logger.warning(f"Transient error while fetching chunk at offset {offset}: {type(e).__name__}. Retrying in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+
+    async def _get_chunk(self, state: "StreamState", offset: int, chunk_size: int):
+        """
+        Single-flight wrapper around _fetch_chunk: concurrent streams asking for the
+        same part through the same client share one upstream request. The shared
+        fetch runs under its own StreamState, so one viewer's retries or
+        disconnect never decide the outcome for the others.
+        Each stream still pulls through its own bounded prefetch window, so a slow
+        client only delays itself; a client that falls behind simply re-requests
+        the part later and is served from the cache.
+        """
+        unique_id = getattr(state.file_id, "file_unique_id", None)
+        key = (self.client, unique_id or state.file_id.media_id, offset)
+        own_file_id = state.file_id
+        entry = _inflight.get(key)
+        if entry is None:
+            fetch_state = StreamState(state.file_id, Config.STREAM_RETRY_BUDGET, dc_id=state.dc_id)
+            task = asyncio.create_task(self._fetch_chunk(fetch_state, offset, chunk_size))
+            entry = (task, fetch_state)
+            _inflight[key] = entry
+            task.add_done_callback(lambda t, k=key: _inflight.pop(k, None) if _inflight.get(k, (None,))[0] is t else None)
+        elif self.cache and unique_id:
+            # Riding along on another viewer's fetch still counts as a request for the part.
+            self.cache.note_request(unique_id, offset)
+        task, fetch_state = entry
+        # Shielded so a disconnecting viewer does not cancel the fetch for the others.
+        try:
+            return await asyncio.shield(task)
+        finally:
+            if task.done():
+                state.adopt(fetch_state, own_file_id, Config.STREAM_RETRY_BUDGET)
+
+    async def yield_file(self, file_id: FileId, offset: int, first_part_cut: int, last_part_cut: int, part_count: int, chunk_size: int):
+        """
+        Yields the requested parts in order while keeping up to
+        Config.STREAM_PREFETCH_CHUNKS GetFile requests in flight. Buffered memory
+        per stream is therefore bounded by window * chunk_size.
+
+        Raises StreamInterrupted if a part cannot be fetched within the retry
+        budget, so callers never mistake a failed stream for a complete one.
+        """
+        state = StreamState(file_id, Config.STREAM_RETRY_BUDGET)
+        window = max(1, Config.STREAM_PREFETCH_CHUNKS)
+
+        pending = deque()
+        next_offset = offset
+        requested_parts = 0
+        current_part = 1
+        try:
+            while current_part <= part_count:
+                # Top up the window; the deque keeps replies ordered by offset.
+                while len(pending) < window and requested_parts < part_count:
+                    pending.append(asyncio.create_task(
+                        self._get_chunk(state, next_offset, chunk_size)
+                    ))
+                    next_offset += chunk_size
+                    requested_parts += 1
+
+                chunk = await pending.popleft()
+
+                if part_count == 1:
+                    yield chunk[first_part_cut:last_part_cut]
+                elif current_part == 1:
+                    yield chunk[first_part_cut:]
+                elif current_part == part_count:
+                    yield chunk[:last_part_cut]
                 else:
-                    # Handle cases where the response is not what we expect
-                    logger.warning(f"Received unexpected type from GetFile: {type(chunk)}")
-                    break
-            except asyncio.TimeoutError:
-                logger.warning("Timeout error while fetching chunk, retrying...")
-                await asyncio.sleep(1) # Simple delay before retry
-                continue
-            except Exception as e:
-                logger.error(f"Error yielding file chunk: {e}", exc_info=True)
-                break
+                    yield chunk
+                current_part += 1
+        finally:
+            for task in pending:
+                task.cancel()
+
+
+# One ByteStreamer per client, so media sessions and descriptors are reused across requests.
+class_cache = {}
+
+
+def get_streamer(client: Client) -> ByteStreamer:
+    """Returns the shared ByteStreamer for a client, creating it on first use."""
+    streamer = class_cache.get(client)
+    if streamer is None:
+        streamer = ByteStreamer(client)
+        class_cache[client] = streamer
+    return streamer
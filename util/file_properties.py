@@ -1,9 +1,13 @@
 # util/file_properties.py (NEW FILE)
 
+import logging
 from pyrogram import Client
 from typing import Any, Optional
 from pyrogram.types import Message
 from pyrogram.file_id import FileId
+from database.db import get_file_by_stream_id, update_stream_descriptor
+
+logger = logging.getLogger(__name__)
 
 class FileIdError(Exception):
     pass
@@ -13,30 +17,76 @@ async def parse_file_id(message: "Message") -> Optional[FileId]:
     if media:
         return FileId.decode(media.file_id)
 
-async def get_file_properties(client: Client, message_id: int):
-    # stream_channel ya owner_db_channel se message fetch karein
-    stream_channel = client.stream_channel_id or client.owner_db_channel_id
+def build_file_id(encoded_file_id: str, message_id: int, file_unique_id: str = None,
+                  file_size: int = 0, mime_type: str = None, file_name: str = None,
+                  date=None) -> FileId:
+    """Decodes a stored file_id and attaches the properties the streaming routes need."""
+    file_id = FileId.decode(encoded_file_id)
+    setattr(file_id, "message_id", message_id)
+    setattr(file_id, "file_unique_id", file_unique_id)
+    setattr(file_id, "file_size", file_size or 0)
+    setattr(file_id, "mime_type", mime_type or "application/octet-stream")
+    setattr(file_id, "file_name", file_name or "unknown")
+    setattr(file_id, "date", date)
+    return file_id
+
+async def fetch_file_properties(client: Client, message_id: int) -> FileId:
+    """Fetches the message from the Owner DB channel to get a fresh file_id and file_reference."""
+    stream_channel = client.owner_db_channel
     if not stream_channel:
-        raise ValueError("Neither Stream Channel nor Owner DB Channel is configured.")
-    
+        raise ValueError("Owner DB Channel is not configured.")
+
     message = await client.get_messages(chat_id=stream_channel, message_ids=message_id)
-    
+
     if not message or not message.media:
         raise FileIdError("Message not found or has no media.")
-        
+
     media = get_media_from_message(message)
-    file_id = await parse_file_id(message)
-    
-    # File properties ko file_id object mein attach karein
-    setattr(file_id, "file_size", getattr(media, "file_size", 0))
-    setattr(file_id, "mime_type", getattr(media, "mime_type", "application/octet-stream"))
-    setattr(file_id, "file_name", getattr(media, "file_name", "unknown"))
-    
+    return build_file_id(
+        media.file_id, message_id,
+        file_unique_id=getattr(media, "file_unique_id", None),
+        file_size=getattr(media, "file_size", 0),
+        mime_type=getattr(media, "mime_type", None),
+        file_name=getattr(media, "file_name", None),
+        date=message.date
+    )
+
+async def get_file_properties(client: Client, message_id: int) -> FileId:
+    """
+    Resolves a stream message id to a FileId, preferring the descriptor saved at
+    ingest time and only calling get_messages when no descriptor exists yet.
+    """
+    if getattr(client, "is_worker", False):
+        # Stored descriptors belong to the main bot; helper bots need their own file_id.
+        return await fetch_file_properties(client, message_id)
+
+    record = await get_file_by_stream_id(message_id)
+    if record and record.get('stream_file_id'):
+        return build_file_id(
+            record['stream_file_id'], message_id,
+            file_unique_id=record.get('file_unique_id'),
+            file_size=record.get('file_size'),
+            mime_type=record.get('mime_type'),
+            file_name=record.get('file_name'),
+            date=record.get('uploaded_at')
+        )
+
+    file_id = await fetch_file_properties(client, message_id)
+    if record:
+        await update_stream_descriptor(message_id, file_id.encode(), file_id.mime_type, file_id.date)
+    return file_id
+
+async def refresh_file_properties(client: Client, message_id: int) -> FileId:
+    """Re-fetches a file whose file_reference has expired and stores the fresh descriptor."""
+    file_id = await fetch_file_properties(client, message_id)
+    if not getattr(client, "is_worker", False):
+        await update_stream_descriptor(message_id, file_id.encode(), file_id.mime_type, file_id.date)
+    logger.info(f"Refreshed file reference for stream message {message_id}.")
     return file_id
 
 def get_media_from_message(message: "Message") -> Any:
     media_types = (
-        "audio", "document", "photo", "sticker", "animation", 
+        "audio", "document", "photo", "sticker", "animation",
         "video", "voice", "video_note",
     )
     for attr in media_types:
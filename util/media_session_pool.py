@@ -0,0 +1,165 @@
+# util/media_session_pool.py
+
+import asyncio
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from pyrogram import Client, raw
+from pyrogram.session import Session, Auth
+from pyrogram.errors import AuthBytesInvalid, AuthKeyUnregistered
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Errors that say something about the connection itself rather than the request.
+SESSION_ERRORS = (OSError, ConnectionError, asyncio.TimeoutError, AuthKeyUnregistered)
+
+
+class PooledSession:
+    def __init__(self, session: Session, dc_id: int, index: int):
+        self.session = session
+        self.dc_id = dc_id
+        self.index = index
+        self.in_flight = 0
+        self.failures = 0
+
+
+class MediaSessionPool:
+    """
+    Keeps up to `size` authorized media sessions per DC and hands out the least
+    loaded one for each request. Sessions are opened lazily, only when every
+    existing one is busy, and are evicted after `max_failures` consecutive
+    connection errors.
+    """
+
+    def __init__(self, client: Client, size: int, max_failures: int = 3):
+        self.client = client
+        self.size = max(1, size)
+        self.max_failures = max(1, max_failures)
+        self.sessions = defaultdict(list)  # dc_id -> [PooledSession]
+        self.auth_keys = {}  # dc_id -> auth key already imported into that DC
+        self.locks = defaultdict(asyncio.Lock)
+        self._next_index = defaultdict(int)
+        self.stop_tasks = set()  # evicted sessions still shutting down
+
+    async def _get_auth_key(self, dc_id: int) -> bytes:
+        client = self.client
+        if dc_id == await client.storage.dc_id():
+            # The home DC already trusts our auth key; exporting to it is rejected.
+            return await client.storage.auth_key()
+
+        auth_key = self.auth_keys.get(dc_id)
+        if auth_key:
+            return auth_key
+
+        test_mode = await client.storage.test_mode()
+        auth_key = await Auth(client, dc_id, test_mode).create()
+        session = Session(client, dc_id, auth_key, test_mode, is_media=True)
+        await session.start()
+        try:
+            for i in range(3):
+                exported_auth = await client.invoke(
+                    raw.functions.auth.ExportAuthorization(dc_id=dc_id)
+                )
+                try:
+                    await session.invoke(
+                        raw.functions.auth.ImportAuthorization(
+                            id=exported_auth.id,
+                            bytes=exported_auth.bytes
+                        )
+                    )
+                    break
+                except AuthBytesInvalid:
+                    continue
+        finally:
+            await session.stop()
+
+        self.auth_keys[dc_id] = auth_key
+        return auth_key
+
+    async def _open_session(self, dc_id: int) -> PooledSession:
+        auth_key = await self._get_auth_key(dc_id)
+        session = Session(
+            self.client, dc_id, auth_key,
+            await self.client.storage.test_mode(), is_media=True
+        )
+        await session.start()
+        self._next_index[dc_id] += 1
+        entry = PooledSession(session, dc_id, self._next_index[dc_id])
+        self.sessions[dc_id].append(entry)
+        logger.info(f"Opened media session #{entry.index} for DC {dc_id} ({len(self.sessions[dc_id])}/{self.size}).")
+        return entry
+
+    async def acquire(self, dc_id: int) -> PooledSession:
+        entries = self.sessions[dc_id]
+        least_loaded = min(entries, key=lambda e: e.in_flight, default=None)
+        if least_loaded is None or (least_loaded.in_flight > 0 and len(entries) < self.size):
+            async with self.locks[dc_id]:
+                entries = self.sessions[dc_id]
+                least_loaded = min(entries, key=lambda e: e.in_flight, default=None)
+                if least_loaded is None or (least_loaded.in_flight > 0 and len(entries) < self.size):
+                    try:
+                        least_loaded = await self._open_session(dc_id)
+                    except Exception as e:
+                        if least_loaded is None:
+                            raise
+                        logger.warning(f"Could not open an extra media session for DC {dc_id}: {e}")
+        least_loaded.in_flight += 1
+        return least_loaded
+
+    def _evict(self, entry: PooledSession, error: Exception):
+        if entry in self.sessions[entry.dc_id]:
+            self.sessions[entry.dc_id].remove(entry)
+        if isinstance(error, AuthKeyUnregistered):
+            # Force a fresh ExportAuthorization for the next session on this DC.
+            self.auth_keys.pop(entry.dc_id, None)
+        logger.warning(f"Evicting media session #{entry.index} for DC {entry.dc_id} after {entry.failures} failures: {error}")
+        task = asyncio.create_task(entry.session.stop())
+        self.stop_tasks.add(task)
+        task.add_done_callback(self._session_stopped)
+
+    def _session_stopped(self, task: asyncio.Task):
+        self.stop_tasks.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.warning(f"Error while stopping an evicted media session: {task.exception()}")
+
+    @asynccontextmanager
+    async def session(self, dc_id: int):
+        """Yields the least loaded healthy session for `dc_id`, tracking its in-flight count."""
+        entry = await self.acquire(dc_id)
+        try:
+            yield entry.session
+        except SESSION_ERRORS as e:
+            entry.failures += 1
+            if entry.failures >= self.max_failures or isinstance(e, AuthKeyUnregistered):
+                self._evict(entry, e)
+            raise
+        else:
+            entry.failures = 0
+        finally:
+            entry.in_flight -= 1
+
+    def stats(self) -> dict:
+        """Per-DC list of (session index, in-flight requests)."""
+        return {
+            dc_id: [(e.index, e.in_flight) for e in entries]
+            for dc_id, entries in self.sessions.items() if entries
+        }
+
+    async def stop(self):
+        if self.stop_tasks:
+            await asyncio.gather(*self.stop_tasks, return_exceptions=True)
+        for entries in self.sessions.values():
+            for entry in entries:
+                try: await entry.session.stop()
+                except Exception: pass
+        self.sessions.clear()
+
+
+def get_session_pool(client: Client) -> MediaSessionPool:
+    """Returns the media session pool attached to a client, creating it on first use."""
+    pool = getattr(client, "media_session_pool", None)
+    if pool is None:
+        pool = MediaSessionPool(client, Config.MEDIA_SESSIONS_PER_DC, Config.MEDIA_SESSION_MAX_FAILURES)
+        client.media_session_pool = pool
+    return pool
@@ -0,0 +1,166 @@
+# util/metrics.py
+
+import bisect
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# A deliberately tiny Prometheus text-format registry: plain dicts and floats, so
+# recording a sample costs a dict lookup and an addition and can stay on in production.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_metrics = []
+_collectors = []
+_constant_labels = []  # added to every sample, e.g. the web worker index
+
+
+def set_constant_labels(**labels):
+    """Labels every sample this process renders, so per-process series stay apart."""
+    _constant_labels[:] = list(labels.items())
+
+
+def _format_labels(names, values, extra=()):
+    pairs = _constant_labels + list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self.values = {}
+        _metrics.append(self)
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.label_names)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in self.values.items():
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def set_total(self, value: float, **labels):
+        """For counters owned by another component (e.g. cache hit counters), mirrored at scrape time."""
+        self.values[self._key(labels)] = value
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        self.values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def clear(self):
+        """Drops every label set, e.g. before re-reading per-owner gauges at scrape time."""
+        self.values.clear()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        state = self.values.get(key)
+        if state is None:
+            state = self.values[key] = [[0] * len(self.buckets), 0, 0.0]
+        index = bisect.bisect_left(self.buckets, value)
+        if index < len(self.buckets):
+            state[0][index] += 1
+        state[1] += 1
+        state[2] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, (bucket_counts, count, total) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, [('le', '+Inf')])} {count}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total}")
+        return lines
+
+
+def register_collector(callback):
+    """Registers a callable run at scrape time to refresh gauges from live state."""
+    if callback not in _collectors:
+        _collectors.append(callback)
+
+
+def render_metrics() -> str:
+    for callback in list(_collectors):
+        try:
+            callback()
+        except Exception:
+            # Its gauges keep their last values; make that visible instead of silent.
+            logger.exception(f"Metrics collector {getattr(callback, '__qualname__', callback)} failed")
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# --- Shared metrics ---
+
+STREAM_BYTES = Counter("stream_bytes_total", "Bytes sent to clients by Telegram-backed streams.")
+STREAM_REQUESTS = Counter("stream_requests_total", "Stream/download responses by how they were served.", ["source"])
+STREAM_TTFB = Histogram("stream_time_to_first_byte_seconds", "Time from request to the first body byte of a stream.")
+STREAMS_ACTIVE = Gauge("streams_active", "Streams currently holding an admission slot.")
+STREAMS_QUEUED = Gauge("streams_queued", "Streams waiting for an admission slot.")
+
+TELEGRAM_CALL_SECONDS = Histogram("telegram_call_seconds", "Latency of Telegram API calls.", ["method"])
+FLOOD_WAIT_ACTIVE = Gauge("telegram_flood_wait_active", "1 while the global FloodWait pause is engaged.")
+FLOOD_WAIT_SECONDS = Gauge("telegram_flood_wait_seconds", "Length of the most recent global FloodWait pause.")
+FLOOD_WAITS = Counter("telegram_flood_waits_total", "FloodWait errors seen by execute_with_retry.")
+
+MONGO_COMMAND_SECONDS = Histogram("mongo_command_seconds", "Latency of MongoDB commands.", ["command"])
+MONGO_COMMAND_FAILURES = Counter("mongo_command_failures_total", "Failed MongoDB commands.", ["command"])
+
+INGEST_QUEUE_DEPTH = Gauge("ingest_queue_depth", "Files waiting to be processed.")
+INGEST_OWNER_DEPTH = Gauge("ingest_owner_queue_depth", "Files queued or in progress per owner.", ["owner"])
+OPEN_BATCHES = Gauge("open_batches", "Users currently collecting a batch.")
+
+CACHE_HITS = Counter("cache_hits_total", "Cache hits.", ["cache"])
+CACHE_MISSES = Counter("cache_misses_total", "Cache misses.", ["cache"])
+
+IMDB_CALL_SECONDS = Histogram("imdb_call_seconds", "Latency of Cinemagoer network calls.", ["method"])
+IMDB_CALL_FAILURES = Counter("imdb_call_failures_total", "Cinemagoer calls that failed or hit their deadline.", ["method"])
+IMDB_CIRCUIT_OPEN = Gauge("imdb_circuit_open", "1 while IMDb lookups are skipped because IMDb keeps failing.")
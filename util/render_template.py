@@ -1,23 +1,49 @@
+import hashlib
 import jinja2
-import aiofiles
-import logging  # <-- FIX 1: Missing import add kiya gaya
+import logging
 from pyrogram import Client
-from util.custom_dl import ByteStreamer  # Naye streaming engine ko import karein
+from config import Config
+from util.cache import LRUCache
+from util.custom_dl import get_streamer
 
-async def render_page(bot: Client, message_id: int):
+# Template ek hi baar compile hota hai; har /watch hit par disk se nahi padha jata.
+template_env = jinja2.Environment(
+    loader=jinja2.FileSystemLoader("template"),
+    autoescape=jinja2.select_autoescape(["html"])
+)
+_watch_template = None
+
+# message_id -> (html, etag)
+page_cache = LRUCache(Config.WATCH_PAGE_CACHE_SIZE, ttl=Config.WATCH_PAGE_CACHE_TTL)
+
+ERROR_PAGE_TEMPLATE_MISSING = "<html><body><h1>500 Internal Server Error</h1><p>Template file not found.</p></body></html>"
+ERROR_PAGE_RENDER_FAILED = "<html><body><h1>500 Internal Server Error</h1><p>Could not render template.</p></body></html>"
+
+
+def load_watch_template():
+    """Compiles watch_page.html once; called at web server startup."""
+    global _watch_template
+    if _watch_template is None:
+        _watch_template = template_env.get_template("watch_page.html")
+    return _watch_template
+
+
+async def get_watch_page(bot: Client, message_id: int):
     """
-    Naye streaming engine ka istemal karke watch page ke liye HTML template render karta hai.
+    Watch page ka HTML aur uska ETag return karta hai, cache se agar available ho.
+    Error pages cache nahi hote aur unka ETag None hota hai.
     """
-    streamer = ByteStreamer(bot)
-    file_name = "File"  # Default naam
+    cached = page_cache.get(message_id)
+    if cached is not None:
+        return cached
 
+    file_name = "File"  # Default naam
+    found = False
     try:
-        # --- FIX 2: Naye engine ke sahi function (get_file_properties) ka istemal karein ---
-        file_id = await streamer.get_file_properties(message_id)
-        # Ab file_name seedhe file_id object se mil jayega
+        file_id = await get_streamer(bot).get_file_properties(message_id)
         if file_id and file_id.file_name:
             file_name = file_id.file_name.replace("_", " ")
-
+        found = True
     except Exception as e:
         # Agar file properties nahi milti hai, to error log karein
         logging.error(f"Could not get file properties for watch page (message_id {message_id}): {e}")
@@ -25,22 +51,24 @@ async def render_page(bot: Client, message_id: int):
     # Stream aur download URLs banayein
     stream_url = f"http://{bot.vps_ip}:{bot.vps_port}/stream/{message_id}"
     download_url = f"http://{bot.vps_ip}:{bot.vps_port}/download/{message_id}"
-    
-    # Jinja2 template ko read aur render karein
-    try:
-        async with aiofiles.open('template/watch_page.html', 'r') as f:
-            template_content = await f.read()
-        template = jinja2.Template(template_content)
 
-        return template.render(
+    try:
+        html = load_watch_template().render(
             heading=f"Watch {file_name}",
             file_name=file_name,
             stream_url=stream_url,
             download_url=download_url
         )
-    except FileNotFoundError:
+    except jinja2.TemplateNotFound:
         logging.error("FATAL: watch_page.html template not found in /template directory!")
-        return "<html><body><h1>500 Internal Server Error</h1><p>Template file not found.</p></body></html>"
+        return ERROR_PAGE_TEMPLATE_MISSING, None
     except Exception as e:
         logging.error(f"Error rendering template: {e}", exc_info=True)
-        return "<html><body><h1>500 Internal Server Error</h1><p>Could not render template.</p></body></html>"
+        return ERROR_PAGE_RENDER_FAILED, None
+
+    if not found:
+        return html, None
+    etag = '"' + hashlib.sha1(html.encode()).hexdigest() + '"'
+    page_cache.set(message_id, (html, etag))
+    return html, etag
+
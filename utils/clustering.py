@@ -0,0 +1,127 @@
+# utils/clustering.py
+
+import math
+from collections import defaultdict
+from rapidfuzz import fuzz as rf_fuzz, process
+from thefuzz import utils as fuzz_utils
+
+SIMILARITY_THRESHOLD = 85
+
+# Two titles with no token in common score token_set_ratio == ratio() of their sorted
+# token strings, and a score above 85 (>= 85.5 before rounding) needs those strings'
+# lengths to differ by less than 15% of their sum.
+LENGTH_SLACK = 0.15
+
+
+def _process(title: str) -> str:
+    """The exact preprocessing thefuzz.fuzz.token_set_ratio applies to both strings."""
+    return fuzz_utils.full_process(title, force_ascii=True)
+
+
+class TitleClusterer:
+    """
+    Groups titles exactly like the original grouping loop:
+
+        best = max(keys, key=lambda k: fuzz.token_set_ratio(title, k))  # first max wins
+        join `best` if its score > threshold, otherwise `title` becomes a new key
+
+    but only scores keys that could beat the threshold, so large batches stay fast:
+
+    - keys sharing a token with the title (inverted token index);
+    - keys sharing no token, whose sorted token string has a compatible length
+      and passes rapidfuzz's ratio() prefilter;
+    - a title whose best match scored 100 is remembered, since keys are only
+      ever appended and a later key can never beat an earlier 100.
+    """
+
+    def __init__(self, threshold: int = SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self.keys = []  # group keys in insertion order
+        self.processed = []  # processed form of each key
+        self.sorted_tokens = []  # " ".join(sorted(set(tokens))) of each key
+        self.positions = {}  # key -> index
+        self.token_index = defaultdict(list)  # token -> key indexes
+        self.length_index = defaultdict(list)  # len(sorted token string) -> key indexes
+        self.settled = {}  # processed title -> index of the key it matched with a score of 100
+
+    def add_key(self, title: str):
+        if title in self.positions:
+            return
+        index = len(self.keys)
+        processed = _process(title)
+        tokens = set(processed.split())
+        sorted_tokens = " ".join(sorted(tokens))
+        self.keys.append(title)
+        self.processed.append(processed)
+        self.sorted_tokens.append(sorted_tokens)
+        self.positions[title] = index
+        for token in tokens:
+            self.token_index[token].append(index)
+        if processed:
+            self.length_index[len(sorted_tokens)].append(index)
+
+    def _candidates(self, tokens: set, sorted_tokens: str) -> set:
+        candidates = set()
+        for token in tokens:
+            candidates.update(self.token_index.get(token, ()))
+
+        length = len(sorted_tokens)
+        low = math.floor(length * (1 - LENGTH_SLACK) / (1 + LENGTH_SLACK))
+        high = math.ceil(length * (1 + LENGTH_SLACK) / (1 - LENGTH_SLACK))
+        others = [
+            i for size in range(low, high + 1)
+            for i in self.length_index.get(size, ()) if i not in candidates
+        ]
+        if others:
+            hits = process.extract(
+                sorted_tokens, [self.sorted_tokens[i] for i in others],
+                scorer=rf_fuzz.ratio, score_cutoff=self.threshold, limit=None
+            )
+            candidates.update(others[position] for _, _, position in hits)
+        return candidates
+
+    def match(self, title: str):
+        """Returns the key `title` belongs to, or None if it should start a new group."""
+        processed = _process(title)
+        if not processed:
+            return None
+        settled = self.settled.get(processed)
+        if settled is not None:
+            return self.keys[settled]
+
+        tokens = set(processed.split())
+        candidates = sorted(self._candidates(tokens, " ".join(sorted(tokens))))
+        hits = process.extract(
+            processed, [self.processed[i] for i in candidates],
+            scorer=rf_fuzz.token_set_ratio, score_cutoff=self.threshold, limit=None
+        )
+        # Rounded like thefuzz; ties go to the oldest key, as max() did.
+        best_index, best_score = None, -1
+        for _, score, position in hits:
+            score = int(round(score))
+            index = candidates[position]
+            if score > best_score or (score == best_score and index < best_index):
+                best_index, best_score = index, score
+
+        if best_score == 100:
+            self.settled[processed] = best_index
+        return self.keys[best_index] if best_score > self.threshold else None
+
+
+def group_by_title(items, titles, threshold: int = SIMILARITY_THRESHOLD) -> dict:
+    """
+    Groups `items` by fuzzy-matching their `titles` (None/empty titles are
+    skipped). Returns {group key: [items]} in the order groups were created.
+    """
+    clusterer = TitleClusterer(threshold)
+    groups = {}
+    for item, title in zip(items, titles):
+        if not title:
+            continue
+        key = clusterer.match(title)
+        if key is not None:
+            groups[key].append(item)
+        else:
+            groups[title] = [item]
+            clusterer.add_key(title)
+    return groups
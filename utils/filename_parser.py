@@ -0,0 +1,199 @@
+# utils/filename_parser.py
+
+"""
+Synchronous filename parsing, kept free of bot/database imports so it can run
+in the parse worker processes (see utils/parse_pool.py).
+"""
+
+import re
+import PTN
+
+# --- DECREED ADDITION: START ---
+# A comprehensive map for detecting languages from filenames.
+# This map handles various abbreviations and full names, mapping them to a standard format.
+LANGUAGE_MAP = {
+    'hin': 'Hindi', 'hindi': 'Hindi',
+    'eng': 'English', 'english': 'English',
+    'tam': 'Tamil', 'tamil': 'Tamil',
+    'tel': 'Telugu', 'telugu': 'Telugu',
+    'mal': 'Malayalam', 'malayalam': 'Malayalam',
+    'kan': 'Kannada', 'kannada': 'Kannada',
+    'pun': 'Punjabi', 'punjabi': 'Punjabi',
+    'jap': 'Japanese', 'japanese': 'Japanese',
+    'kor': 'Korean', 'korean': 'Korean',
+    'chi': 'Chinese', 'chinese': 'Chinese',
+    'fre': 'French', 'french': 'French',
+    'ger': 'German', 'german': 'German',
+    'spa': 'Spanish', 'spanish': 'Spanish',
+    'ita': 'Italian', 'italian': 'Italian',
+    'rus': 'Russian', 'russian': 'Russian',
+    'ara': 'Arabic', 'arabic': 'Arabic',
+    'tur': 'Turkish', 'turkish': 'Turkish',
+    'ind': 'Indonesian', 'indonesian': 'Indonesian',
+    'multi': 'Multi-Audio', 'dual': 'Dual-Audio'
+}
+# --- DECREED ADDITION: END ---
+
+# All patterns are compiled once at import; parse_filename() is the synchronous
+# core and utils.helpers.clean_and_parse_filename() adds the IMDb lookup on top of it.
+
+_DOMAIN_RE = re.compile(r'(?:www\.)?[\w-]+\.(?:com|org|net|xyz|me|io|in|cc|biz|world|info|club|mobi|press|top|site|tech|online|store|live|co|shop|fun|tamilmv)\b', re.IGNORECASE)
+_HANDLE_RE = re.compile(r'@[a-zA-Z0-9_]+')
+
+# Episode range patterns, tried in order; the first whose range is ascending wins.
+_RANGE_PATTERNS = [
+    (r'(\d{1,2})\s+(?:To|-|–|—)\s+(\d{1,2})', 'no_season'),
+    (r'(\d{1,2})\s+(\d{1,2})(?=\s\d{4})', 'no_season'),
+    (r'S(\d{1,2}).*?EP\((\d{1,4})-(\d{1,4})\)', 'season'),
+    (r'S(\d{1,2}).*?\[E?(\d{1,4})\s*-\s*E?(\d{1,4})\]', 'season'),
+    (r'S(\d{1,2}).*?\[(\d{1,4})\s*To\s*(\d{1,4})\s*Eps?\]', 'season'),
+    (r'S(\d{1,2}).*?\[EP\s*(\d{1,4})\s*to\s*(\d{1,4})\]', 'season'),
+    (r'S(\d{1,2}).*?\[Epi\s*(\d{1,4})\s*-\s*(\d{1,4})\]', 'season'),
+    (r'S(\d{1,2}).*?Ep\.?(\d{1,4})-(\d{1,4})', 'season'),
+    (r'S(\d{1,2})\s*E(\d{1,4})[-\s]*E(\d{1,4})', 'season'),
+    (r'\.Ep\.\[(\d{1,4})-(\d{1,4})\]', 'no_season'),
+    (r'Ep\s*(\d{1,4})\s*-\s*(\d{1,4})', 'no_season'),
+    (r'(?:E|Episode)s?\.?\s?(\d{1,4})\s?(?:to|-|–|—)\s?(\d{1,4})', 'no_season'),
+]
+_RANGE_RES = [(re.compile(pattern, re.IGNORECASE), p_type) for pattern, p_type in _RANGE_PATTERNS]
+# Matches wherever any single range pattern would, so most names (movies,
+# single episodes) are ruled out in one pass without trying the patterns in turn.
+_ANY_RANGE_RE = re.compile('|'.join(f'(?:{pattern})' for pattern, _ in _RANGE_PATTERNS), re.IGNORECASE)
+
+_BRACKETS_RE = re.compile(r'\[.*?\]')
+_LANGUAGE_RE = re.compile(r'\b(' + '|'.join(sorted(map(re.escape, LANGUAGE_MAP), key=len, reverse=True)) + r')\b')
+_SEASON_EPISODE_TAG_RE = re.compile(r'\bS\d{1,2}\b|\bE\d{1,4}\b', re.IGNORECASE)
+
+JUNK_WORDS = [
+    'Ep', 'Eps', 'Episode', 'Episodes', 'Season', 'Series', 'South', 'Dubbed', 'Completed',
+    'Web', r'\d+Kbps', 'UNCUT', 'ORG', 'HQ', 'ESubs', 'MSubs', 'REMASTERED', 'REPACK',
+    'PROPER', 'iNTERNAL', 'Sample', 'Video', 'Dual', 'Audio', 'Multi', 'Hollywood',
+    'New', 'Combined', 'Complete', 'Chapter', 'PSA', 'JC', 'DIDAR', 'StarBoy',
+    'Hindi', 'English', 'Tamil', 'Telugu', 'Kannada', 'Malayalam', 'Punjabi', 'Japanese', 'Korean',
+    'NF', 'AMZN', 'MAX', 'DSNP', 'ZEE5', 'WEB-DL', 'HDRip', 'WEBRip', 'HEVC', 'x265', 'x264', 'AAC',
+    '1tamilmv', 'www'
+]
+_JUNK_RE = re.compile(r'\b(' + r'|'.join(JUNK_WORDS) + r')\b', re.IGNORECASE)
+_SEPARATORS_RE = re.compile(r'[-_.]')
+_LEADING_SYMBOLS_RE = re.compile(r'^[^\w\s]+')
+_LEADING_NON_WORD_RE = re.compile(r'^[^\w]+')
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def _find_episode_range(name_for_parsing: str):
+    """Returns (season, episode range, matched text, name with the range removed)."""
+    season_info_str = ""
+    episode_info_str = ""
+    raw_episode_text_to_remove = ""
+    if not _ANY_RANGE_RE.search(name_for_parsing):
+        return season_info_str, episode_info_str, raw_episode_text_to_remove, name_for_parsing
+
+    for pattern, p_type in _RANGE_RES:
+        match = pattern.search(name_for_parsing)
+        if match:
+            groups = match.groups()
+            # Kept even when the range is rejected below; the title cleanup relies on it.
+            raw_episode_text_to_remove = match.group(0)
+            if p_type == 'season':
+                if not season_info_str: season_info_str = f"S{int(groups[0]):02d}"
+                start_ep, end_ep = groups[1], groups[2]
+            else:
+                start_ep, end_ep = groups[0], groups[1]
+
+            if int(start_ep) < int(end_ep):
+                episode_info_str = f"E{int(start_ep):02d}-E{int(end_ep):02d}"
+                name_for_parsing = name_for_parsing.replace(raw_episode_text_to_remove, ' ', 1)
+                break
+    return season_info_str, episode_info_str, raw_episode_text_to_remove, name_for_parsing
+
+
+def parse_filename(name: str) -> dict:
+    """
+    The synchronous part of clean_and_parse_filename: everything except the
+    IMDb lookup. Returns the cleaned title to look up plus the metadata that
+    build_parsed_info() needs to produce the final result.
+    """
+    name_for_parsing = name.replace('_', ' ').replace('.', ' ')
+    name_for_parsing = _DOMAIN_RE.sub('', name_for_parsing)
+    name_for_parsing = _HANDLE_RE.sub('', name_for_parsing).strip()
+
+    season_info_str, episode_info_str, raw_episode_text_to_remove, name_for_parsing = _find_episode_range(name_for_parsing)
+
+    name_for_ptn = _BRACKETS_RE.sub('', name_for_parsing).strip()
+    parsed_info = PTN.parse(name_for_ptn)
+
+    initial_title = parsed_info.get('title', '').strip()
+    if not season_info_str and parsed_info.get('season'):
+        season_info_str = f"S{parsed_info.get('season'):02d}"
+    if not episode_info_str and parsed_info.get('episode'):
+        episode = parsed_info.get('episode')
+        if isinstance(episode, list):
+            if len(episode) > 1: episode_info_str = f"E{min(episode):02d}-E{max(episode):02d}"
+            elif episode: episode_info_str = f"E{episode[0]:02d}"
+        else: episode_info_str = f"E{episode:02d}"
+
+    year_from_filename = parsed_info.get('year')
+
+    # Hybrid language detection using PTN's audio tag and LANGUAGE_MAP.
+    ptn_audio_tags = parsed_info.get('audio', '')
+    if isinstance(ptn_audio_tags, list):
+        ptn_audio_tags = " ".join(ptn_audio_tags)
+    search_string_lower = name.lower() + " " + ptn_audio_tags.lower()
+    found_languages = {LANGUAGE_MAP[key] for key in _LANGUAGE_RE.findall(search_string_lower)}
+
+    title_to_clean = initial_title
+    if year_from_filename:
+        title_to_clean = re.sub(r'\b' + str(year_from_filename) + r'\b', '', title_to_clean)
+
+    if raw_episode_text_to_remove:
+        title_to_clean = title_to_clean.replace(raw_episode_text_to_remove, '')
+
+    title_to_clean = _SEASON_EPISODE_TAG_RE.sub('', title_to_clean)
+
+    cleaned_title = _JUNK_RE.sub('', title_to_clean)
+    cleaned_title = _SEPARATORS_RE.sub(' ', cleaned_title)
+    cleaned_title = _LEADING_SYMBOLS_RE.sub('', cleaned_title)
+    cleaned_title = _WHITESPACE_RE.sub(' ', cleaned_title).strip()
+
+    if not cleaned_title: cleaned_title = " ".join(name.split('.')[:-1])
+
+    return {
+        "cleaned_title": cleaned_title,
+        "year": year_from_filename,
+        "season_info": season_info_str,
+        "episode_info": episode_info_str,
+        # Audio tag is left out of quality_tags, languages already cover it.
+        "languages": sorted(found_languages),
+        "quality_tags": " | ".join(filter(None, [parsed_info.get('resolution'), parsed_info.get('quality'), parsed_info.get('codec')]))
+    }
+
+
+def build_parsed_info(parsed: dict, definitive_title=None, definitive_year=None) -> dict:
+    """Turns parse_filename() output and the IMDb match (if any) into the final parsed info."""
+    season_info_str = parsed["season_info"]
+    episode_info_str = parsed["episode_info"]
+
+    final_title = definitive_title if definitive_title else parsed["cleaned_title"].title()
+    final_title = _LEADING_NON_WORD_RE.sub('', final_title).strip()
+
+    final_year = definitive_year if definitive_year else parsed["year"]
+    is_series = bool(season_info_str or episode_info_str)
+
+    display_title_main = final_title.strip()
+    if is_series and season_info_str and season_info_str not in display_title_main:
+        display_title_main += f" {season_info_str}"
+
+    display_title_with_year = display_title_main
+    if final_year:
+        display_title_with_year += f" ({final_year})"
+
+    return {
+        "batch_title": f"{final_title} {season_info_str}".strip(),
+        "display_title": display_title_with_year,
+        "year": final_year,
+        "is_series": is_series,
+        "season_info": season_info_str,
+        "episode_info": episode_info_str,
+        "languages": parsed["languages"],
+        "quality_tags": parsed["quality_tags"]
+    }
@@ -3,48 +3,40 @@
 import re
 import base64
 import logging
-import PTN
 import asyncio
-from imdb import Cinemagoer
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from pyrogram.errors import UserNotParticipant, ChatAdminRequired, ChannelInvalid, PeerIdInvalid, ChannelPrivate
 from config import Config
 from database.db import get_user, remove_from_list, update_user
 from features.poster import get_poster
+from features.imdb_index import get_title_index
+from features.title_cache import get_title_cache
+from features.imdb_client import get_imdb_client, ImdbUnavailable
 from thefuzz import fuzz
+from utils.filename_parser import parse_filename, build_parsed_info
+from utils.parse_pool import parse_filenames
 
 logger = logging.getLogger(__name__)
 
 PHOTO_CAPTION_LIMIT = 1024
 TEXT_MESSAGE_LIMIT = 4096
 
-ia = Cinemagoer()
-
-# --- DECREED ADDITION: START ---
-# A comprehensive map for detecting languages from filenames.
-# This map handles various abbreviations and full names, mapping them to a standard format.
-LANGUAGE_MAP = {
-    'hin': 'Hindi', 'hindi': 'Hindi',
-    'eng': 'English', 'english': 'English',
-    'tam': 'Tamil', 'tamil': 'Tamil',
-    'tel': 'Telugu', 'telugu': 'Telugu',
-    'mal': 'Malayalam', 'malayalam': 'Malayalam',
-    'kan': 'Kannada', 'kannada': 'Kannada',
-    'pun': 'Punjabi', 'punjabi': 'Punjabi',
-    'jap': 'Japanese', 'japanese': 'Japanese',
-    'kor': 'Korean', 'korean': 'Korean',
-    'chi': 'Chinese', 'chinese': 'Chinese',
-    'fre': 'French', 'french': 'French',
-    'ger': 'German', 'german': 'German',
-    'spa': 'Spanish', 'spanish': 'Spanish',
-    'ita': 'Italian', 'italian': 'Italian',
-    'rus': 'Russian', 'russian': 'Russian',
-    'ara': 'Arabic', 'arabic': 'Arabic',
-    'tur': 'Turkish', 'turkish': 'Turkish',
-    'ind': 'Indonesian', 'indonesian': 'Indonesian',
-    'multi': 'Multi-Audio', 'dual': 'Dual-Audio'
-}
-# --- DECREED ADDITION: END ---
+# Version of the clean_and_parse_filename output stored on file records. Bump it
+# whenever the parser's results change; older stored parses are then redone in
+# the background and ignored until they are. Rebuilding the offline IMDb index
+# changes the stored version too (see current_parse_version).
+PARSE_VERSION = 1
+
+
+def current_parse_version():
+    """
+    The version to store parses under: PARSE_VERSION, tagged with the build
+    time of the loaded offline IMDb index when there is one, since its titles
+    end up in the parse.
+    """
+    built_at = get_title_index().built_at
+    return f"{PARSE_VERSION}.{int(built_at)}" if built_at else PARSE_VERSION
+
 
 def simple_clean_filename(name: str) -> str:
     """
@@ -75,202 +67,115 @@ def format_bytes(size):
     elif n == 2: return f"{round(size)} {power_labels[n]}"
     else: return f"{int(size)} {power_labels[n]}"
 
-async def get_definitive_title_from_imdb(title_from_filename):
+async def _search_imdb(title_from_filename):
     """
-    Uses the cinemagoer library to find the official title and year from IMDb,
-    with an ultra-strict "reality check" to prevent mismatches.
+    The cinemagoer network lookup, with an ultra-strict "reality check" to
+    prevent mismatches. Returns (None, None) for no or rejected results and
+    raises on network errors, so those are not cached.
     """
-    if not title_from_filename:
-        return None, None
-    try:
-        loop = asyncio.get_event_loop()
-        logger.info(f"Querying IMDb with cleaned title: '{title_from_filename}'")
-        # Search for the movie
-        results = await loop.run_in_executor(None, lambda: ia.search_movie(title_from_filename, results=1))
-        
-        if not results:
-            logger.warning(f"IMDb returned no results for '{title_from_filename}'")
-            return None, None
-            
-        movie = results[0]
-        imdb_title_raw = movie.get('title')
-        
-        normalized_original = title_from_filename.lower().strip()
-        normalized_imdb = imdb_title_raw.lower().strip()
-        
-        similarity = fuzz.ratio(normalized_original, normalized_imdb)
+    imdb_client = get_imdb_client()
+    logger.info(f"Querying IMDb with cleaned title: '{title_from_filename}'")
+    # Search for the movie
+    results = await imdb_client.search_movie(title_from_filename, results=1)
 
-        logger.info(f"IMDb Check: Original='{normalized_original}', IMDb='{normalized_imdb}', Strict Ratio Similarity={similarity}%")
+    if not results:
+        logger.warning(f"IMDb returned no results for '{title_from_filename}'")
+        return None, None
 
-        if similarity < 60:
-            logger.warning(f"IMDb mismatch REJECTED! Original: '{title_from_filename}', IMDb: '{imdb_title_raw}', Similarity too low.")
-            return None, None
+    movie = results[0]
+    imdb_title_raw = movie.get('title')
 
-        await loop.run_in_executor(None, lambda: ia.update(movie, info=['main']))
-        
-        imdb_title = movie.get('title')
-        imdb_year = movie.get('year')
+    normalized_original = title_from_filename.lower().strip()
+    normalized_imdb = imdb_title_raw.lower().strip()
 
-        if title_from_filename.lower() not in imdb_title.lower():
-             logger.warning(f"IMDb title corruption REJECTED! Original: '{title_from_filename}', Corrupted: '{imdb_title}'")
-             return None, None
+    similarity = fuzz.ratio(normalized_original, normalized_imdb)
 
-        logger.info(f"IMDb match ACCEPTED for '{title_from_filename}': '{imdb_title} ({imdb_year})'")
-        return imdb_title, imdb_year
+    logger.info(f"IMDb Check: Original='{normalized_original}', IMDb='{normalized_imdb}', Strict Ratio Similarity={similarity}%")
 
-    except Exception as e:
-        logger.error(f"Error fetching data from IMDb for '{title_from_filename}': {e}")
+    if similarity < 60:
+        logger.warning(f"IMDb mismatch REJECTED! Original: '{title_from_filename}', IMDb: '{imdb_title_raw}', Similarity too low.")
         return None, None
 
-async def clean_and_parse_filename(name: str, cache: dict = None):
-    """
-    A next-gen, multi-pass robust filename parser that preserves all metadata.
-    """
-    original_name = name
+    await imdb_client.update(movie, info=['main'])
 
-    name_for_parsing = name.replace('_', ' ').replace('.', ' ')
-    name_for_parsing = re.sub(r'(?:www\.)?[\w-]+\.(?:com|org|net|xyz|me|io|in|cc|biz|world|info|club|mobi|press|top|site|tech|online|store|live|co|shop|fun|tamilmv)\b', '', name_for_parsing, flags=re.IGNORECASE)
-    name_for_parsing = re.sub(r'@[a-zA-Z0-9_]+', '', name_for_parsing).strip()
+    imdb_title = movie.get('title')
+    imdb_year = movie.get('year')
 
+    if title_from_filename.lower() not in imdb_title.lower():
+         logger.warning(f"IMDb title corruption REJECTED! Original: '{title_from_filename}', Corrupted: '{imdb_title}'")
+         return None, None
 
-    season_info_str = ""
-    episode_info_str = ""
-    raw_episode_text_to_remove = ""
+    logger.info(f"IMDb match ACCEPTED for '{title_from_filename}': '{imdb_title} ({imdb_year})'")
+    return imdb_title, imdb_year
 
-    search_name_for_eps = name.replace('_', '.').replace(' ', '.')
-    
-    range_patterns = [
-        (r'(\d{1,2})\s+(?:To|-|–|—)\s+(\d{1,2})', 'no_season'),
-        (r'(\d{1,2})\s+(\d{1,2})(?=\s\d{4})', 'no_season'),
-        (r'S(\d{1,2}).*?EP\((\d{1,4})-(\d{1,4})\)', 'season'),
-        (r'S(\d{1,2}).*?\[E?(\d{1,4})\s*-\s*E?(\d{1,4})\]', 'season'),
-        (r'S(\d{1,2}).*?\[(\d{1,4})\s*To\s*(\d{1,4})\s*Eps?\]', 'season'),
-        (r'S(\d{1,2}).*?\[EP\s*(\d{1,4})\s*to\s*(\d{1,4})\]', 'season'),
-        (r'S(\d{1,2}).*?\[Epi\s*(\d{1,4})\s*-\s*(\d{1,4})\]', 'season'),
-        (r'S(\d{1,2}).*?Ep\.?(\d{1,4})-(\d{1,4})', 'season'),
-        (r'S(\d{1,2})\s*E(\d{1,4})[-\s]*E(\d{1,4})', 'season'),
-        (r'\.Ep\.\[(\d{1,4})-(\d{1,4})\]', 'no_season'),
-        (r'Ep\s*(\d{1,4})\s*-\s*(\d{1,4})', 'no_season'),
-        (r'(?:E|Episode)s?\.?\s?(\d{1,4})\s?(?:to|-|–|—)\s?(\d{1,4})', 'no_season'),
-    ]
+async def get_definitive_title_from_imdb(title_from_filename):
+    """
+    Finds the official title and year from IMDb. The offline title index
+    answers first; titles it does not know go to the network lookup, whose
+    results (including misses) are cached across batches and restarts.
+    """
+    if not title_from_filename:
+        return None, None
 
-    for pattern, p_type in range_patterns:
-        match = re.search(pattern, name_for_parsing, re.IGNORECASE)
-        if match:
-            groups = match.groups()
-            raw_episode_text_to_remove = match.group(0)
-            if p_type == 'season':
-                if not season_info_str: season_info_str = f"S{int(groups[0]):02d}"
-                start_ep, end_ep = groups[1], groups[2]
-            else:
-                start_ep, end_ep = groups[0], groups[1]
-
-            if int(start_ep) < int(end_ep):
-                episode_info_str = f"E{int(start_ep):02d}-E{int(end_ep):02d}"
-                name_for_parsing = name_for_parsing.replace(raw_episode_text_to_remove, ' ', 1)
-                break 
-
-    name_for_ptn = re.sub(r'\[.*?\]', '', name_for_parsing).strip()
-    parsed_info = PTN.parse(name_for_ptn)
-    
-    initial_title = parsed_info.get('title', '').strip()
-    if not season_info_str and parsed_info.get('season'):
-        season_info_str = f"S{parsed_info.get('season'):02d}"
-    if not episode_info_str and parsed_info.get('episode'):
-        episode = parsed_info.get('episode')
-        if isinstance(episode, list):
-            if len(episode) > 1: episode_info_str = f"E{min(episode):02d}-E{max(episode):02d}"
-            elif episode: episode_info_str = f"E{episode[0]:02d}"
-        else: episode_info_str = f"E{episode:02d}"
-    
-    year_from_filename = parsed_info.get('year')
-    
-    # --- DECREED MODIFICATION: START ---
-    # Hybrid language detection using PTN's output and our custom map.
-    found_languages = set()
-    search_string_lower = name.lower()
-    
-    # Also check PTN's audio tag for languages
-    ptn_audio_tags = parsed_info.get('audio', '')
-    if isinstance(ptn_audio_tags, list):
-        ptn_audio_tags = " ".join(ptn_audio_tags)
-    
-    search_string_lower += " " + ptn_audio_tags.lower()
-    
-    for key, value in LANGUAGE_MAP.items():
-        if re.search(r'\b' + key + r'\b', search_string_lower):
-            found_languages.add(value)
-    # --- DECREED MODIFICATION: END ---
-
-    title_to_clean = initial_title
-    if year_from_filename:
-        title_to_clean = re.sub(r'\b' + str(year_from_filename) + r'\b', '', title_to_clean)
-    
-    if raw_episode_text_to_remove:
-        title_to_clean = title_to_clean.replace(raw_episode_text_to_remove, '')
-        
-    title_to_clean = re.sub(r'\bS\d{1,2}\b|\bE\d{1,4}\b', '', title_to_clean, flags=re.IGNORECASE)
-    
-    junk_words = [
-        'Ep', 'Eps', 'Episode', 'Episodes', 'Season', 'Series', 'South', 'Dubbed', 'Completed',
-        'Web', r'\d+Kbps', 'UNCUT', 'ORG', 'HQ', 'ESubs', 'MSubs', 'REMASTERED', 'REPACK',
-        'PROPER', 'iNTERNAL', 'Sample', 'Video', 'Dual', 'Audio', 'Multi', 'Hollywood',
-        'New', 'Combined', 'Complete', 'Chapter', 'PSA', 'JC', 'DIDAR', 'StarBoy',
-        'Hindi', 'English', 'Tamil', 'Telugu', 'Kannada', 'Malayalam', 'Punjabi', 'Japanese', 'Korean',
-        'NF', 'AMZN', 'MAX', 'DSNP', 'ZEE5', 'WEB-DL', 'HDRip', 'WEBRip', 'HEVC', 'x265', 'x264', 'AAC',
-        '1tamilmv', 'www'
-    ]
-    junk_pattern_re = r'\b(' + r'|'.join(junk_words) + r')\b'
-    cleaned_title = re.sub(junk_pattern_re, '', title_to_clean, flags=re.IGNORECASE)
-    cleaned_title = re.sub(r'[-_.]', ' ', cleaned_title)
-    cleaned_title = re.sub(r'^[^\w\s]+', '', cleaned_title)
-    cleaned_title = re.sub(r'\s+', ' ', cleaned_title).strip()
-    
-    if not cleaned_title: cleaned_title = " ".join(original_name.split('.')[:-1])
+    index = get_title_index()
+    offline_match = index.lookup(title_from_filename)
+    if offline_match is not None:
+        if offline_match[0]:
+            logger.info(f"IMDb index match ACCEPTED for '{title_from_filename}': '{offline_match[0]} ({offline_match[1]})'")
+        return offline_match
+    if index.available and not Config.IMDB_NETWORK_FALLBACK:
+        return None, None
 
-    definitive_title, definitive_year = await get_definitive_title_from_imdb(cleaned_title)
+    try:
+        return await get_title_cache().resolve(title_from_filename, _search_imdb)
+    except ImdbUnavailable:
+        # IMDb keeps failing; fall back to the title from the filename without waiting.
+        return None, None
+    except Exception as e:
+        logger.error(f"Error fetching data from IMDb for '{title_from_filename}': {e}")
+        return None, None
 
-    final_title = definitive_title if definitive_title else cleaned_title.title()
-    final_title = re.sub(r'^[^\w]+', '', final_title).strip()
+async def clean_and_parse_filename(name: str):
+    """
+    A next-gen, multi-pass robust filename parser that preserves all metadata.
+    """
+    parsed = parse_filename(name)
+    definitive_title, definitive_year = await get_definitive_title_from_imdb(parsed["cleaned_title"])
+    return build_parsed_info(parsed, definitive_title, definitive_year)
 
-    final_year = definitive_year if definitive_year else year_from_filename
-    is_series = bool(season_info_str or episode_info_str)
-    
-    display_title_main = final_title.strip()
-    if is_series and season_info_str and season_info_str not in display_title_main:
-        display_title_main += f" {season_info_str}"
-    
-    display_title_with_year = display_title_main
-    if final_year:
-        display_title_with_year += f" ({final_year})"
-        
-    return {
-        "batch_title": f"{final_title} {season_info_str}".strip(),
-        "display_title": display_title_with_year,
-        "year": final_year,
-        "is_series": is_series,
-        "season_info": season_info_str, 
-        "episode_info": episode_info_str,
-        # --- DECREED MODIFICATION: START ---
-        # Return detected languages. Audio tag is removed from quality_tags to avoid duplication.
-        "languages": sorted(list(found_languages)),
-        "quality_tags": " | ".join(filter(None, [parsed_info.get('resolution'), parsed_info.get('quality'), parsed_info.get('codec')]))
-        # --- DECREED MODIFICATION: END ---
-    }
+async def clean_and_parse_filenames(names):
+    """
+    clean_and_parse_filename() for a batch: the parsing runs in the worker
+    pool for large batches, then the IMDb lookups run concurrently. Names that
+    fail to parse give None.
+    """
+    async def finish(parsed):
+        if parsed is None: return None
+        definitive_title, definitive_year = await get_definitive_title_from_imdb(parsed["cleaned_title"])
+        return build_parsed_info(parsed, definitive_title, definitive_year)
 
-async def create_post(client, user_id, messages, cache: dict):
+    return await asyncio.gather(*[finish(parsed) for parsed in await parse_filenames(names)])
+
+async def create_post(client, user_id, messages, parsed_infos: dict = None):
+    """
+    Builds the posts for one logical batch. `parsed_infos` maps file_unique_id
+    to the parse stored at ingest; files missing from it are parsed here.
+    """
     user = await get_user(user_id)
     if not user: return []
 
-    media_info_list = []
-    parse_tasks = [clean_and_parse_filename(getattr(m, m.media.value, None).file_name, cache) for m in messages if getattr(m, m.media.value, None)]
-    parsed_results = await asyncio.gather(*parse_tasks)
+    parsed_infos = parsed_infos or {}
+    medias = [media for media in (getattr(m, m.media.value, None) for m in messages) if media]
+    missing = [media for media in medias if media.file_unique_id not in parsed_infos]
+    if missing:
+        parsed_results = await clean_and_parse_filenames([media.file_name for media in missing])
+        parsed_infos = {**parsed_infos, **{media.file_unique_id: info for media, info in zip(missing, parsed_results)}}
 
-    for i, info in enumerate(parsed_results):
+    media_info_list = []
+    for media in medias:
+        info = parsed_infos.get(media.file_unique_id)
         if info:
-            media = getattr(messages[i], messages[i].media.value)
-            info['file_size'] = media.file_size
-            info['file_unique_id'] = media.file_unique_id
+            info = dict(info, file_size=media.file_size, file_unique_id=media.file_unique_id)
             media_info_list.append(info)
 
     if not media_info_list: return []
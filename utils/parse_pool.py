@@ -0,0 +1,97 @@
+# utils/parse_pool.py
+
+"""
+Runs the CPU-bound parts of batch finalization (filename parsing and title
+clustering) in worker processes, so a large batch does not stall update
+handling and streaming on the event loop. Work is sent in chunks; batches
+smaller than Config.PARSE_INLINE_LIMIT (or with PARSE_PROCESSES = 0) run
+inline, where a round trip to another process would cost more than it saves.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config import Config
+from utils.clustering import group_by_title, SIMILARITY_THRESHOLD
+from utils.filename_parser import parse_filename
+
+logger = logging.getLogger(__name__)
+
+# File names sent to a worker process per task.
+PARSE_CHUNK_SIZE = 32
+
+_pool = None
+
+
+def get_parse_pool():
+    """The shared worker pool, created on first use; None when parsing runs inline only."""
+    global _pool
+    if _pool is None and Config.PARSE_PROCESSES > 0:
+        # "spawn": forking a process that runs an event loop and threads is unsafe.
+        _pool = ProcessPoolExecutor(max_workers=Config.PARSE_PROCESSES, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def shutdown_parse_pool():
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _parse_chunk(names):
+    results = []
+    for name in names:
+        try:
+            results.append(parse_filename(name))
+        except Exception as e:
+            results.append(e)
+    return results
+
+
+def _cluster_indexes(titles, threshold):
+    return list(group_by_title(range(len(titles)), titles, threshold).items())
+
+
+async def _run(func, *args):
+    """Runs `func(*args)` in the pool, or inline if the pool is gone."""
+    global _pool
+    pool = get_parse_pool()
+    if pool is not None:
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, func, *args)
+        except BrokenProcessPool:
+            logger.error("Parse worker pool broke; running this batch inline and starting a new pool.")
+            if _pool is pool: _pool = None
+    return func(*args)
+
+
+async def parse_filenames(names) -> list:
+    """
+    parse_filename() for every name, in order. A name that fails to parse
+    gives None instead of failing the whole batch.
+    """
+    names = list(names)
+    if len(names) < Config.PARSE_INLINE_LIMIT or get_parse_pool() is None:
+        results = _parse_chunk(names)
+    else:
+        chunks = [names[i:i + PARSE_CHUNK_SIZE] for i in range(0, len(names), PARSE_CHUNK_SIZE)]
+        results = [r for chunk in await asyncio.gather(*[_run(_parse_chunk, c) for c in chunks]) for r in chunk]
+
+    for i, result in enumerate(results):
+        if isinstance(result, Exception):
+            logger.error(f"Could not parse file name '{names[i]}': {result}")
+            results[i] = None
+    return results
+
+
+async def cluster_by_title(items, titles, threshold: int = SIMILARITY_THRESHOLD) -> dict:
+    """group_by_title(), with the matching done in a worker process for large batches."""
+    items, titles = list(items), list(titles)
+    if len(titles) < Config.PARSE_INLINE_LIMIT or get_parse_pool() is None:
+        return group_by_title(items, titles, threshold)
+    # Only the titles cross the process boundary; groups come back as indexes.
+    groups = await _run(_cluster_indexes, titles, threshold)
+    return {key: [items[i] for i in indexes] for key, indexes in groups}